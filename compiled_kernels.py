@@ -0,0 +1,188 @@
+import math
+import numpy as np
+from evolution_compositionality_under_noise import create_form_index_per_language, noisy_to_complete_forms
+from likelihood_cache import production_likelihood_table
+
+try:
+    import numba
+except ImportError:  # numba is optional: without it, only the pure-Python backend is available
+    numba = None
+
+
+###################################################################################################################
+# KERNELS FOR THE STEPS OF A SINGLE ROUND OF COMMUNICATION, OVER INTEGER-ENCODED LANGUAGES AND UTTERANCES:
+
+# Each round of communication (see population_communication_mutual_understanding() in repair_vs_redundancy_model.py)
+# consists of sampling a language for the speaker and the hearer, producing an utterance, deciding whether the hearer
+# initiates repair, and updating the hearer's posterior. The kernels below do the last three of these steps on
+# integer-encoded languages (the index of the form for each meaning; see create_form_index_per_language()) and
+# utterances (the index of the utterance in all_forms_including_noisy_variants), so that they can be compiled with
+# numba. (Sampling a language already only takes a single binary search in the cached cumulative distribution of the
+# agent's posterior; see PosteriorCDFCache in evolution_compositionality_under_noise.py.) The random numbers are drawn
+# by the caller from the same random number generators (and in the same order) as in the pure-Python implementation,
+# so that a simulation with the same seed follows the same trajectory (up to rounding) with either backend.
+
+numba_available = numba is not None
+
+
+def compile_kernel(kernel):
+    """
+    Compiles a kernel with numba if numba is installed (and otherwise returns it unchanged, so that the kernels can
+    still be run, slowly, as plain Python functions).
+
+    :param kernel: the kernel function
+    :return: the compiled kernel (or kernel itself if numba isn't installed)
+    """
+    if numba is None:
+        return kernel
+    return numba.njit(cache=True)(kernel)
+
+
+@compile_kernel
+def produce_kernel(form_indices, topic_index, production_table, random_float):
+    """
+    Samples an utterance index, given a language and a topic, in the same way as np.random.choice() does in
+    produce_with_minimal_effort() (in repair_vs_redundancy_model.py).
+
+    :param form_indices: 1D numpy array containing the index of the form that the language maps each meaning to
+    :param topic_index: the index of the topic (in the list of meanings)
+    :param production_table: 3D numpy array with the production probabilities of each utterance for each combination of
+    correct form and ambiguity of that form (see production_likelihood_table() in likelihood_cache.py)
+    :param random_float: a random number in [0, 1) (e.g. from np.random.random(), as in np.random.choice())
+    :return: the index of the produced utterance (in all_forms_including_noisy_variants)
+    """
+    correct_form_index = form_indices[topic_index]
+    ambiguity = 0
+    for m in range(len(form_indices)):
+        if form_indices[m] == correct_form_index:
+            ambiguity += 1
+    prop_to_probs = production_table[correct_form_index, ambiguity-1]
+    cumulative_probs = np.cumsum(prop_to_probs / np.sum(prop_to_probs))
+    return np.searchsorted(cumulative_probs / cumulative_probs[-1], random_float, side='right')
+
+
+@compile_kernel
+def receive_open_only_kernel(form_indices, utterance_index, compatible_forms):
+    """
+    Decides how a hearer responds to an utterance, in the same way as receive_with_repair_open_only() (in
+    repair_vs_redundancy_model.py): the hearer only interprets the utterance if exactly one meaning is compatible with it,
+    and initiates repair otherwise.
+
+    :param form_indices: 1D numpy array containing the index of the form that the hearer's language maps each meaning to
+    :param utterance_index: the index of the utterance (in all_forms_including_noisy_variants)
+    :param compatible_forms: 2D boolean numpy array of shape (n_forms, n_utterances) specifying which complete forms
+    each utterance is compatible with (see compatible_form_matrix())
+    :return: the index of the meaning that the hearer interprets the utterance as, or -1 if the hearer initiates repair
+    """
+    n_possible_interpretations = 0
+    interpretation = -1
+    for m in range(len(form_indices)):
+        if compatible_forms[form_indices[m], utterance_index]:
+            n_possible_interpretations += 1
+            interpretation = m
+    if n_possible_interpretations == 0:  # then all meanings are possible interpretations
+        if len(form_indices) == 1:
+            return 0
+        return -1
+    if n_possible_interpretations == 1:
+        return interpretation
+    return -1
+
+
+@compile_kernel
+def add_and_normalize_kernel(log_posterior, log_likelihoods):
+    """
+    Updates a LOG posterior in place, in the same way as add_and_normalize_in_place() (in
+    evolution_compositionality_under_noise.py): the LOG likelihoods are added, and the result is normalized by shifting
+    by its maximum and summing the exponentiated values in float64.
+
+    :param log_posterior: 1D numpy array containing LOG posterior probability values for each hypothesis (e.g. a row of
+    the population); this array is overwritten with the updated (and normalized) LOG posterior
+    :param log_likelihoods: 1D numpy array containing the LOG likelihood of the observed data for each hypothesis
+    """
+    max_log_prob = -np.inf
+    for h in range(len(log_posterior)):
+        log_posterior[h] += log_likelihoods[h]
+        if log_posterior[h] > max_log_prob:
+            max_log_prob = log_posterior[h]
+    sum_of_probs = 0.
+    for h in range(len(log_posterior)):
+        sum_of_probs += math.exp(np.float64(log_posterior[h]) - max_log_prob)
+    log_total = np.float64(max_log_prob) + math.log(sum_of_probs)
+    for h in range(len(log_posterior)):
+        log_posterior[h] -= log_total
+
+
+###################################################################################################################
+# AND A CLASS THAT HOLDS THE INTEGER-ENCODED WORLD AND DRAWS THE RANDOM NUMBERS FOR THE KERNELS:
+
+def compatible_form_matrix(forms, all_possible_forms):
+    """
+    Creates a boolean matrix specifying which complete forms each possible utterance (including noisy variants) is
+    compatible with: a complete utterance is only compatible with itself, and a noisy utterance is compatible with all
+    the complete forms returned by noisy_to_complete_forms() (in evolution_compositionality_under_noise.py).
+
+    :param forms: list of all possible forms *excluding* their noisy variants
+    :param all_possible_forms: list of all possible forms INCLUDING noisy variants; corresponds to global variable
+    'all_forms_including_noisy_variants'
+    :return: 2D boolean numpy array of shape (len(forms), len(all_possible_forms))
+    """
+    form_indices = {form: i for i, form in enumerate(forms)}
+    compatible_forms = np.zeros((len(forms), len(all_possible_forms)), dtype=bool)
+    for u in range(len(all_possible_forms)):
+        if '_' in all_possible_forms[u]:
+            for form in noisy_to_complete_forms(all_possible_forms[u], forms):
+                compatible_forms[form_indices[form], u] = True
+        else:
+            compatible_forms[form_indices[all_possible_forms[u]], u] = True
+    return compatible_forms
+
+
+class CommunicationKernels:
+    """
+    The integer-encoded hypothesis space and production and reception tables that the kernels above work on, for a
+    single condition. Each method draws its random number from the same random number generator as the corresponding
+    step of the pure-Python implementation, and then calls the (compiled) kernel.
+    """
+
+    def __init__(self, hypotheses, meaning_list, forms, noisy_variants, ambiguity_penalty, effort_penalty, error_prob, prob_of_noise):
+        """
+        :param hypotheses: list of all possible languages; corresponds to global variable 'hypothesis_space' (after
+        any pruning)
+        :param meaning_list: list containing all possible meanings; corresponds to global variable 'meanings'
+        :param forms: list of all possible forms *excluding* their noisy variants
+        :param noisy_variants: list of all possible noisy variants of forms
+        :param ambiguity_penalty: parameter that determines the strength of the penalty on ambiguity (gamma)
+        :param effort_penalty: parameter that determines the strength of the penalty on speaker effort (delta)
+        :param error_prob: the probability of making an error in production
+        :param prob_of_noise: the probability of environmental noise masking part of the utterance
+        """
+        self.form_index_per_language = create_form_index_per_language(hypotheses, forms)
+        self.production_table = production_likelihood_table(forms, noisy_variants, len(meaning_list), ambiguity_penalty, effort_penalty, error_prob, prob_of_noise)
+        self.compatible_forms = compatible_form_matrix(forms, forms + noisy_variants)
+
+    def produce(self, language_index, topic_index):
+        """
+        :param language_index: the index of the speaker's language (in the hypotheses)
+        :param topic_index: the index of the topic (in the list of meanings)
+        :return: the index of the produced utterance (see produce_with_minimal_effort() in repair_vs_redundancy_model.py)
+        """
+        return produce_kernel(self.form_index_per_language[language_index], topic_index, self.production_table, np.random.random())
+
+    def receive(self, language_index, utterance_index):
+        """
+        :param language_index: the index of the hearer's language (in the hypotheses)
+        :param utterance_index: the index of the utterance (in all_forms_including_noisy_variants)
+        :return: the index of the meaning that the hearer interprets the utterance as, or -1 if the hearer initiates
+        repair (see receive_with_repair_open_only() in repair_vs_redundancy_model.py)
+        """
+        return receive_open_only_kernel(self.form_index_per_language[language_index], utterance_index, self.compatible_forms)
+
+    def update(self, log_posterior, log_likelihoods):
+        """
+        :param log_posterior: 1D numpy array containing LOG posterior probability values for each hypothesis (e.g. a row
+        of the population); this array is updated in place (see add_and_normalize_in_place() in
+        evolution_compositionality_under_noise.py)
+        :param log_likelihoods: 1D numpy array containing the LOG likelihood of the observed data for each hypothesis
+        """
+        add_and_normalize_kernel(log_posterior, np.asarray(log_likelihoods, dtype=log_posterior.dtype))
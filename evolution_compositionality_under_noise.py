@@ -8,6 +8,7 @@ from math import log, log2
 import scipy.special
 import pickle
 import time
+from collections import Counter, OrderedDict
 
 ###################################################################################################################
 # THE FUNCTIONS BELOW HAVE TO BE DEFINED BEFORE SETTING THE PARAMETERS BECAUSE THEY ARE NEEDED TO DO SO.
@@ -90,8 +91,9 @@ def create_all_possible_noisy_forms(all_complete_forms):
 if __name__ == '__main__':
     meanings = ['02', '03', '12', '13']  # all possible meanings
     possible_form_lengths = np.array([2])  # all possible form lengths
-    forms_without_noise = create_all_possible_forms(2, possible_form_lengths)  # all possible forms, excluding their
-    # possible 'noisy variants'
+    n_characters = 2  # the number of different characters that forms can be made up of (i.e. the alphabet size)
+    forms_without_noise = create_all_possible_forms(n_characters, possible_form_lengths)  # all possible forms, excluding
+    # their possible 'noisy variants'
     noisy_forms = create_all_possible_noisy_forms(forms_without_noise)
     # all possible noisy variants of the forms above
     all_forms_including_noisy_variants = forms_without_noise + noisy_forms  # all possible forms, including both
@@ -117,10 +119,12 @@ if __name__ == '__main__':
     n_parents = 'single'  # determines whether each generation of learners receives data from a single agent from the
     # previous generation, or from multiple (can be set to either 'single' or 'multiple').
 
-    # proportion_measure = 'posterior'  # the way in which the proportion of language classes present in the population is
+    proportion_measure = 'posterior'  # the way in which the proportion of language classes present in the population is
     # measured. Can be set to either 'posterior' (where we directly measure the total amount of posterior probability
     # assigned to each language class), or 'sampled' (where at each generation we make all agents in the population pick a
     # language and we count the resulting proportions.
+    n_proportion_samples = 1  # the number of languages that each agent picks per generation if proportion_measure =
+    # 'sampled' (all of them are counted, so higher values make the measured proportions less noisy)
 
     communicative_success = False  # determines whether there is a pressure for communicative success or not
     communicative_success_pressure_strength = (2./3.)  # determines how much more likely a <meaning, form> pair from a
@@ -132,6 +136,43 @@ if __name__ == '__main__':
 
     pickle_file_path = "pickles/"
 
+    learned_posterior_cache_max_bytes = 2**29  # the maximum amount of memory (in bytes) that the cache of learned
+    # posteriors (which is shared by all runs of a condition; see LearnedPosteriorCache) may take up
+
+    precision = 'float64'  # the floating point precision in which the likelihood cache, priors, posteriors and the
+    # final population are stored; can be set to either 'float64' or 'float32' (which halves memory use and result
+    # sizes; see README.md for how closely the results agree with float64)
+
+    likelihood_cache_format = 'dense'  # the format of the log_likelihood_cache that all posterior updates look their
+    # LOG likelihoods up in (if production = 'my_code'); can be set to either 'dense', 'factorised' or 'quantised' (see
+    # the same parameter in repair_vs_redundancy_model.py). Either way, the cache is memory-mapped from a file in
+    # pickle_file_path, which is built automatically if it doesn't exist yet (see get_log_likelihood_cache() in
+    # likelihood_cache.py)
+
+    prior_pruning_log_threshold = None  # if not None (e.g. -25.) and compressibility_bias = True, all hypotheses whose
+    # LOG prior is below this threshold are removed from the hypothesis space before the runs start (see
+    # prune_hypotheses_by_prior()); the prior mass that is removed is printed
+
+    posterior_representation = 'dense'  # can be set to either 'dense' (each agent is a LOG posterior over all
+    # hypotheses), 'particles' (each agent is a set of n_particles weighted languages; see ParticlePosteriorPopulation in
+    # learner_representations.py), 'gibbs' (each agent only keeps the counts of its data, and languages are sampled
+    # from its posterior with a Gibbs sampler; see GibbsPosteriorPopulation in learner_representations.py) or 'counts'
+    # (each agent only keeps the counts of its data, from which its exact posterior is materialised when needed, and the
+    # final population is saved as these counts; see CountPosteriorPopulation in learner_representations.py). The
+    # latter three only work with production = 'my_code'. With 'particles' and 'gibbs', the hypothesis space is never
+    # enumerated, and the final population is saved as the agents' particles and weights, or counts and sampler states.
+    n_particles = 1000  # the number of particles per agent if posterior_representation = 'particles'
+    particle_resample_threshold = 0.5  # the fraction of n_particles below which the effective sample size of an
+    # agent's particles has to drop for them to be resampled and moved
+    particle_move_sweeps = 2  # the number of sweeps of Metropolis-Hastings moves (one per meaning) after resampling
+    gibbs_burn_in_sweeps = 20  # the number of Gibbs sweeps after an agent has observed new data, before a language is
+    # sampled from its posterior (if posterior_representation = 'gibbs')
+    gibbs_sweeps = 2  # the number of Gibbs sweeps between two consecutive languages sampled from an agent's posterior
+    gibbs_stats_samples = 200  # the number of languages sampled per agent to estimate the language stats
+    count_posterior_buffers = 2  # the number of agents whose LOG posterior a CountPosteriorPopulation keeps
+    # materialised at the same time (each one takes as much memory as an agent in a dense population; with popsize
+    # buffers, every agent keeps its own)
+
 
 # THE FOLLOWING PARAMETERS SHOULD ONLY BE SET IF __name__ == '__main__', BECAUSE THEY ARE RETRIEVED FROM THE INPUT
 # ARGUMENTS GIVEN TO THE PYTHON SCRIPT WHEN RUN FROM THE TERMINAL OR FROM A .SH SCRIPT:
@@ -195,6 +236,38 @@ def create_all_possible_languages(meaning_list, forms):
     return all_possible_languages
 
 
+def create_form_index_per_language(language_list, forms):
+    """
+    Takes a list of languages and represents each of them as a vector of form indices, so that array operations can be
+    used on the whole hypothesis space at once.
+
+    :param language_list: list of all languages
+    :param forms: list of strings corresponding to all possible forms_without_noisy_variants
+    :return: 2D numpy array of shape (len(language_list), len(meanings)), containing for each language the index (in
+    forms) of the form that the language maps each meaning to
+    """
+    if len(forms) <= np.iinfo(np.uint8).max:
+        index_dtype = np.uint8
+    else:
+        index_dtype = np.uint16
+    form_indices = {form: i for i, form in enumerate(forms)}
+    form_index_per_language = np.array([[form_indices[form] for form in lang] for lang in language_list], dtype=index_dtype)
+    return form_index_per_language
+
+
+def hypothesis_index_of_language(form_indices, n_forms):
+    """
+    Calculates the index that a language which is stored as a vector of form indices has in the list of all possible
+    languages, without enumerating that list.
+
+    :param form_indices: 1D numpy array containing the index of the form that the language maps each meaning to
+    :param n_forms: the number of possible forms (excluding noisy variants)
+    :return: the index of the language in the list of all possible languages (as created by
+    create_all_possible_languages(), in which the form of the first meaning varies slowest)
+    """
+    return int(np.ravel_multi_index(tuple(form_indices), (n_forms,) * len(form_indices)))
+
+
 # In case it's relevant for checking my implementation against the simlang one, just as a sanity check:
 def transform_all_languages_to_simlang_format(language_list, meaning_list):
     """
@@ -592,6 +665,34 @@ def classify_language_multiple_form_lengths(lang, meaning_list):
 #
 
 
+def classify_language(lang, complete_forms, meaning_list):
+    """
+    Classify a single language, using classify_language_four_forms() if there are exactly 4 possible forms of 2
+    characters each, and classify_language_multiple_form_lengths() otherwise
+
+    :param lang: a language; represented as a tuple of forms_without_noisy_variants, where each form index maps to same
+    index in meanings
+    :param complete_forms: list containing all possible complete forms; corresponds to global variable
+    'forms_without_noise'
+    :param meaning_list: list of all possible meanings; corresponds to global variable 'meanings'
+    :returns: integer corresponding to category that language belongs to (see the two functions above)
+    """
+    if len(complete_forms) == 4 and len(complete_forms[0]) == 2:
+        return classify_language_four_forms(lang, complete_forms, meaning_list)
+    return classify_language_multiple_form_lengths(lang, meaning_list)
+
+
+def n_language_classes(complete_forms):
+    """
+    :param complete_forms: list containing all possible complete forms; corresponds to global variable
+    'forms_without_noise'
+    :return: the number of language classes that classify_language() distinguishes for these forms
+    """
+    if len(complete_forms) == 4 and len(complete_forms[0]) == 2:
+        return 5  # see classify_language_four_forms()
+    return 7  # see classify_language_multiple_form_lengths()
+
+
 def classify_all_languages(language_list, complete_forms, meaning_list):
     """
     Classify all languages as either 0 = degenerate, 1 = holistic, 2 = compositional, 3 = compositional_reverse,
@@ -607,10 +708,7 @@ def classify_all_languages(language_list, complete_forms, meaning_list):
     """
     class_per_lang = np.zeros(len(language_list))
     for l in range(len(language_list)):
-        if len(complete_forms) == 4 and len(complete_forms[0]) == 2:
-            class_per_lang[l] = classify_language_four_forms(language_list[l], complete_forms, meaning_list)
-        else:
-            class_per_lang[l] = classify_language_multiple_form_lengths(language_list[l], meaning_list)
+        class_per_lang[l] = classify_language(language_list[l], complete_forms, meaning_list)
     return class_per_lang
 
 
@@ -851,6 +949,34 @@ def prior(hypotheses, complete_forms, meaning_list, possible_form_lengths):
     return logpriors_normalized
 
 
+def prune_hypotheses_by_prior(log_priors, log_prior_threshold):
+    """
+    Removes the hypotheses whose LOG prior falls below log_prior_threshold from the hypothesis space (to be used with
+    compressibility_bias = True, under which many languages get a negligible prior). The posterior over the kept
+    hypotheses is then the full posterior conditioned on the hypothesis being one of them, so the removed prior mass
+    tells whether this approximation is acceptable for a given condition.
+
+    :param log_priors: 1D numpy array containing the LOG prior probability for each hypothesis
+    :param log_prior_threshold: the LOG prior below which a hypothesis is removed
+    :return: (1) 1D numpy array containing the indices of the hypotheses that are kept (in their original order), (2)
+    1D numpy array containing the renormalized LOG priors of the hypotheses that are kept, (3) the total prior mass that
+    is removed (computed in float64), and (4) an upper bound on the total prior mass that is removed (i.e. the number
+    of removed hypotheses times exp(log_prior_threshold))
+    """
+    keep = log_priors >= log_prior_threshold
+    kept_hypothesis_indices = np.flatnonzero(keep)
+    if len(kept_hypothesis_indices) == 0:
+        raise ValueError("UH-OH! The log_prior_threshold is higher than the LOG prior of every hypothesis.")
+    removed_log_priors = log_priors[~keep].astype(np.float64)
+    if len(removed_log_priors) == 0:
+        removed_prior_mass = 0.
+    else:
+        removed_prior_mass = np.exp(scipy.special.logsumexp(removed_log_priors))
+    removed_prior_mass_bound = len(removed_log_priors) * np.exp(log_prior_threshold)
+    kept_log_priors = normalize_log_probs(log_priors[kept_hypothesis_indices])
+    return kept_hypothesis_indices, kept_log_priors, removed_prior_mass, removed_prior_mass_bound
+
+
 ###################################################################################################################
 # NOW SOME FUNCTIONS THAT HANDLE PRODUCTION, NOISY PRODUCTION, AND RECEPTION WITH AND WITHOUT REPAIR:
 
@@ -1236,12 +1362,72 @@ def receive_with_repair(language, utterance, mutual_understanding_pressure, mini
 
 # AND NOW FOR THE FUNCTIONS THAT DO THE BAYESIAN LEARNING:
 
-def update_posterior(log_posterior, hypotheses, topic, meanings, forms, noisy_variants, utterance, ambiguity_penalty, error_prob, prob_of_noise, all_possible_forms):
+scratch_buffers = {}  # one flat scratch array per dtype that is reused across calls of normalize_log_probs(), keyed by
+# dtype; it only ever grows to the size of the largest array requested so far
+
+
+def get_scratch_buffer(shape, dtype):
     """
-    Takes a LOG posterior probability distribution and a <topic, utterance> pair, and updates the posterior probability
-    distribution accordingly
+    Returns a scratch array of the given shape and dtype, as a view of the start of a single flat buffer per dtype. The
+    buffer is only reallocated when a larger array is requested than ever before, so the memory that is kept is bounded
+    by the largest array (rather than growing with every distinct shape that is requested). Its contents are
+    undefined, and may be overwritten by any later call.
+
+    :param shape: the shape of the scratch array (tuple)
+    :param dtype: the dtype of the scratch array
+    :return: numpy array of the given shape and dtype
+    """
+    size = int(np.prod(shape))
+    key = np.dtype(dtype).str
+    if key not in scratch_buffers or len(scratch_buffers[key]) < size:
+        scratch_buffers[key] = np.empty(size, dtype=dtype)
+    return scratch_buffers[key][:size].reshape(shape)
+
+
+def normalize_log_probs(log_probs, out=None):
+    """
+    Normalizes a 1D numpy array of LOG probabilities (or each row of a 2D numpy array, such as a population), keeping
+    its dtype (so this works for both float64 and float32 posteriors). The values are shifted by their maximum before
+    exponentiating, and the exponentiated values are summed in float64, so that normalizing stays numerically safe in
+    single precision as well. The exponentiated values are written into a reused scratch buffer (see
+    get_scratch_buffer()), so apart from the result no temporary arrays are allocated.
+
+    :param log_probs: 1D numpy array of (unnormalized) LOG probabilities, or 2D numpy array with one (unnormalized) LOG
+    probability distribution per row
+    :param out: (optional) numpy array of the same shape as log_probs that the result is written into; this may be
+    log_probs itself, in which case log_probs is normalized in place
+    :return: numpy array of normalized LOG probabilities, of the same shape and dtype as log_probs (out, if given)
+    """
+    max_log_prob = np.max(log_probs, axis=-1, keepdims=True)
+    scratch = get_scratch_buffer(log_probs.shape, log_probs.dtype)
+    np.subtract(log_probs, max_log_prob, out=scratch)
+    np.exp(scratch, out=scratch)
+    sum_of_probs = np.sum(scratch, axis=-1, keepdims=True, dtype=np.float64)
+    log_total = max_log_prob.astype(np.float64) + np.log(sum_of_probs)
+    if out is None:
+        return np.subtract(log_probs, log_total, dtype=log_probs.dtype)
+    return np.subtract(log_probs, log_total, out=out, casting='same_kind')
+
+
+def add_and_normalize_in_place(log_posterior, log_likelihoods):
+    """
+    Updates a LOG posterior in place: adds the LOG likelihoods (multiplication in probability space) and normalizes
+    the result, without allocating any temporary arrays. This is what a single posterior update comes down to once the
+    LOG likelihoods are known.
+
+    :param log_posterior: 1D numpy array containing LOG posterior probability values for each hypothesis (e.g. a row of
+    the population); this array is overwritten with the updated (and normalized) LOG posterior
+    :param log_likelihoods: 1D numpy array containing the LOG likelihood of the observed data for each hypothesis
+    :return: log_posterior (the same array, updated in place)
+    """
+    np.add(log_posterior, log_likelihoods, out=log_posterior, casting='same_kind')
+    return normalize_log_probs(log_posterior, out=log_posterior)
+
+
+def log_likelihoods_per_hypothesis(hypotheses, topic, meanings, forms, noisy_variants, utterance, ambiguity_penalty, error_prob, prob_of_noise, all_possible_forms):
+    """
+    Calculates the LOG likelihood of a single <topic, utterance> pair under each hypothesis
 
-    :param log_posterior: 1D numpy array containing LOG posterior probability values for each hypothesis
     :param hypotheses: list of all possible languages
     :param topic: a topic (string from the global variable meanings)
     :param meanings: list of all possible meanings; corresponds to global variable 'meanings'
@@ -1255,49 +1441,391 @@ def update_posterior(log_posterior, hypotheses, topic, meanings, forms, noisy_va
     :param prob_of_noise: the probability of noise; corresponds to global variable 'noise_prob'
     :param all_possible_forms: list of all possible forms INCLUDING noisy variants; corresponds to global variable
     'all_forms_including_noisy_variants'
-    :return: the updated (and normalized) log_posterior (1D numpy array)
+    :return: 1D numpy array containing the LOG likelihood of the <topic, utterance> pair for each hypothesis
     """
     # First, let's find out what the index of the utterance is in the list of all possible forms (including the noisy
     # variants):
     for i in range(len(all_possible_forms)):
         if all_possible_forms[i] == utterance:
             utterance_index = i
-    # Now, let's go through each hypothesis (i.e. language), and update its posterior probability given the
-    # <topic, utterance> pair that was given as input:
-    new_log_posterior = []
-    for j in range(len(log_posterior)):
+    log_likelihoods = np.zeros(len(hypotheses))
+    for j in range(len(hypotheses)):
         hypothesis = hypotheses[j]
         if prob_of_noise > 0.0:
             likelihood_per_form_array = production_likelihoods_with_noise(hypothesis, topic, meanings, forms, noisy_variants, ambiguity_penalty, error_prob, prob_of_noise)
         else:
             likelihood_per_form_array = production_likelihoods_kirby_et_al(hypothesis, topic, meanings, ambiguity_penalty, error)
         log_likelihood_per_form_array = np.log(likelihood_per_form_array)
-        new_log_posterior.append(log_posterior[j] + log_likelihood_per_form_array[utterance_index])
+        log_likelihoods[j] = log_likelihood_per_form_array[utterance_index]
+    return log_likelihoods
+
+
+def update_posterior(log_posterior, hypotheses, topic, meanings, forms, noisy_variants, utterance, ambiguity_penalty, error_prob, prob_of_noise, all_possible_forms):
+    """
+    Takes a LOG posterior probability distribution and a <topic, utterance> pair, and updates the posterior probability
+    distribution accordingly
+
+    :param log_posterior: 1D numpy array containing LOG posterior probability values for each hypothesis
+    :param hypotheses: list of all possible languages
+    :param topic: a topic (string from the global variable meanings)
+    :param meanings: list of all possible meanings; corresponds to global variable 'meanings'
+    :param forms: list of strings corresponding to all possible forms_without_noisy_variants
+    :param noisy_variants: list of all possible noisy variants of forms
+    :param utterance: an utterance (string from the global variable forms (can be a noisy form if parameter noise is
+    True)
+    :param ambiguity_penalty: parameter that determines extent to which speaker tries to avoid ambiguity; corresponds
+    to global variable 'gamma'
+    :param error_prob: the probability of making an error in production
+    :param prob_of_noise: the probability of noise; corresponds to global variable 'noise_prob'
+    :param all_possible_forms: list of all possible forms INCLUDING noisy variants; corresponds to global variable
+    'all_forms_including_noisy_variants'
+    :return: the updated (and normalized) log_posterior (1D numpy array)
+    """
+    # Now, let's go through each hypothesis (i.e. language), and update its posterior probability given the
+    # <topic, utterance> pair that was given as input:
+    new_log_posterior = np.array(log_posterior)
+    add_and_normalize_in_place(new_log_posterior, log_likelihoods_per_hypothesis(hypotheses, topic, meanings, forms, noisy_variants, utterance, ambiguity_penalty, error_prob, prob_of_noise, all_possible_forms))
+
+    return new_log_posterior
+
+
+def dataset_to_count_matrix(data, meaning_list, all_possible_forms):
+    """
+    Reduces a dataset to the number of times each <meaning, form> pair occurs in it. Because Bayesian updating
+    commutes, this is all that is needed to learn from the dataset.
+
+    :param data: a list of <meaning, form> pairs (tuples of two strings)
+    :param meaning_list: list containing all possible meanings; corresponds to global variable 'meanings'
+    :param all_possible_forms: list of all possible forms INCLUDING noisy variants; corresponds to global variable
+    'all_forms_including_noisy_variants'
+    :return: 2D numpy array of ints with axis 0 = meanings and axis 1 = all possible forms, containing the number of
+    times each <meaning, form> pair occurs in data
+    """
+    meaning_indices = {meaning: i for i, meaning in enumerate(meaning_list)}
+    form_indices = {form: i for i, form in enumerate(all_possible_forms)}
+    count_matrix = np.zeros((len(meaning_list), len(all_possible_forms)), dtype=int)
+    for meaning, utterance in data:
+        count_matrix[meaning_indices[meaning], form_indices[utterance]] += 1
+    return count_matrix
+
+
+def datasets_to_observations(agent_indices, datasets, meaning_list, all_possible_forms):
+    """
+    Turns the datasets that a number of agents learn from into three equally long vectors of observations: which agent
+    observes which <meaning, form> pair (e.g. for update_population_from_cache()).
+
+    :param agent_indices: list of the indices of the agents (in the population) that learn from the datasets
+    :param datasets: list containing the dataset (a list of <meaning, form> pairs) that each of these agents learns from
+    :param meaning_list: list containing all possible meanings; corresponds to global variable 'meanings'
+    :param all_possible_forms: list of all possible forms INCLUDING noisy variants; corresponds to global variable
+    'all_forms_including_noisy_variants'
+    :return: (1) 1D numpy array of agent indices, (2) 1D numpy array of meaning indices and (3) 1D numpy array of
+    utterance indices (in all_possible_forms), with one entry per observation
+    """
+    meaning_indices = {meaning: i for i, meaning in enumerate(meaning_list)}
+    form_indices = {form: i for i, form in enumerate(all_possible_forms)}
+    observation_agents = []
+    observation_meanings = []
+    observation_utterances = []
+    for agent_index, data in zip(agent_indices, datasets):
+        for meaning, utterance in data:
+            observation_agents.append(agent_index)
+            observation_meanings.append(meaning_indices[meaning])
+            observation_utterances.append(form_indices[utterance])
+    return np.array(observation_agents, dtype=int), np.array(observation_meanings, dtype=int), np.array(observation_utterances, dtype=int)
+
+
+def learn_dataset(log_posterior, hypotheses, data, meanings, forms, noisy_variants, ambiguity_penalty, error_prob, prob_of_noise, all_possible_forms):
+    """
+    Takes a LOG posterior probability distribution and a whole dataset of <topic, utterance> pairs, and updates the
+    posterior probability distribution accordingly. This gives the same result as calling update_posterior() on each
+    datapoint in turn, but the log likelihoods of each distinct <topic, utterance> pair are only computed once (and
+    weighted by the number of times the pair occurs in the dataset), and the posterior is only normalized once at the
+    end.
+
+    :param log_posterior: 1D numpy array containing LOG posterior probability values for each hypothesis
+    :param hypotheses: list of all possible languages
+    :param data: a list of <topic, utterance> pairs (tuples of two strings)
+    :param meanings: list of all possible meanings; corresponds to global variable 'meanings'
+    :param forms: list of strings corresponding to all possible forms_without_noisy_variants
+    :param noisy_variants: list of all possible noisy variants of forms
+    :param ambiguity_penalty: parameter that determines extent to which speaker tries to avoid ambiguity; corresponds
+    to global variable 'gamma'
+    :param error_prob: the probability of making an error in production
+    :param prob_of_noise: the probability of noise; corresponds to global variable 'noise_prob'
+    :param all_possible_forms: list of all possible forms INCLUDING noisy variants; corresponds to global variable
+    'all_forms_including_noisy_variants'
+    :return: the updated (and normalized) log_posterior (1D numpy array)
+    """
+    count_matrix = dataset_to_count_matrix(data, meanings, all_possible_forms)
+    new_log_posterior = np.array(log_posterior)
+    # Only the <topic, utterance> pairs that actually occur in the dataset are added (multiplying the log likelihoods
+    # of all other pairs by a count of 0 would give nan wherever a log likelihood is -inf):
+    for meaning_index, utterance_index in zip(*np.nonzero(count_matrix)):
+        log_likelihoods = log_likelihoods_per_hypothesis(hypotheses, meanings[meaning_index], meanings, forms, noisy_variants, all_possible_forms[utterance_index], ambiguity_penalty, error_prob, prob_of_noise, all_possible_forms)
+        new_log_posterior += count_matrix[meaning_index, utterance_index] * log_likelihoods
+    return normalize_log_probs(new_log_posterior, out=new_log_posterior)
+
+
+def get_log_likelihoods_from_cache(log_likelihood_cache, meaning_index, utterance_index):
+    """
+    Retrieves the LOG likelihood of a single <meaning, form> pair for each hypothesis from a log_likelihood_cache,
+    regardless of whether the cache is stored as a dense 3D numpy array or in one of the compact representations.
+
+    :param log_likelihood_cache: either a 3D numpy array with axis 0 = meanings, axis 1 = all possible forms, and axis
+    2 = LOG likelihood of corresponding <meaning, form> pair for each hypothesis, or one of the compact cache
+    representations in likelihood_cache.py (a FactorisedLikelihoodCache or a QuantisedLikelihoodCache)
+    :param meaning_index: index of the meaning in the list of meanings
+    :param utterance_index: index of the utterance in the list of all possible forms (incl. noisy variants)
+    :return: 1D numpy array containing the LOG likelihood of the <meaning, form> pair for each hypothesis
+    """
+    if isinstance(log_likelihood_cache, np.ndarray):
+        return log_likelihood_cache[meaning_index][utterance_index]
+    else:
+        return log_likelihood_cache.log_likelihoods(meaning_index, utterance_index)
+
+
+def get_log_likelihood_block_from_cache(log_likelihood_cache, meaning_indices, utterance_indices):
+    """
+    Retrieves the LOG likelihoods of a number of <meaning, form> pairs for each hypothesis from a log_likelihood_cache
+    at once, regardless of whether the cache is stored as a dense 3D numpy array or in one of the compact
+    representations.
 
-    new_log_posterior_normalized = np.subtract(new_log_posterior, scipy.special.logsumexp(new_log_posterior))
+    :param log_likelihood_cache: either a 3D numpy array with axis 0 = meanings, axis 1 = all possible forms, and axis
+    2 = LOG likelihood of corresponding <meaning, form> pair for each hypothesis, or one of the compact cache
+    representations in likelihood_cache.py (a FactorisedLikelihoodCache or a QuantisedLikelihoodCache)
+    :param meaning_indices: 1D numpy array of meaning indices
+    :param utterance_indices: 1D numpy array of utterance indices (of the same length as meaning_indices)
+    :return: 2D numpy array with one row per <meaning, form> pair, containing the LOG likelihood of that pair for each
+    hypothesis
+    """
+    if isinstance(log_likelihood_cache, np.ndarray):
+        return log_likelihood_cache[meaning_indices, utterance_indices]
+    else:
+        return log_likelihood_cache.log_likelihood_block(meaning_indices, utterance_indices)
 
-    return new_log_posterior_normalized
+
+def update_posterior_from_cache(log_posterior, log_likelihood_cache, topic, utterance, meaning_list, all_possible_forms):
+    """
+    Takes a LOG posterior probability distribution and a <topic, utterance> pair, and updates the posterior probability
+    distribution accordingly
+
+    :param log_posterior: 1D numpy array containing LOG posterior probability values for each hypothesis
+    :param log_likelihood_cache: either a 3D numpy array with axis 0 = meanings, axis 1 = all possible forms, and axis
+    2 = LOG likelihood of corresponding <meaning, form> pair for each hypothesis, or one of the compact cache
+    representations in likelihood_cache.py (a FactorisedLikelihoodCache or a QuantisedLikelihoodCache)
+    :param topic: a topic (string from the global variable meanings)
+    :param utterance: an utterance (string from the global variable forms (can be a noisy form if parameter noise is
+    True)
+    :param meaning_list: list containing all possible meanings; corresponds to global variable 'meanings'
+    :param all_possible_forms: list of all possible forms INCLUDING noisy variants; corresponds to global variable
+    'all_forms_including_noisy_variants'
+    :return: the updated (and normalized) log_posterior (1D numpy array)
+    """
+    # First let's find out what the index of the meaning is:
+    for i in range(len(meaning_list)):
+        if meaning_list[i] == topic:
+            meaning_index = i
+    # Then, let's find out what the index of the utterance is in the list of all possible forms (including the noisy
+    # variants):
+    for i in range(len(all_possible_forms)):
+        if all_possible_forms[i] == utterance:
+            utterance_index = i
+    # Now, let's retrieve the corresponding log_likelihood values for this particular <meaning, form> pair form the
+    # log_likelihood_cache, and update the posterior accordingly (addition in logspace == multiplication in probability
+    # space).
+    # (The dtype of log_posterior is kept, so that the whole update happens in float32 if the population is stored in
+    # float32.)
+    new_log_posterior_new_method = np.add(log_posterior, get_log_likelihoods_from_cache(log_likelihood_cache, meaning_index, utterance_index), dtype=log_posterior.dtype)
+    new_log_posterior_normalized_new_method = normalize_log_probs(new_log_posterior_new_method, out=new_log_posterior_new_method)
+    return new_log_posterior_normalized_new_method
+
+
+def learn_dataset_from_cache(log_posterior, log_likelihood_cache, data, meaning_list, all_possible_forms):
+    """
+    Takes a LOG posterior probability distribution and a whole dataset of <topic, utterance> pairs, and updates the
+    posterior probability distribution accordingly. Because Bayesian updating commutes, this gives the same result as
+    calling update_posterior_from_cache() on each datapoint in turn; but here the dataset is first reduced to a count
+    per <meaning, form> pair, the cached log likelihoods of each pair that occurs are added once (weighted by its
+    count), and the posterior is only normalized once at the end.
+
+    :param log_posterior: 1D numpy array containing LOG posterior probability values for each hypothesis
+    :param log_likelihood_cache: either a 3D numpy array with axis 0 = meanings, axis 1 = all possible forms, and axis
+    2 = LOG likelihood of corresponding <meaning, form> pair for each hypothesis, or one of the compact cache
+    representations in likelihood_cache.py (a FactorisedLikelihoodCache or a QuantisedLikelihoodCache)
+    :param data: a list of <topic, utterance> pairs (tuples of two strings)
+    :param meaning_list: list containing all possible meanings; corresponds to global variable 'meanings'
+    :param all_possible_forms: list of all possible forms INCLUDING noisy variants; corresponds to global variable
+    'all_forms_including_noisy_variants'
+    :return: the updated (and normalized) log_posterior (1D numpy array)
+    """
+    count_matrix = dataset_to_count_matrix(data, meaning_list, all_possible_forms)
+    new_log_posterior = np.array(log_posterior)
+    # Only the <meaning, form> pairs that actually occur in the dataset are added (multiplying the log likelihoods of
+    # all other pairs by a count of 0 would give nan wherever a log likelihood is -inf):
+    for meaning_index, utterance_index in zip(*np.nonzero(count_matrix)):
+        log_likelihoods = get_log_likelihoods_from_cache(log_likelihood_cache, meaning_index, utterance_index)
+        new_log_posterior += np.multiply(count_matrix[meaning_index, utterance_index], log_likelihoods, dtype=new_log_posterior.dtype)
+    return normalize_log_probs(new_log_posterior, out=new_log_posterior)
+
+
+def update_population_from_cache(population, log_likelihood_cache, agent_indices, meaning_indices, utterance_indices):
+    """
+    Updates the posteriors of (part of) a population *in place* based on a batch of observations, where each
+    observation is a <meaning, form> pair observed by one agent. The observations are first reduced to distinct
+    <agent, meaning, form> triples with a count, the LOG likelihoods of all of these are gathered from the cache as a
+    single block and added to the corresponding agents' posteriors (weighted by their counts), and then the posteriors
+    of all updated agents are normalized row-wise in one go. This gives the same result as calling
+    update_posterior_from_cache() for each observation in turn.
+
+    :param population: 2D numpy array with one LOG posterior probability distribution per agent (i.e. the population as
+    returned by new_population()), or one of the population representations in learner_representations.py; this is
+    updated in place
+    :param log_likelihood_cache: either a 3D numpy array with axis 0 = meanings, axis 1 = all possible forms, and axis
+    2 = LOG likelihood of corresponding <meaning, form> pair for each hypothesis, or one of the compact cache
+    representations in likelihood_cache.py (a FactorisedLikelihoodCache or a QuantisedLikelihoodCache)
+    :param agent_indices: 1D numpy array containing the index of the observing agent for each observation
+    :param meaning_indices: 1D numpy array containing the index of the observed meaning for each observation
+    :param utterance_indices: 1D numpy array containing the index of the observed utterance (in the list of all possible
+    forms incl. noisy variants) for each observation
+    :return: population (the same array, updated in place)
+    """
+    if not isinstance(population, np.ndarray):  # one of the population representations in learner_representations.py
+        return population.update(agent_indices, meaning_indices, utterance_indices)
+    observations = np.stack((agent_indices, meaning_indices, utterance_indices), axis=1)
+    distinct_observations, counts = np.unique(observations, axis=0, return_counts=True)
+    log_likelihood_block = get_log_likelihood_block_from_cache(log_likelihood_cache, distinct_observations[:, 1], distinct_observations[:, 2]).astype(population.dtype, copy=False)
+    # Only the rows of observations that occur more than once have to be weighted by their count (and because every
+    # count is at least 1, the -inf LOG likelihoods never get multiplied by 0):
+    repeated = counts > 1
+    if np.any(repeated):
+        log_likelihood_block[repeated] *= counts[repeated, np.newaxis]
+    # np.unique() sorts the distinct observations by agent, so the rows of the block that belong to the same agent are
+    # contiguous and can be summed with a single reduceat:
+    updated_agents, first_rows = np.unique(distinct_observations[:, 0], return_index=True)
+    summed_log_likelihoods = np.add.reduceat(log_likelihood_block, first_rows, axis=0)
+    # Each agent's row is then updated in place (rather than through a fancy-indexed copy of the updated rows):
+    for agent_index, agent_log_likelihoods in zip(updated_agents, summed_log_likelihoods):
+        add_and_normalize_in_place(population[agent_index], agent_log_likelihoods)
+    return population
+
+
+def dataset_count_signature(data):
+    """
+    Turns a dataset into a canonical signature of the number of times each <meaning, form> pair occurs in it. Two
+    datasets that contain the same <meaning, form> pairs the same number of times (regardless of their order) have the
+    same signature, and result in the same learned posterior when learned from the same prior.
+
+    :param data: a list of <meaning, form> pairs (tuples of two strings)
+    :return: a tuple of (<meaning, form> pair, count) tuples, sorted by <meaning, form> pair
+    """
+    return tuple(sorted(Counter(data).items()))
+
+
+class LearnedPosteriorCache:
+    """
+    A bounded least-recently-used cache of learned LOG posteriors, keyed by the count signature of the dataset that
+    they were learned from (see dataset_count_signature()). Because the learned posterior only depends on the prior and
+    the counts of the <meaning, form> pairs in the dataset, it doesn't have to be recomputed when a later generation (or
+    run) learns a dataset with the same signature from the same prior. A LearnedPosteriorCache is only valid for a single
+    prior and a single setting of the likelihood parameters, so a new one should be created for each condition. When the
+    cached posteriors together take up more than max_bytes, the least recently used ones are evicted.
+    """
+
+    def __init__(self, max_bytes):
+        """
+        :param max_bytes: the maximum number of bytes that the cached posteriors may take up together
+        """
+        self.max_bytes = max_bytes
+        self.log_posteriors = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, signature):
+        """
+        :param signature: the count signature of a dataset (see dataset_count_signature())
+        :return: the cached LOG posterior learned from a dataset with this signature (1D numpy array, read-only), or None
+        if it isn't cached
+        """
+        if signature in self.log_posteriors:
+            self.log_posteriors.move_to_end(signature)
+            self.hits += 1
+            return self.log_posteriors[signature]
+        self.misses += 1
+        return None
+
+    def put(self, signature, log_posterior):
+        """
+        Stores a learned LOG posterior (as a read-only copy), and evicts the least recently used posteriors if the cache
+        has become too big.
+
+        :param signature: the count signature of the dataset that log_posterior was learned from (see
+        dataset_count_signature())
+        :param log_posterior: 1D numpy array containing the learned LOG posterior probability values for each hypothesis
+        """
+        if signature in self.log_posteriors or log_posterior.nbytes > self.max_bytes:
+            return
+        log_posterior = np.array(log_posterior)
+        log_posterior.flags.writeable = False
+        self.log_posteriors[signature] = log_posterior
+        self.nbytes += log_posterior.nbytes
+        while self.nbytes > self.max_bytes:
+            evicted_signature, evicted_log_posterior = self.log_posteriors.popitem(last=False)
+            self.nbytes -= evicted_log_posterior.nbytes
+
+    def hit_rate(self):
+        """
+        :return: the proportion of lookups that found a cached posterior (0.0 if there haven't been any lookups yet)
+        """
+        if self.hits + self.misses == 0:
+            return 0.0
+        return self.hits / (self.hits + self.misses)
 
 
 def normalize_logprobs_simlang(logprobs):
     """
-    This function is copied directly from lab 21 of the SimLang course of 2019.
+    This function is copied from lab 21 of the SimLang course of 2019. I only replaced the loop that builds the list
+    of normalised LOG probabilities by a single vectorised subtraction (under the "# Changed by me" comment).
 
     :param logprobs: a list of LOG probabilities
-    :return: a list of normalised LOG probabilities
+    :return: a numpy array of normalised LOG probabilities
     """
     logtotal = scipy.special.logsumexp(logprobs) #calculates the summed log probabilities
-    normedlogs = []
-    for logp in logprobs:
-        normedlogs.append(logp - logtotal) #normalise - subtracting in the log domain equivalent to divising in the
-                                            # normal domain
+    # Changed by me:
+    normedlogs = np.subtract(logprobs, logtotal) #normalise - subtracting in the log domain equivalent to divising in
+                                                 # the normal domain
     return normedlogs
 
 
+simlang_form_indices = {}  # the form index per language (see create_form_index_per_language()) of each hypothesis
+# space that update_posterior_simlang() has been called with, keyed by the id() of the list of hypotheses
+
+
+def get_simlang_form_index_per_language(hypotheses, forms):
+    """
+    Returns the form index per language of a hypothesis space (see create_form_index_per_language()), which is only
+    built the first time it is requested for a given list of hypotheses, and reused by all later requests for that same
+    list. (The list itself is stored alongside, so that its id() can't be reused by another list while it's cached.)
+
+    :param hypotheses: list of all possible languages
+    :param forms: list of strings corresponding to all possible forms_without_noisy_variants
+    :return: 2D numpy array of shape (len(hypotheses), len(meanings)), containing for each language the index (in forms)
+    of the form that the language maps each meaning to
+    """
+    key = id(hypotheses)
+    if key not in simlang_form_indices or simlang_form_indices[key][0] is not hypotheses:
+        simlang_form_indices[key] = (hypotheses, create_form_index_per_language(hypotheses, forms))
+    return simlang_form_indices[key][1]
+
+
 def update_posterior_simlang(log_posterior, hypotheses, meaning, signal):
     """
     This function is copied directly from lab 21 of the SimLang course of 2019. I only renamed some of the variables
-    below, in order to make it work with my code (under the "# Added by me" comment).
+    below, in order to make it work with my code (under the "# Added by me" comment), and replaced the loop over the
+    hypotheses (which checked whether the meaning-signal pair was in each language as represented in SimLang; see
+    transform_all_languages_to_simlang_format()) by a single vectorised comparison of form indices (under the
+    "# Changed by me" comment), which gives exactly the same result.
 
     :param log_posterior: a list of LOG posterior probabilities
     :param hypotheses: list of all possible languages
@@ -1310,16 +1838,16 @@ def update_posterior_simlang(log_posterior, hypotheses, meaning, signal):
     # added by me:
     signals = forms_without_noise
     noise = error
-    all_langs_as_in_simlang = transform_all_languages_to_simlang_format(hypotheses, meanings)
 
     in_language = log(1 - noise)
     out_of_language = log(noise / (len(signals) - 1))
-    new_posterior = []
-    for i in range(len(log_posterior)):
-        if (meaning, signal) in all_langs_as_in_simlang[i]:
-            new_posterior.append(log_posterior[i] + in_language)
-        else:
-            new_posterior.append(log_posterior[i] + out_of_language)
+    # Changed by me:
+    if meaning in meanings and signal in signals:
+        form_index_per_language = get_simlang_form_index_per_language(hypotheses, signals)
+        in_language_mask = form_index_per_language[:, meanings.index(meaning)] == signals.index(signal)
+    else:  # (e.g. a repair initiator as the observed meaning, which isn't part of any language)
+        in_language_mask = np.zeros(len(log_posterior), dtype=bool)
+    new_posterior = np.add(log_posterior, np.where(in_language_mask, in_language, out_of_language))
     return normalize_logprobs_simlang(new_posterior)
 
 
@@ -1330,17 +1858,81 @@ def update_posterior_simlang(log_posterior, hypotheses, meaning, signal):
 def log_roulette_wheel(normedlogs):
     """
     Samples an index from a list of LOG probabilities, where each index has a probability proportional to their
-    probability of being chosen
+    probability of being chosen. The original version of this function walked through the list, accumulating the
+    probabilities with one call of scipy.special.logsumexp() per index until the random number was reached. I changed
+    this to building the cumulative distribution with a single exp and cumsum and finding the random number in it with
+    a single binary search (see posterior_cdf() and sample_from_cdf()), which uses the same random number and picks the
+    same index (up to rounding).
 
     :param normedlogs: a list of normalized LOG probabilities
     :return: an index somewhere between 0 and len(normedlogs)
     """
-    r = np.log(random.random())  # generate a random number in [0,1), then convert to log
-    accumulator = normedlogs[0]
-    for i in range(len(normedlogs)):
-        if r < accumulator:
-            return i
-        accumulator = scipy.special.logsumexp([accumulator, normedlogs[i + 1]])
+    # Changed by me:
+    return sample_from_cdf(posterior_cdf(normedlogs))
+
+
+def posterior_cdf(log_posterior):
+    """
+    Builds the cumulative distribution function (CDF) of a LOG probability distribution, with the probabilities
+    exponentiated and summed in float64 (also when log_posterior is float32). The CDF is normalized by its last value,
+    so that rounding errors can't leave the random number in sample_from_cdf() unreached.
+
+    :param log_posterior: 1D numpy array of normalized LOG probabilities
+    :return: 1D numpy array of float64 containing the cumulative probability up to and including each index
+    """
+    cdf = np.cumsum(np.exp(log_posterior, dtype=np.float64))
+    cdf /= cdf[-1]
+    return cdf
+
+
+def sample_from_cdf(cdf):
+    """
+    Samples an index from a cumulative distribution function with a single binary search. Just like the original
+    log_roulette_wheel(), this draws a single random number from random.random(), and returns the first index at which
+    the cumulative probability exceeds it.
+
+    :param cdf: 1D numpy array containing a cumulative distribution function (see posterior_cdf())
+    :return: an index somewhere between 0 and len(cdf)
+    """
+    index = int(np.searchsorted(cdf, random.random(), side='right'))
+    return min(index, len(cdf) - 1)
+
+
+class PosteriorCDFCache:
+    """
+    Caches the cumulative distribution function (see posterior_cdf()) of the posterior of each agent in a dense
+    population, so that sampling a language from an agent's posterior only takes a single binary search as long as its
+    posterior hasn't changed. The CDF of an agent is built the first time a language is sampled from its posterior, and
+    is reused until invalidate() is called for that agent, which has to happen whenever its posterior changes (e.g.
+    after it has been updated as a hearer). A PosteriorCDFCache is therefore only meant to live as long as a single
+    call of a population communication function, in which the hearer updates are the only changes to the population.
+    """
+
+    def __init__(self):
+        self.cdfs = {}
+        self.hits = 0
+        self.misses = 0
+
+    def sample(self, population, agent_index):
+        """
+        :param population: a population (2D numpy array)
+        :param agent_index: the index of the agent
+        :return: the index of a language sampled from the agent's posterior
+        """
+        if agent_index in self.cdfs:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.cdfs[agent_index] = posterior_cdf(population[agent_index])
+        return sample_from_cdf(self.cdfs[agent_index])
+
+    def invalidate(self, agent_index):
+        """
+        Removes the cached CDF of an agent whose posterior has changed.
+
+        :param agent_index: the index of the agent
+        """
+        self.cdfs.pop(agent_index, None)
 
 
 def sample(hypotheses, log_posterior):
@@ -1357,6 +1949,41 @@ def sample(hypotheses, log_posterior):
     return language, index
 
 
+def sample_batch(population, n_samples, max_block_size=2**24):
+    """
+    Samples n_samples languages (independently, with replacement) from the posterior of each agent in a dense
+    population, in one vectorized operation per block of agents: the cumulative distribution function of each agent's
+    posterior is built along the rows (see posterior_cdf()), row r is shifted by r so that the rows of the block can be
+    searched as one increasing array, and all random numbers of the block are then looked up in it with a single call
+    of np.searchsorted(). Unlike log_roulette_wheel(), the random numbers are drawn from np.random (one array per
+    block).
+
+    :param population: a population (2D numpy array), where each agent is simply a LOG posterior probability
+    distribution
+    :param n_samples: the number of languages to sample for each agent (int)
+    :param max_block_size: the maximum number of elements (agents * hypotheses) for which the cumulative distribution
+    functions are built at once; larger populations are sampled in blocks of agents, to bound the memory that is used
+    :return: 2D numpy array of shape (len(population), n_samples) containing the indices (in the hypotheses list) of
+    the sampled languages
+    """
+    n_agents, n_hypotheses = population.shape
+    block_length = max(1, max_block_size // n_hypotheses)
+    sampled_indices = np.zeros((n_agents, n_samples), dtype=int)
+    for start in range(0, n_agents, block_length):
+        block = population[start:start+block_length]
+        cdfs = np.cumsum(np.exp(block, dtype=np.float64), axis=1)
+        cdfs /= cdfs[:, -1:]
+        offsets = np.arange(len(block))[:, np.newaxis]
+        cdfs += offsets
+        random_floats = np.random.random((len(block), n_samples)) + offsets
+        indices = np.searchsorted(cdfs.ravel(), random_floats.ravel(), side='right').reshape(len(block), n_samples)
+        indices -= offsets * n_hypotheses
+        np.clip(indices, 0, n_hypotheses - 1, out=indices)  # (rounding can leave a random number just above the last
+        # value of its row's CDF)
+        sampled_indices[start:start+block_length] = indices
+    return sampled_indices
+
+
 # NOW THE FUNCTION THAT CREATE A NEW POPULATION, AND MAKES A POPULATION COMMUNICATE (FOR THE INTRA-GENERATIONAL
 # INTERACTION ROUNDS):
 
@@ -1380,7 +2007,7 @@ def new_population(pop_size, log_priors):
 #  separate functions (e.g. for the different possible settings of the mutual_understanding and minimal_effort
 #  parameters. Also, there has to be a way to not have exactly the same lines of code for doing the communicative
 #  success pressure stuff in there twice (should probably be a separate function)!
-def population_communication(population, n_parents, n_rounds, interaction_order, production_implementation, mutual_understanding_pressure, minimal_effort_pressure, ambiguity_penalty, error_prob, prob_of_noise, communicative_success_pressure, hypotheses, meaning_list, forms, noisy_variants, possible_form_lengths):
+def population_communication(population, n_parents, n_rounds, interaction_order, production_implementation, mutual_understanding_pressure, minimal_effort_pressure, ambiguity_penalty, error_prob, prob_of_noise, communicative_success_pressure, hypotheses, meaning_list, forms, noisy_variants, possible_form_lengths, log_likelihood_cache=None):
     """
     Takes a population, makes it communicate for a number of rounds (where agents' posterior probability distribution
     is updated every time the agent gets assigned the role of hearer)
@@ -1406,6 +2033,8 @@ def population_communication(population, n_parents, n_rounds, interaction_order,
     :param forms: list of strings corresponding to all possible forms_without_noisy_variants
     :param noisy_variants: list of all possible noisy variants of forms
     :param possible_form_lengths: all possible form lengths (global parameter)
+    :param log_likelihood_cache: (optional) the log_likelihood_cache for the same parameter settings, which the hearers'
+    posterior updates look their LOG likelihoods up in (see update_agent_posterior())
     :return: (1) the data that was produced during the communication rounds, as a list of (topic, utterance) tuples; (2) the sampled_languages_array which lists the indices of the languages (in the hypotheses list) that was sampled per agent per round
     """
     if n_parents == 'single':
@@ -1416,6 +2045,7 @@ def population_communication(population, n_parents, n_rounds, interaction_order,
     data = []
     data_for_just_in_case = []
     sampled_languages_array = np.zeros((len(population), n_rounds))
+    cdf_cache = PosteriorCDFCache()  # (an agent's cached CDF is invalidated below whenever it is updated as a hearer)
     for i in range(n_rounds):
         if interaction_order == 'taking_turns':
             if len(population) != 2:
@@ -1432,8 +2062,8 @@ def population_communication(population, n_parents, n_rounds, interaction_order,
             speaker_index = pair_indices[0]
             hearer_index = pair_indices[1]
         topic = random.choice(meaning_list)
-        speaker_language, speaker_lang_index = sample(hypotheses, population[speaker_index])
-        hearer_language, hearer_lang_index = sample(hypotheses, population[hearer_index])
+        speaker_language, speaker_lang_index = sample_from_population(population, hypotheses, speaker_index, cdf_cache)
+        hearer_language, hearer_lang_index = sample_from_population(population, hypotheses, hearer_index, cdf_cache)
         if speaker_index == 0:
             sampled_languages_array[0][i] = speaker_lang_index
             sampled_languages_array[1][i] = hearer_lang_index
@@ -1473,9 +2103,9 @@ def population_communication(population, n_parents, n_rounds, interaction_order,
                     # time
             else:
                 if observed_meaning == 'intended':
-                    population[hearer_index] = update_posterior(population[hearer_index], hypotheses, topic, meanings, forms, noisy_variants, utterance, ambiguity_penalty, error, prob_of_noise, all_forms_including_noisy_variants)
+                    update_agent_posterior(population, hearer_index, hypotheses, topic, meanings, forms, noisy_variants, utterance, ambiguity_penalty, error, prob_of_noise, all_forms_including_noisy_variants, log_likelihood_cache=log_likelihood_cache)
                 elif observed_meaning == 'inferred':
-                    population[hearer_index] = update_posterior(population[hearer_index], hypotheses, listener_response, meanings, forms, noisy_variants, utterance, ambiguity_penalty, error, prob_of_noise, all_forms_including_noisy_variants)
+                    update_agent_posterior(population, hearer_index, hypotheses, listener_response, meanings, forms, noisy_variants, utterance, ambiguity_penalty, error, prob_of_noise, all_forms_including_noisy_variants, log_likelihood_cache=log_likelihood_cache)
 
         elif mutual_understanding_pressure is False:
             if production_implementation == 'simlang':
@@ -1498,10 +2128,11 @@ def population_communication(population, n_parents, n_rounds, interaction_order,
                     # time
             else:
                 if observed_meaning == 'intended':
-                    population[hearer_index] = update_posterior(population[hearer_index], hypotheses, topic, meanings, forms, noisy_variants, utterance, ambiguity_penalty, error_prob, prob_of_noise, all_forms_including_noisy_variants)
+                    update_agent_posterior(population, hearer_index, hypotheses, topic, meanings, forms, noisy_variants, utterance, ambiguity_penalty, error_prob, prob_of_noise, all_forms_including_noisy_variants, log_likelihood_cache=log_likelihood_cache)
                 elif observed_meaning == 'inferred':
                     inferred_meaning = receive_without_repair(hearer_language, utterance)
-                    population[hearer_index] = update_posterior(population[hearer_index], hypotheses, inferred_meaning, meanings, forms, noisy_variants, utterance, ambiguity_penalty, error_prob, prob_of_noise, all_forms_including_noisy_variants)
+                    update_agent_posterior(population, hearer_index, hypotheses, inferred_meaning, meanings, forms, noisy_variants, utterance, ambiguity_penalty, error_prob, prob_of_noise, all_forms_including_noisy_variants, log_likelihood_cache=log_likelihood_cache)
+        cdf_cache.invalidate(hearer_index)  # (the hearer's posterior has just been updated)
 
         if n_parents == 'single':
 
@@ -1615,7 +2246,63 @@ def dataset_from_language(language, meaning_list):
     return meaning_form_pairs
 
 
-def create_initial_dataset(desired_class, bottleneck, language_list, class_per_language, meaning_list, possible_form_lengths):
+def compositional_candidate_languages(forms, meaning_list):
+    """
+    Creates all languages in which each form is built by concatenating a substring for each meaning feature value (in
+    either order), or by reduplicating such a form of one character per meaning feature. Every degenerate or
+    compositional language (of any of the compositional classes that classify_language() distinguishes) is among
+    these candidates, so a language of those classes can be chosen from them without enumerating the full hypothesis
+    space. NOTE that this function assumes that meanings consist of exactly 2 features.
+
+    :param forms: list of strings corresponding to all possible forms_without_noisy_variants
+    :param meaning_list: list of all possible meanings; corresponds to global variable 'meanings'
+    :return: list of tuples which represent languages (see create_all_possible_languages()); only languages that
+    consist of forms in the forms list are included
+    """
+    characters = sorted(set(''.join(forms)))
+    feature_values = sorted(set(''.join(meaning_list)))
+    form_lengths = sorted(set(len(form) for form in forms if len(form) % 2 == 0))
+    candidates = set()
+    for form_length in form_lengths:
+        for substrings in itertools.product(itertools.product(characters, repeat=form_length//2), repeat=len(feature_values)):
+            substring_per_value = {value: ''.join(substring) for value, substring in zip(feature_values, substrings)}
+            candidates.add(tuple(substring_per_value[meaning[0]]+substring_per_value[meaning[1]] for meaning in meaning_list))
+            candidates.add(tuple(substring_per_value[meaning[1]]+substring_per_value[meaning[0]] for meaning in meaning_list))
+    for characters_per_value in itertools.product(characters, repeat=len(feature_values)):
+        character_per_value = dict(zip(feature_values, characters_per_value))
+        for form_length in form_lengths:
+            candidates.add(tuple((character_per_value[meaning[0]]+character_per_value[meaning[1]])*(form_length//2) for meaning in meaning_list))
+    for form in forms:
+        candidates.add(tuple(form for meaning in meaning_list))
+    form_set = set(forms)
+    return sorted(language for language in candidates if all(form in form_set for form in language))
+
+
+def random_language_of_class(class_index, class_label, forms, meaning_list, max_n_attempts=10**6):
+    """
+    Chooses a random language of the desired class (with each language of that class equally likely) without
+    enumerating the full hypothesis space: degenerate and compositional languages are chosen from
+    compositional_candidate_languages(), and languages of the other classes by drawing a form for each meaning at random
+    until the language is of the desired class.
+
+    :param class_index: the index of the desired class (see classify_language())
+    :param class_label: the label of the desired class (see create_initial_dataset())
+    :param forms: list of strings corresponding to all possible forms_without_noisy_variants
+    :param meaning_list: list of all possible meanings; corresponds to global variable 'meanings'
+    :param max_n_attempts: the maximum number of random languages that is drawn for the other classes
+    :return: a language (tuple of forms, one for each meaning)
+    """
+    if class_label == 'degenerate' or 'compositional' in class_label:
+        class_languages = [language for language in compositional_candidate_languages(forms, meaning_list) if classify_language(language, forms, meaning_list) == class_index]
+        return random.choice(class_languages)
+    for attempt in range(max_n_attempts):
+        language = tuple(random.choice(forms) for meaning in meaning_list)
+        if classify_language(language, forms, meaning_list) == class_index:
+            return language
+    raise ValueError("UH-OH! No language of class '" + class_label + "' was found in " + str(max_n_attempts) + " attempts.")
+
+
+def create_initial_dataset(desired_class, bottleneck, language_list, class_per_language, meaning_list, possible_form_lengths, forms=None):
     """
     Creates a balanced dataset from a randomly chosen language of the desired class.
 
@@ -1628,6 +2315,9 @@ def create_initial_dataset(desired_class, bottleneck, language_list, class_per_l
     language at the corresponding index in the global variable hypothesis_space
     :param meaning_list: list of all possible meanings; corresponds to global variable 'meanings'
     :param possible_form_lengths: all possible form lengths (global parameter)
+    :param forms: (optional) list of strings corresponding to all possible forms_without_noisy_variants; only used if
+    language_list is None, in which case the language is chosen without enumerating all languages (see
+    random_language_of_class())
     :return: a dataset (list containing tuples, where each tuple is a meaning-form pair, with the meaning followed by
     the form) from a randomly chosen language of the desired class
     """
@@ -1646,11 +2336,14 @@ def create_initial_dataset(desired_class, bottleneck, language_list, class_per_l
         for i in range(len(class_labels)):
             if class_labels[i] == desired_class:
                 class_index = i
-    language_class_indices = np.where(class_per_language == class_index)[0]
-    class_languages = []
-    for index in language_class_indices:
-        class_languages.append(language_list[index])
-    random_language = random.choice(class_languages)
+    if language_list is None:
+        random_language = random_language_of_class(class_index, class_labels[class_index], forms, meaning_list)
+    else:
+        language_class_indices = np.where(class_per_language == class_index)[0]
+        class_languages = []
+        for index in language_class_indices:
+            class_languages.append(language_list[index])
+        random_language = random.choice(class_languages)
     meaning_form_pairs = dataset_from_language(random_language, meaning_list)
     if bottleneck % len(meaning_form_pairs) != 0:
         raise ValueError("OOPS! b needs to be a multiple of the number of meanings in order for this function to create a balanced dataset.")
@@ -1663,7 +2356,7 @@ def create_initial_dataset(desired_class, bottleneck, language_list, class_per_l
 # AND NOW A FUNCTION THAT RECORDS THE PROPORTION OF POSTERIOR PROBABILITY THAT IS ASSIGNED TO EACH LANGUAGE CLASS IN A
 # GIVEN GENERATION:
 
-def language_stats(population, possible_form_lengths, class_per_language):
+def language_stats(population, possible_form_lengths, class_per_language, proportion_measure='posterior', n_samples=1):
     """
     Tracks how well each of the language classes is represented in the populations' posterior probability distributions
 
@@ -1671,6 +2364,10 @@ def language_stats(population, possible_form_lengths, class_per_language):
     distribution
     :param possible_form_lengths: all possible form lengths (global parameter)
     :param class_per_language: list specifying the class for each corresponding language in the global variable 'hypothesis_space'
+    :param proportion_measure: can be set to either 'posterior' (the posterior probability assigned to each class is
+    averaged over the agents) or 'sampled' (each agent samples n_samples languages from its posterior, and the
+    proportion of sampled languages in each class is averaged over the agents; see sampled_language_stats())
+    :param n_samples: the number of languages that each agent samples if proportion_measure = 'sampled'
     :return: a list containing the overall average posterior probability assigned to each class of language in the
     population
     """
@@ -1682,23 +2379,185 @@ def language_stats(population, possible_form_lengths, class_per_language):
         stats = np.zeros(int(max(class_per_language)+1))  # if instead there are multiple possible form lengths, language classification
         # distinguishes between (0) degenerate, (1) holistic, (2) holistic_diversify_signal, (3) compositional,
         # (4) compositional_reduplicate_segments, (5) compositional_reduplicate_whole_signal, and (6) other
+    if proportion_measure == 'sampled':
+        return sampled_language_stats(sample_batch(population, n_samples), class_per_language)
+    elif proportion_measure != 'posterior':
+        raise ValueError("OOPS! proportion_measure can only be set to either 'posterior' or 'sampled'.")
+    class_indices = np.asarray(class_per_language).astype(int)
     for p in population:
-        for i in range(len(p)):
-            # if proportion_measure == 'posterior':  # Note that this will only work when the population has a size
-            # that is a reasonable multitude of the number of language classes
-            # stats[int(class_per_language[i])] += np.exp(p[i]) / len(population)
-
-            stats[int(class_per_language[i])] += np.exp(p[i])
-            # elif proportion_measure == 'sampled':
-            #     sampled_lang_index = log_roulette_wheel(p)
-            #     stats[int(class_per_language[sampled_lang_index])] += 1
+        # Note that this will only work when the population has a size that is a reasonable multitude of the number
+        # of language classes
+        stats += np.bincount(class_indices, weights=np.exp(p), minlength=len(stats))  # (bincount sums the weights in
+        # float64, also when the population is stored in float32)
     stats = np.divide(stats, len(population))
     return stats
 
 
+def sampled_language_stats(sampled_indices, class_per_language, n_classes=None):
+    """
+    Counts the proportion of sampled languages that falls in each of the language classes (i.e. the 'sampled'
+    proportion_measure of language_stats())
+
+    :param sampled_indices: 2D numpy array of shape (n_agents, n_samples) containing the indices (in the hypotheses
+    list) of the languages that each agent sampled (see sample_batch())
+    :param class_per_language: list specifying the class for each corresponding language in the global variable
+    'hypothesis_space'
+    :param n_classes: (optional) the number of language classes; by default the highest class in class_per_language + 1
+    :return: a list containing the proportion of sampled languages in each class, averaged over the agents
+    """
+    class_indices = np.asarray(class_per_language).astype(int)
+    if n_classes is None:
+        n_classes = int(max(class_per_language)+1)
+    counts = np.bincount(class_indices[sampled_indices].ravel(), minlength=n_classes)
+    return np.divide(counts, sampled_indices.size)
+
+
+# AND NOW SOME FUNCTIONS THAT WORK WITH ANY POPULATION REPRESENTATION (I.E. EITHER A DENSE 2D NUMPY ARRAY, OR ONE OF THE
+# POPULATION REPRESENTATIONS IN learner_representations.py):
+
+def sample_from_population(population, hypotheses, agent_index, cdf_cache=None):
+    """
+    Samples a language from the posterior of a single agent
+
+    :param population: a population (2D numpy array or one of the population representations in
+    learner_representations.py)
+    :param hypotheses: list of all possible languages; corresponds to global variable 'hypothesis_space'
+    :param agent_index: the index of the agent
+    :param cdf_cache: (optional) a PosteriorCDFCache that the cumulative distribution of the agent's posterior is looked
+    up in (or else added to); only used if population is a 2D numpy array
+    :return: (1) a language (see sample()); and (2) the index of the language in the hypotheses list
+    """
+    if isinstance(population, np.ndarray):
+        if cdf_cache is not None:
+            index = cdf_cache.sample(population, agent_index)
+            return hypotheses[index], index
+        return sample(hypotheses, population[agent_index])
+    sampled = population.sample(agent_index)
+    if isinstance(sampled, np.ndarray):  # (the representations that never enumerate the hypothesis space sample a
+        # language as a vector of form indices, so hypotheses can be None for them; see ParticlePosteriorPopulation)
+        return tuple(population.forms[form_index] for form_index in sampled), hypothesis_index_of_language(sampled, len(population.forms))
+    return hypotheses[sampled], sampled
+
+
+def sample_index_from_population(population, agent_index):
+    """
+    :param population: one of the population representations in learner_representations.py
+    :param agent_index: the index of the agent
+    :return: the index (in the list of all possible languages) of a language sampled from the agent's posterior (see
+    sample_from_population())
+    """
+    sampled = population.sample(agent_index)
+    if isinstance(sampled, np.ndarray):
+        return hypothesis_index_of_language(sampled, len(population.forms))
+    return sampled
+
+
+def sample_batch_from_population(population, n_samples):
+    """
+    Samples n_samples languages from the posterior of each agent in the population (see sample_batch())
+
+    :param population: a population (2D numpy array or one of the population representations in
+    learner_representations.py)
+    :param n_samples: the number of languages to sample for each agent (int)
+    :return: 2D numpy array of shape (len(population), n_samples) containing the indices (in the hypotheses list) of
+    the sampled languages
+    """
+    if isinstance(population, np.ndarray):
+        return sample_batch(population, n_samples)
+    return np.array([[sample_index_from_population(population, agent_index) for x in range(n_samples)] for agent_index in range(len(population))], dtype=int).reshape(len(population), n_samples)
+
+
+def population_language_stats(population, possible_form_lengths, class_per_language, proportion_measure='posterior', n_samples=1):
+    """
+    :param population: a population (2D numpy array or one of the population representations in
+    learner_representations.py)
+    :param possible_form_lengths: all possible form lengths (global parameter)
+    :param class_per_language: list specifying the class for each corresponding language in the global variable
+    'hypothesis_space'; or None for the representations that never enumerate the hypothesis space (see
+    ParticlePosteriorPopulation), in which case the (sampled) languages are classified directly
+    :param proportion_measure: can be set to either 'posterior' or 'sampled' (see language_stats())
+    :param n_samples: the number of languages that each agent samples if proportion_measure = 'sampled'
+    :return: a list containing the overall average posterior probability assigned to each class of language in the
+    population (see language_stats())
+    """
+    if isinstance(population, np.ndarray):
+        return language_stats(population, possible_form_lengths, class_per_language, proportion_measure=proportion_measure, n_samples=n_samples)
+    if proportion_measure == 'sampled':
+        sampled_indices = sample_batch_from_population(population, n_samples)
+        if class_per_language is None:  # (then only the distinct sampled languages are classified)
+            sampled_indices, inverse = np.unique(sampled_indices, return_inverse=True)
+            languages = np.array(np.unravel_index(sampled_indices, (len(population.forms),) * len(population.meaning_list))).T
+            class_per_language = [classify_language(tuple(population.forms[form_index] for form_index in language), population.forms, population.meaning_list) for language in languages]
+            return sampled_language_stats(inverse.reshape(len(population), n_samples), class_per_language, n_classes=n_language_classes(population.forms))
+        return sampled_language_stats(sampled_indices, class_per_language)
+    elif proportion_measure != 'posterior':
+        raise ValueError("OOPS! proportion_measure can only be set to either 'posterior' or 'sampled'.")
+    return population.language_stats(possible_form_lengths, class_per_language)
+
+
+def renew_population(population, pop_size, log_priors):
+    """
+    :param population: the current population (2D numpy array or one of the population representations in
+    learner_representations.py)
+    :param pop_size: the desired size of the population (int); corresponds to global variable 'popsize'
+    :param log_priors: the LOG prior probability distribution that each agent should be initialised with (only used for
+    a dense population; the other representations know their own prior)
+    :return: a new population of the same representation, in which each agent is back at the prior
+    """
+    if isinstance(population, np.ndarray):
+        return new_population(pop_size, log_priors)
+    return population.new_population()
+
+
+def population_to_dense(population):
+    """
+    :param population: a population (2D numpy array or one of the population representations in
+    learner_representations.py)
+    :return: the population as a 2D numpy array with one LOG posterior probability distribution per agent
+    """
+    if isinstance(population, np.ndarray):
+        return population
+    return population.to_dense()
+
+
+def update_agent_posterior(population, agent_index, hypotheses, topic, meanings, forms, noisy_variants, utterance, ambiguity_penalty, error_prob, prob_of_noise, all_possible_forms, log_likelihood_cache=None):
+    """
+    Updates the posterior of a single agent in the population based on a single <topic, utterance> pair (see
+    update_posterior(), or update_posterior_from_cache() if a log_likelihood_cache is given)
+
+    :param population: a population (2D numpy array or one of the population representations in
+    learner_representations.py); this is updated in place
+    :param agent_index: the index of the agent
+    :param hypotheses: list of all possible languages
+    :param topic: a topic (string from the global variable meanings)
+    :param meanings: list of all possible meanings; corresponds to global variable 'meanings'
+    :param forms: list of strings corresponding to all possible forms_without_noisy_variants
+    :param noisy_variants: list of all possible noisy variants of forms
+    :param utterance: an utterance (string from the global variable forms (can be a noisy form if parameter noise is
+    True)
+    :param ambiguity_penalty: parameter that determines extent to which speaker tries to avoid ambiguity; corresponds
+    to global variable 'gamma'
+    :param error_prob: the probability of making an error in production
+    :param prob_of_noise: the probability of noise; corresponds to global variable 'noise_prob'
+    :param all_possible_forms: list of all possible forms INCLUDING noisy variants; corresponds to global variable
+    'all_forms_including_noisy_variants'
+    :param log_likelihood_cache: (optional) the log_likelihood_cache for the same parameter settings (see
+    get_log_likelihood_cache() in likelihood_cache.py). If given, the LOG likelihoods are looked up in the cache instead
+    of being computed for each hypothesis.
+    :return: population (updated in place)
+    """
+    if isinstance(population, np.ndarray):
+        if log_likelihood_cache is not None:
+            population[agent_index] = update_posterior_from_cache(population[agent_index], log_likelihood_cache, topic, utterance, meanings, all_possible_forms)
+            return population
+        population[agent_index] = update_posterior(population[agent_index], hypotheses, topic, meanings, forms, noisy_variants, utterance, ambiguity_penalty, error_prob, prob_of_noise, all_possible_forms)
+        return population
+    return population.update(np.array([agent_index]), np.array([meanings.index(topic)]), np.array([all_possible_forms.index(utterance)]))
+
+
 # AND NOW FINALLY FOR THE FUNCTION THAT RUNS THE ACTUAL SIMULATION:
 
-def simulation(population, n_gens, n_parents, n_rounds, bottleneck, pop_size, meaning_list, forms, noisy_variants, possible_form_lengths, hypotheses, class_per_language, log_priors, data, interaction_order, production_implementation, ambiguity_penalty, error_prob, prob_of_noise, all_possible_forms, mutual_understanding_pressure, minimal_effort_pressure, communicative_success_pressure):
+def simulation(population, n_gens, n_parents, n_rounds, bottleneck, pop_size, meaning_list, forms, noisy_variants, possible_form_lengths, hypotheses, class_per_language, log_priors, data, interaction_order, production_implementation, ambiguity_penalty, error_prob, prob_of_noise, all_possible_forms, mutual_understanding_pressure, minimal_effort_pressure, communicative_success_pressure, gen_0_posterior=None, learned_posterior_cache=None, log_likelihood_cache=None, proportion_measure='posterior', n_proportion_samples=1):
     """
     Runs the full simulation and returns the total amount of posterior probability that is assigned to each language
     class over generations (language_stats_over_gens) as well as the data that each generation produced (data)
@@ -1714,9 +2573,12 @@ def simulation(population, n_gens, n_parents, n_rounds, bottleneck, pop_size, me
     :param forms: list of strings corresponding to all possible forms_without_noisy_variants
     :param noisy_variants: list of all possible noisy variants of forms
     :param possible_form_lengths: all possible form lengths (global parameter)
-    :param hypotheses: list of all possible languages; corresponds to global variable 'hypothesis_space'
+    :param hypotheses: list of all possible languages; corresponds to global variable 'hypothesis_space' (or None for
+    the population representations that never enumerate the hypothesis space; see ParticlePosteriorPopulation)
     :param class_per_language: list specifiying the class for each corresponding language in the variable 'hypotheses'
-    :param log_priors: the LOG prior probability distribution that each agent should be initialised with
+    (or None if hypotheses is None)
+    :param log_priors: the LOG prior probability distribution that each agent should be initialised with (or None if
+    hypotheses is None)
     :param data: the initial data that generation 0 learns from
     :param interaction_order: the order in which agents take turns in interaction (can be set to either 'taking_turns'
     or 'random')
@@ -1733,37 +2595,97 @@ def simulation(population, n_gens, n_parents, n_rounds, bottleneck, pop_size, me
     (set to either True or False); corresponds to global variable 'minimal_effort'
     :param communicative_success_pressure: determines whether pressure for communicative success is turned on or off
     (i.e. set to True or False); corresponds to global variable 'communicative_succes'
-    :return: (1) sampled_languages_over_gens (which contains the indices of the sampled languages per generation per agent per round of interaction); (2) language_stats_over_gens (which contains language stats over generations); (3) data (which contains data over generations over runs); and (4) the final population
+    :param gen_0_posterior: (optional) the LOG posterior that results from learning data starting from log_priors. This
+    only has to be computed once per condition (rather than once per run), because with interaction_order ==
+    'taking_turns' every run's generation 0 learns the same data in the same order. If given, the agents of generation 0
+    are simply given this posterior instead of learning from data. Can only be used if interaction_order ==
+    'taking_turns' and population consists of agents that all have log_priors as their posterior.
+    :param learned_posterior_cache: (optional) a LearnedPosteriorCache for this condition. If given, the posterior of
+    each learner that starts from log_priors is looked up in (or else added to) this cache, using the count signature of
+    the data it learns from.
+    :param log_likelihood_cache: (optional) the log_likelihood_cache for the same parameter settings (see
+    get_log_likelihood_cache() in likelihood_cache.py). If given (and production_implementation == 'my_code'), all
+    posterior updates of a dense population look their LOG likelihoods up in this cache (see learn_dataset_from_cache()
+    and update_posterior_from_cache()), instead of computing them for each hypothesis.
+    :param proportion_measure: the way in which the proportion of language classes in the population is measured at
+    each generation; can be set to either 'posterior' or 'sampled' (see language_stats())
+    :param n_proportion_samples: the number of languages that each agent samples if proportion_measure = 'sampled'
+    :return: (1) sampled_languages_over_gens (which contains the indices of the sampled languages per generation per agent per round of interaction); (2) language_stats_over_gens (which contains language stats over generations); (3) data (which contains data over generations over runs); and (4) the final population (in the same representation as population; see population_to_dense())
     """
     sampled_languages_over_gens = np.zeros((n_gens, pop_size, n_rounds))
-    language_stats_over_gens = np.zeros((n_gens, int(max(class_per_language)+1)))
+    if class_per_language is None:
+        language_stats_over_gens = np.zeros((n_gens, n_language_classes(forms)))
+    else:
+        language_stats_over_gens = np.zeros((n_gens, int(max(class_per_language)+1)))
     data_over_gens = []
+    if gen_0_posterior is not None and interaction_order != 'taking_turns':
+        raise ValueError("OOPS! gen_0_posterior can only be used if interaction_order = 'taking_turns'.")
+    dense_population = isinstance(population, np.ndarray)
+    if not dense_population and production_implementation == 'simlang':
+        raise ValueError("OOPS! The population representations in learner_representations.py only work with production_implementation = 'my_code'.")
+    if log_likelihood_cache is not None and production_implementation == 'simlang':
+        raise ValueError("OOPS! A log_likelihood_cache only works with production_implementation = 'my_code'.")
     for i in range(n_gens):
-        for j in range(pop_size):
-            for k in range(bottleneck):
+        # With interaction_order == 'taking_turns', all learners learn from exactly the same data in the same order.
+        # So if they also start from the same posterior (which they do whenever they all start from log_priors),
+        # their learned posteriors are identical, and we only have to compute the posterior of the first learner and
+        # copy it to the others:
+        identical_learners = False
+        if interaction_order == 'taking_turns':
+            if len(population) != 2:
+                raise ValueError(
+                    "OOPS! interaction = 'taking_turns' only works if popsize = 2.")
+            if bottleneck != len(data):
+                raise ValueError(
+                    "UH-OH! data should have the same size as the bottleneck b")
+            identical_learners = dense_population and all(np.array_equal(population[j], population[0]) for j in range(1, pop_size))
+        if not dense_population:  # one of the population representations in learner_representations.py, whose
+            # agents all learn their data in a single batched update
+            learner_datasets = []
+            for j in range(pop_size):
                 if interaction_order == 'taking_turns':
-                    if len(population) != 2:
-                        raise ValueError(
-                            "OOPS! interaction = 'taking_turns' only works if popsize = 2.")
-                    if bottleneck != len(data):
-                        raise ValueError(
-                            "UH-OH! data should have the same size as the bottleneck b")
-                    meaning, signal = data[k]
+                    learner_datasets.append(data)
                 else:
-                    meaning, signal = random.choice(data)
+                    learner_datasets.append([random.choice(data) for k in range(bottleneck)])
+            population.update(*datasets_to_observations(range(pop_size), learner_datasets, meaning_list, all_possible_forms))
+        else:
+            for j in range(pop_size):
+                if i == 0 and gen_0_posterior is not None:
+                    population[j] = gen_0_posterior
+                    continue
+                if identical_learners and j > 0:
+                    population[j] = population[0]
+                    continue
+                if interaction_order == 'taking_turns':
+                    learner_data = data
+                else:
+                    learner_data = [random.choice(data) for k in range(bottleneck)]
                 if production_implementation == 'simlang':
-                    population[j] = update_posterior_simlang(population[j], hypotheses, meaning, signal)
+                    for meaning, signal in learner_data:
+                        population[j] = update_posterior_simlang(population[j], hypotheses, meaning, signal)
+                elif learned_posterior_cache is not None and np.array_equal(population[j], log_priors):
+                    signature = dataset_count_signature(learner_data)
+                    learned_posterior = learned_posterior_cache.get(signature)
+                    if learned_posterior is None:
+                        if log_likelihood_cache is not None:
+                            learned_posterior = learn_dataset_from_cache(population[j], log_likelihood_cache, learner_data, meaning_list, all_possible_forms)
+                        else:
+                            learned_posterior = learn_dataset(population[j], hypotheses, learner_data, meaning_list, forms, noisy_variants, ambiguity_penalty, error_prob, prob_of_noise, all_possible_forms)
+                        learned_posterior_cache.put(signature, learned_posterior)
+                    population[j] = learned_posterior
+                elif log_likelihood_cache is not None:
+                    population[j] = learn_dataset_from_cache(population[j], log_likelihood_cache, learner_data, meaning_list, all_possible_forms)
                 else:
-                    population[j] = update_posterior(population[j], hypotheses, meaning, meaning_list, forms, noisy_variants, signal, ambiguity_penalty, error_prob, prob_of_noise, all_possible_forms)
-        data, sampled_languages_array = population_communication(population, n_parents, n_rounds, interaction_order, production_implementation, mutual_understanding_pressure, minimal_effort_pressure, ambiguity_penalty, error_prob, prob_of_noise, communicative_success_pressure, hypotheses, meaning_list, forms, noisy_variants, possible_form_lengths)
+                    population[j] = learn_dataset(population[j], hypotheses, learner_data, meaning_list, forms, noisy_variants, ambiguity_penalty, error_prob, prob_of_noise, all_possible_forms)
+        data, sampled_languages_array = population_communication(population, n_parents, n_rounds, interaction_order, production_implementation, mutual_understanding_pressure, minimal_effort_pressure, ambiguity_penalty, error_prob, prob_of_noise, communicative_success_pressure, hypotheses, meaning_list, forms, noisy_variants, possible_form_lengths, log_likelihood_cache=log_likelihood_cache)
 
         sampled_languages_over_gens[i] = sampled_languages_array
-        language_stats_over_gens[i] = language_stats(population, possible_form_lengths, class_per_language)
+        language_stats_over_gens[i] = population_language_stats(population, possible_form_lengths, class_per_language, proportion_measure=proportion_measure, n_samples=n_proportion_samples)
         data_over_gens.append(data)
         if i == n_gens-1:
             final_pop = population
         if turnover:
-            population = new_population(pop_size, log_priors)
+            population = renew_population(population, pop_size, log_priors)
     return sampled_languages_over_gens, language_stats_over_gens, data_over_gens, final_pop
 
 
@@ -1796,67 +2718,170 @@ def convert_array_to_string(array):
 ###################################################################################################################
 if __name__ == '__main__':
 
+    # (imported here rather than at the top of this file, because likelihood_cache.py and learner_representations.py
+    # import from this file themselves)
+    from likelihood_cache import production_likelihood_table, get_log_likelihood_cache, subset_log_likelihood_cache
+    if posterior_representation != 'dense':
+        from learner_representations import ParticlePosteriorPopulation, GibbsPosteriorPopulation, CountPosteriorPopulation
+
+    ###################################################################################################################
+    # FIRST LET'S RETRIEVE THE RELEVANT LOG LIKELIHOOD CACHE (WHICH IS BUILT AND SAVED FIRST IF IT DOESN'T EXIST YET):
+
+    # (This is needed whenever the agents' posteriors are updated with production = 'my_code', and by the
+    # CountPosteriorPopulation; the 'particles' and 'gibbs' representations only use the small production likelihood
+    # table instead. The learning that production = 'simlang' does is not based on these likelihoods.)
+    log_likelihood_cache = None
+    if (production == 'my_code' and posterior_representation == 'dense') or posterior_representation == 'counts':
+        log_likelihood_cache = get_log_likelihood_cache(pickle_file_path, meanings, n_characters, possible_form_lengths, gamma, 0., error, noise_prob, cache_format=likelihood_cache_format, dtype=precision)
+        print('')
+        print("log_likelihood_cache.shape is:")
+        print(log_likelihood_cache.shape)
+
     ###################################################################################################################
     # NOW LET'S RUN THE ACTUAL SIMULATION:
 
     t0 = time.process_time()
 
-    hypothesis_space = create_all_possible_languages(meanings, forms_without_noise)
-    print("number of possible languages is:")
-    print(len(hypothesis_space))
+    # The 'particles' and 'gibbs' representations never enumerate the hypothesis space (their agents' languages are
+    # vectors of form indices, which are given a prior and classified one at a time; see ParticlePosteriorPopulation and
+    # GibbsPosteriorPopulation in learner_representations.py), so for those representations the list of all languages,
+    # their classes and their priors are never created either:
+    enumerate_hypothesis_space = posterior_representation not in ['particles', 'gibbs']
+    if not enumerate_hypothesis_space:
+        hypothesis_space = None
+        class_per_lang = None
+        priors = None
+        print("number of possible languages (which are never enumerated) is:")
+        print(len(forms_without_noise) ** len(meanings))
+        t3 = time.process_time()
+    else:
+        hypothesis_space = create_all_possible_languages(meanings, forms_without_noise)
+        print("number of possible languages is:")
+        print(len(hypothesis_space))
 
-    t1 = time.process_time()
-    print('')
-    print("number of minutes it took to create all languages (i.e. the hypothesis space:")
-    print(round((t1-t0)/60., ndigits=2))
+        t1 = time.process_time()
+        print('')
+        print("number of minutes it took to create all languages (i.e. the hypothesis space:")
+        print(round((t1-t0)/60., ndigits=2))
 
 
-    class_per_lang = classify_all_languages(hypothesis_space, forms_without_noise, meanings)
-    print("class_per_lang.shape is:")
-    print(class_per_lang.shape)
-    print("np.unique(class_per_lang) is:")
-    print(np.unique(class_per_lang))
+        class_per_lang = classify_all_languages(hypothesis_space, forms_without_noise, meanings)
+        print("class_per_lang.shape is:")
+        print(class_per_lang.shape)
+        print("np.unique(class_per_lang) is:")
+        print(np.unique(class_per_lang))
 
-    t2 = time.process_time()
-    print('')
-    print("number of minutes it took to classify languages:")
-    print(round((t2-t1)/60., ndigits=2))
+        t2 = time.process_time()
+        print('')
+        print("number of minutes it took to classify languages:")
+        print(round((t2-t1)/60., ndigits=2))
 
-    if compressibility_bias:
-        priors = prior(hypothesis_space, forms_without_noise, meanings, possible_form_lengths)
-    else:
-        priors = np.ones(len(hypothesis_space))
-        priors = np.divide(priors, np.sum(priors))
-        priors = np.log(priors)
+        if compressibility_bias:
+            priors = prior(hypothesis_space, forms_without_noise, meanings, possible_form_lengths)
+        else:
+            priors = np.ones(len(hypothesis_space))
+            priors = np.divide(priors, np.sum(priors))
+            priors = np.log(priors)
+        priors = priors.astype(precision)
 
-    t3 = time.process_time()
-    print('')
-    print("number of minutes it took to create prior:")
-    print(round((t3-t2)/60., ndigits=2))
+        t3 = time.process_time()
+        print('')
+        print("number of minutes it took to create prior:")
+        print(round((t3-t2)/60., ndigits=2))
 
-    initial_dataset = create_initial_dataset(initial_language_type, b, hypothesis_space, class_per_lang, meanings, possible_form_lengths)  # the data that the first generation learns from
+    initial_dataset = create_initial_dataset(initial_language_type, b, hypothesis_space, class_per_lang, meanings, possible_form_lengths, forms=forms_without_noise)  # the data that the first generation learns from
     print('')
     print("initial_dataset is:")
     print(initial_dataset)
 
+    # Optionally remove the hypotheses with a negligible prior; the hypothesis space, the classes and the priors are all
+    # restricted to the same kept hypotheses, and the results are mapped back to the full hypothesis space below, so
+    # that the pickled results have the same format either way:
+    if enumerate_hypothesis_space:
+        n_hypotheses = len(hypothesis_space)
+        kept_hypothesis_indices = np.arange(n_hypotheses)
+        n_classes = int(max(class_per_lang)+1)
+    else:
+        n_classes = n_language_classes(forms_without_noise)
+    if compressibility_bias and prior_pruning_log_threshold is not None and posterior_representation in ['dense', 'counts']:
+        kept_hypothesis_indices, priors, removed_prior_mass, removed_prior_mass_bound = prune_hypotheses_by_prior(priors, prior_pruning_log_threshold)
+        hypothesis_space = [hypothesis_space[h] for h in kept_hypothesis_indices]
+        class_per_lang = class_per_lang[kept_hypothesis_indices]
+        if log_likelihood_cache is not None:
+            log_likelihood_cache = subset_log_likelihood_cache(log_likelihood_cache, kept_hypothesis_indices)
+        print('')
+        print("number of hypotheses kept after pruning is:")
+        print(len(kept_hypothesis_indices))
+        print("prior mass removed by pruning is:")
+        print(removed_prior_mass)
+        print("upper bound on the prior mass removed by pruning is:")
+        print(removed_prior_mass_bound)
+
+    # With interaction == 'taking_turns', generation 0 learns exactly the same data (initial_dataset, in the same order)
+    # from the same priors in every run, so the posterior it ends up with only has to be computed once per condition
+    # (with interaction == 'random', every learner learns from a different random sample of initial_dataset instead):
+    gen_0_posterior = None
+    if interaction == 'taking_turns' and posterior_representation == 'dense':
+        if production == 'simlang':
+            gen_0_posterior = priors
+            for meaning, signal in initial_dataset:
+                gen_0_posterior = update_posterior_simlang(gen_0_posterior, hypothesis_space, meaning, signal)
+        else:
+            gen_0_posterior = learn_dataset_from_cache(priors, log_likelihood_cache, initial_dataset, meanings, all_forms_including_noisy_variants)
+
+    learned_posterior_cache = LearnedPosteriorCache(learned_posterior_cache_max_bytes)
+
     sampled_languages_over_gens_per_run = np.zeros((runs, generations, popsize, rounds))
-    language_stats_over_gens_per_run = np.zeros((runs, generations, int(max(class_per_lang)+1)))
+    language_stats_over_gens_per_run = np.zeros((runs, generations, n_classes))
     data_over_gens_per_run = []
-    final_pop_per_run = np.zeros((runs, popsize, len(hypothesis_space)))
+    if posterior_representation == 'counts':
+        # (the exact LOG posteriors can be reconstructed from these counts with log_posteriors_from_counts() in
+        # learner_representations.py)
+        final_pop_per_run = np.zeros((runs, popsize, len(meanings), len(all_forms_including_noisy_variants)), dtype=int)
+    elif posterior_representation == 'particles':
+        # (the particles of each agent, as vectors of form indices, and their normalized LOG weights)
+        final_pop_per_run = np.zeros((runs, popsize, n_particles, len(meanings)), dtype=int)
+        final_pop_log_weights_per_run = np.zeros((runs, popsize, n_particles))
+    elif posterior_representation == 'gibbs':
+        # (the counts of each agent, from which its exact posterior can be calculated for any language (see
+        # GibbsPosteriorPopulation.log_posteriors() in learner_representations.py), and the current state of its sampler)
+        final_pop_per_run = np.zeros((runs, popsize, len(meanings), len(all_forms_including_noisy_variants)), dtype=int)
+        final_pop_states_per_run = np.zeros((runs, popsize, len(meanings)), dtype=int)
+    else:
+        final_pop_per_run = np.full((runs, popsize, n_hypotheses), -np.inf, dtype=precision)
     for r in range(runs):
 
         print('')
         print("r is:")
         print(r)
 
-        population = new_population(popsize, priors)
+        if posterior_representation == 'particles':
+            population = ParticlePosteriorPopulation(np.log(production_likelihood_table(forms_without_noise, noisy_forms, len(meanings), gamma, 0., error, noise_prob)), forms_without_noise, meanings, possible_form_lengths, compressibility_bias, n_particles, popsize, particle_resample_threshold, particle_move_sweeps)
+        elif posterior_representation == 'gibbs':
+            population = GibbsPosteriorPopulation(np.log(production_likelihood_table(forms_without_noise, noisy_forms, len(meanings), gamma, 0., error, noise_prob)), forms_without_noise, meanings, possible_form_lengths, compressibility_bias, popsize, gibbs_burn_in_sweeps, gibbs_sweeps, gibbs_stats_samples)
+        elif posterior_representation == 'counts':
+            population = CountPosteriorPopulation(log_likelihood_cache, priors, popsize, n_buffers=count_posterior_buffers)
+        else:
+            population = new_population(popsize, priors)
 
-        sampled_languages_over_gens, language_stats_over_gens, data_over_gens, final_pop = simulation(population, generations, n_parents, rounds, b, popsize, meanings, forms_without_noise, noisy_forms, possible_form_lengths, hypothesis_space, class_per_lang, priors, initial_dataset, interaction, production, gamma, error, noise_prob, all_forms_including_noisy_variants, mutual_understanding, minimal_effort, communicative_success)
+        sampled_languages_over_gens, language_stats_over_gens, data_over_gens, final_pop = simulation(population, generations, n_parents, rounds, b, popsize, meanings, forms_without_noise, noisy_forms, possible_form_lengths, hypothesis_space, class_per_lang, priors, initial_dataset, interaction, production, gamma, error, noise_prob, all_forms_including_noisy_variants, mutual_understanding, minimal_effort, communicative_success, gen_0_posterior=gen_0_posterior, learned_posterior_cache=learned_posterior_cache, log_likelihood_cache=log_likelihood_cache, proportion_measure=proportion_measure, n_proportion_samples=n_proportion_samples)
 
-        sampled_languages_over_gens_per_run[r] = sampled_languages_over_gens
-        language_stats_over_gens_per_run[r] = language_stats_over_gens
+        if enumerate_hypothesis_space:
+            sampled_languages_over_gens_per_run[r] = kept_hypothesis_indices[sampled_languages_over_gens.astype(int)]
+        else:  # (these are already the indices in the list of all possible languages)
+            sampled_languages_over_gens_per_run[r] = sampled_languages_over_gens
+        language_stats_over_gens_per_run[r, :, :language_stats_over_gens.shape[1]] = language_stats_over_gens
         data_over_gens_per_run.append(data_over_gens)
-        final_pop_per_run[r] = final_pop
+        if posterior_representation == 'counts':
+            final_pop_per_run[r] = final_pop.counts
+        elif posterior_representation == 'particles':
+            final_pop_per_run[r] = final_pop.particles
+            final_pop_log_weights_per_run[r] = final_pop.log_weights
+        elif posterior_representation == 'gibbs':
+            final_pop_per_run[r] = final_pop.counts
+            final_pop_states_per_run[r] = final_pop.states
+        else:
+            final_pop_per_run[r][:, kept_hypothesis_indices] = population_to_dense(final_pop)
 
     timestr = time.strftime("%Y%m%d-%H%M%S")
 
@@ -1864,7 +2889,16 @@ if __name__ == '__main__':
     pickle.dump(sampled_languages_over_gens_per_run, open(pickle_file_path + pickle_file_name + "_sampled_langs" + ".p", "wb"))
     pickle.dump(language_stats_over_gens_per_run, open(pickle_file_path + pickle_file_name + "_lang_stats" + ".p", "wb"))
     pickle.dump(data_over_gens_per_run, open(pickle_file_path+pickle_file_name+"_data"+".p", "wb"))
-    pickle.dump(final_pop_per_run, open(pickle_file_path + pickle_file_name + "_final_pop" + ".p", "wb"))
+    if posterior_representation == 'counts':
+        pickle.dump(final_pop_per_run, open(pickle_file_path + pickle_file_name + "_final_pop_counts" + ".p", "wb"))
+    elif posterior_representation == 'particles':
+        pickle.dump(final_pop_per_run, open(pickle_file_path + pickle_file_name + "_final_pop_particles" + ".p", "wb"))
+        pickle.dump(final_pop_log_weights_per_run, open(pickle_file_path + pickle_file_name + "_final_pop_particle_log_weights" + ".p", "wb"))
+    elif posterior_representation == 'gibbs':
+        pickle.dump(final_pop_per_run, open(pickle_file_path + pickle_file_name + "_final_pop_counts" + ".p", "wb"))
+        pickle.dump(final_pop_states_per_run, open(pickle_file_path + pickle_file_name + "_final_pop_gibbs_states" + ".p", "wb"))
+    else:
+        pickle.dump(final_pop_per_run, open(pickle_file_path + pickle_file_name + "_final_pop" + ".p", "wb"))
 
     t4 = time.process_time()
 
@@ -1872,6 +2906,10 @@ if __name__ == '__main__':
     print("number of minutes it took to run simulation:")
     print(round((t4-t3)/60., ndigits=2))
 
+    print('')
+    print("learned posterior cache hits, misses and hit rate:")
+    print(learned_posterior_cache.hits, learned_posterior_cache.misses, round(learned_posterior_cache.hit_rate(), ndigits=3))
+
     print('')
     print('results were saved in folder:')
     print(pickle_file_path)
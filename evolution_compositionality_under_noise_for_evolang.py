@@ -9,6 +9,7 @@ from math import log2
 import scipy.special
 import pickle
 import time
+from likelihood_cache import get_log_likelihood_cache
 
 
 ###################################################################################################################
@@ -90,7 +91,8 @@ def create_all_possible_noisy_forms(all_complete_forms):
 # ALL PARAMETER SETTINGS GO HERE:
 
 meanings = ['02', '03', '12', '13']  # all possible meanings
-forms_without_noise = create_all_possible_forms(2, [2])  # all possible forms, excluding their possible
+n_characters = 2  # the number of different characters that forms can be made up of (i.e. the alphabet size)
+forms_without_noise = create_all_possible_forms(n_characters, [2])  # all possible forms, excluding their possible
 # 'noisy variants'
 noisy_forms = create_all_possible_noisy_forms(forms_without_noise)
 # all possible noisy variants of the forms above
@@ -132,6 +134,12 @@ n_lang_classes = 4  # the number of language classes that are distinguished (int
 
 pickle_file_path = ""  # Use this to specify a path to a folder where you want the pickle (result) files to be stored.
 
+log_likelihood_cache = None  # the LOG likelihood of each <meaning, form> pair for each hypothesis (3D numpy array with
+# axis 0 = meanings, axis 1 = all possible forms, and axis 2 = hypotheses), which update_posterior() looks its LOG
+# likelihoods up in if it's not None. It is retrieved in the main body below for the parameter settings of the run
+# (and built and saved in pickle_file_path first if it doesn't exist yet; see get_log_likelihood_cache() in
+# likelihood_cache.py)
+
 
 # THE FOLLOWING PARAMETERS SHOULD ONLY BE SET IF __name__ == '__main__', BECAUSE THEY ARE RETRIEVED FROM THE INPUT
 # ARGUMENTS GIVEN TO THE PYTHON SCRIPT WHEN RUN FROM THE TERMINAL OR FROM AN .SH SCRIPT:
@@ -810,7 +818,12 @@ def update_posterior(log_posterior, hypotheses, topic, utterance, ambiguity_pena
     for i in range(len(all_possible_forms)):
         if all_possible_forms[i] == utterance:
             utterance_index = i
-    # Now, let's go through each hypothesis (i.e. language), and update its posterior probability given the
+    # If the log_likelihood_cache has been retrieved, the LOG likelihoods of this <topic, utterance> pair can simply be
+    # looked up for all hypotheses at once, so the whole update is a single vector addition:
+    if log_likelihood_cache is not None:
+        new_log_posterior = np.add(log_posterior, log_likelihood_cache[meanings.index(topic)][utterance_index])
+        return np.subtract(new_log_posterior, scipy.special.logsumexp(new_log_posterior))
+    # Otherwise, let's go through each hypothesis (i.e. language), and update its posterior probability given the
     # <topic, utterance> pair that was given as input:
     new_log_posterior = []
     for j in range(len(log_posterior)):
@@ -1230,6 +1243,8 @@ if __name__ == '__main__':
         priors = np.divide(priors, np.sum(priors))
         priors = np.log(priors)
 
+    log_likelihood_cache = get_log_likelihood_cache(pickle_file_path, meanings, n_characters, np.array([2]), gamma, 0., error, noise_prob)
+
     initial_dataset = create_initial_dataset(initial_language_type, b, hypothesis_space, class_per_lang, meanings)  # the data that the first generation learns from
 
     language_stats_over_gens_per_run = np.zeros((runs, generations, int(max(class_per_lang)+1)))
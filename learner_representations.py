@@ -0,0 +1,871 @@
+import collections
+import functools
+import numpy as np
+from evolution_compositionality_under_noise import log_roulette_wheel, normalize_log_probs, language_stats, prior_single_lang, classify_language, n_language_classes
+from likelihood_cache import ambiguity_per_meaning
+
+
+###################################################################################################################
+# ALTERNATIVE REPRESENTATIONS OF A POPULATION OF LEARNERS:
+
+# By default, a population is simply a 2D numpy array with one LOG posterior probability distribution over all
+# hypotheses per agent (see new_population() in evolution_compositionality_under_noise.py). The classes below store
+# the agents' posteriors in a different (smaller, or cheaper to update) way. They all provide the same methods, which is
+# what the population functions in evolution_compositionality_under_noise.py (e.g. sample_from_population()) use to
+# work with any of them:
+#   len(population): the number of agents
+#   population.update(agent_indices, meaning_indices, utterance_indices): updates the agents' posteriors in place based on
+#       a batch of <agent, meaning, utterance> observations
+#   population.sample(agent_index): samples a language from an agent's posterior, and returns its index in the
+#       hypothesis space (or, for the representations that never enumerate the hypothesis space, the language itself as a
+#       1D numpy array of form indices; see sample_from_population())
+#   population.language_stats(possible_form_lengths, class_per_language): the same as language_stats() for a dense
+#       population
+#   population.new_population(): returns a new population of the same size and type, in which all agents are back at
+#       the prior
+#   population.to_dense(): returns the equivalent dense population (2D numpy array), e.g. for pickling the final
+#       population
+
+
+class FactorisedPosteriorPopulation:
+    """
+    A population in which the posterior of each agent is stored as a product of independent categorical distributions
+    over forms: one for each meaning. This is exact if (i) the hypothesis space consists of all possible combinations of
+    forms for the meanings (see create_all_possible_languages()), (ii) the prior is flat, and (iii) the likelihood of a
+    <meaning, form> pair only depends on the form that a language maps that meaning to. The latter is the case when the
+    ambiguity penalty gamma is 0, because ambiguity is the only thing that makes the likelihood of a meaning depend on
+    the forms of the other meanings. Updating a posterior and sampling a language then cost O(n_meanings * n_forms)
+    instead of O(n_forms ** n_meanings). Language stats are computed by enumerating the full posterior, but only once per
+    generation.
+    """
+
+    def __init__(self, log_likelihood_table, n_meanings, pop_size):
+        """
+        :param log_likelihood_table: 2D numpy array with axis 0 = the form that a language maps the meaning to, and axis
+        1 = LOG likelihood of each possible utterance (incl. noisy variants)
+        :param n_meanings: the number of meanings
+        :param pop_size: the number of agents
+        """
+        self.log_likelihood_table = log_likelihood_table
+        n_forms = log_likelihood_table.shape[0]
+        self.log_weights = np.full((pop_size, n_meanings, n_forms), -np.log(n_forms), dtype=log_likelihood_table.dtype)
+
+    def __len__(self):
+        return self.log_weights.shape[0]
+
+    def update(self, agent_indices, meaning_indices, utterance_indices):
+        """
+        :param agent_indices: 1D numpy array containing the index of the observing agent for each observation
+        :param meaning_indices: 1D numpy array containing the index of the observed meaning for each observation
+        :param utterance_indices: 1D numpy array containing the index of the observed utterance (in the list of all
+        possible forms incl. noisy variants) for each observation
+        :return: self (updated in place)
+        """
+        np.add.at(self.log_weights, (agent_indices, meaning_indices), self.log_likelihood_table[:, utterance_indices].T)
+        for agent_index in np.unique(agent_indices):
+            normalize_log_probs(self.log_weights[agent_index], out=self.log_weights[agent_index])
+        return self
+
+    def sample(self, agent_index):
+        """
+        :param agent_index: the index of the agent
+        :return: the index (in the hypothesis space) of a language sampled from the agent's posterior
+        """
+        n_meanings, n_forms = self.log_weights.shape[1:]
+        form_indices = [log_roulette_wheel(self.log_weights[agent_index, m]) for m in range(n_meanings)]
+        return int(np.ravel_multi_index(form_indices, (n_forms,) * n_meanings))
+
+    def log_posterior(self, agent_index):
+        """
+        :param agent_index: the index of the agent
+        :return: 1D numpy array containing the agent's LOG posterior probability of each hypothesis (in the order of
+        create_all_possible_languages(), in which the form of the first meaning varies slowest)
+        """
+        return functools.reduce(np.add.outer, self.log_weights[agent_index]).ravel()
+
+    def language_stats(self, possible_form_lengths, class_per_language):
+        """
+        :param possible_form_lengths: all possible form lengths (global parameter)
+        :param class_per_language: list specifying the class for each corresponding language in the global variable
+        'hypothesis_space'
+        :return: a list containing the overall average posterior probability assigned to each class of language in the
+        population (see language_stats())
+        """
+        return language_stats(self.to_dense(), possible_form_lengths, class_per_language)
+
+    def new_population(self):
+        """
+        :return: a new FactorisedPosteriorPopulation of the same size, in which all agents are back at the (flat) prior
+        """
+        return FactorisedPosteriorPopulation(self.log_likelihood_table, self.log_weights.shape[1], len(self))
+
+    def to_dense(self):
+        """
+        :return: 2D numpy array with the LOG posterior of each agent over all hypotheses on the rows
+        """
+        return np.array([self.log_posterior(agent_index) for agent_index in range(len(self))])
+
+
+def factorised_posterior_population(log_likelihood_cache, pop_size):
+    """
+    Creates a FactorisedPosteriorPopulation in which all agents have a flat prior.
+
+    :param log_likelihood_cache: a FactorisedLikelihoodCache (see likelihood_cache.py) for a setting with gamma = 0
+    :param pop_size: the number of agents
+    :return: a FactorisedPosteriorPopulation
+    """
+    log_likelihood_table = log_likelihood_cache.log_likelihood_table
+    if not np.all(log_likelihood_table == log_likelihood_table[:, :1, :]):
+        raise ValueError("UH-OH! The likelihoods depend on the ambiguity of forms (i.e. gamma > 0), so the posterior doesn't factorise over meanings.")
+    n_meanings = log_likelihood_cache.form_index_per_hypothesis.shape[1]
+    return FactorisedPosteriorPopulation(log_likelihood_table[:, 0, :], n_meanings, pop_size)
+
+
+def log_likelihoods_of_hypotheses(log_likelihood_cache, meaning_index, utterance_index, hypothesis_indices):
+    """
+    Retrieves the LOG likelihood of a single <meaning, form> pair for a subset of the hypotheses from a
+    log_likelihood_cache, regardless of whether the cache is stored as a dense 3D numpy array or in one of the compact
+    representations.
+
+    :param log_likelihood_cache: either a 3D numpy array with axis 0 = meanings, axis 1 = all possible forms, and axis
+    2 = LOG likelihood of corresponding <meaning, form> pair for each hypothesis, or one of the compact cache
+    representations in likelihood_cache.py (a FactorisedLikelihoodCache or a QuantisedLikelihoodCache)
+    :param meaning_index: index of the meaning in the list of meanings
+    :param utterance_index: index of the utterance in the list of all possible forms (incl. noisy variants)
+    :param hypothesis_indices: 1D numpy array of the indices of the hypotheses, or None for all hypotheses
+    :return: 1D numpy array containing the LOG likelihood of the <meaning, form> pair for each of these hypotheses
+    """
+    if isinstance(log_likelihood_cache, np.ndarray):
+        if hypothesis_indices is None:
+            return log_likelihood_cache[meaning_index][utterance_index]
+        return log_likelihood_cache[meaning_index, utterance_index, hypothesis_indices]
+    return log_likelihood_cache.log_likelihoods(meaning_index, utterance_index, hypothesis_indices)
+
+
+def max_log_likelihoods_per_datapoint(log_likelihood_cache):
+    """
+    :param log_likelihood_cache: either a 3D numpy array with axis 0 = meanings, axis 1 = all possible forms, and axis
+    2 = LOG likelihood of corresponding <meaning, form> pair for each hypothesis, or one of the compact cache
+    representations in likelihood_cache.py (a FactorisedLikelihoodCache or a QuantisedLikelihoodCache)
+    :return: 2D numpy array with axis 0 = meanings and axis 1 = all possible forms, containing the highest LOG
+    likelihood of each <meaning, form> pair over all hypotheses
+    """
+    n_meanings, n_forms = log_likelihood_cache.shape[:2]
+    max_log_likelihoods = np.zeros((n_meanings, n_forms))
+    for meaning_index in range(n_meanings):
+        for utterance_index in range(n_forms):
+            max_log_likelihoods[meaning_index, utterance_index] = np.max(log_likelihoods_of_hypotheses(log_likelihood_cache, meaning_index, utterance_index, None))
+    return max_log_likelihoods
+
+
+class SparsePosteriorPopulation:
+    """
+    A population in which each agent only keeps track of the hypotheses that together cover all but (at most) epsilon
+    of its posterior mass, as an array of hypothesis indices plus an array of their LOG posterior probabilities. After
+    every update, the hypotheses with the lowest posterior probability are dropped as long as the mass that the agent has
+    dropped so far stays below epsilon, and the remaining ones are renormalized. Because a dropped hypothesis may become
+    probable again when the agent observes data that its support doesn't explain (e.g. a hearer whose partner uses a
+    different language), each agent also keeps the counts of the <meaning, utterance> pairs it has observed, and an
+    upper bound on the LOG mass of its dropped hypotheses relative to its support. This bound is raised on every update
+    by the maximum LOG likelihood of each observation over the whole hypothesis space; as soon as it exceeds epsilon,
+    the agent is rebuilt densely from the prior and its counts (see log_posteriors_from_counts()) and then truncated
+    again. The mass that is dropped is accumulated in discarded_mass and the number of rebuilds in n_rebuilds, so that
+    they can be reported. As long as the support of an agent covers more than max_fraction of the hypothesis space
+    (e.g. at the prior), the agent is simply stored densely.
+    """
+
+    def __init__(self, log_likelihood_cache, log_priors, pop_size, epsilon, max_fraction, max_log_likelihoods=None):
+        """
+        :param log_likelihood_cache: either a 3D numpy array with axis 0 = meanings, axis 1 = all possible forms, and
+        axis 2 = LOG likelihood of corresponding <meaning, form> pair for each hypothesis, or one of the compact cache
+        representations in likelihood_cache.py (a FactorisedLikelihoodCache or a QuantisedLikelihoodCache)
+        :param log_priors: the LOG prior probability distribution that each agent is initialised with
+        :param pop_size: the number of agents
+        :param epsilon: the maximum amount of posterior mass that an agent may have dropped before it is rebuilt densely
+        :param max_fraction: the fraction of the hypothesis space above which an agent's support is stored densely
+        :param max_log_likelihoods: (optional) the result of max_log_likelihoods_per_datapoint() for
+        log_likelihood_cache; by default, it is calculated here
+        """
+        self.log_likelihood_cache = log_likelihood_cache
+        self.log_priors = log_priors
+        self.epsilon = epsilon
+        self.max_fraction = max_fraction
+        if max_log_likelihoods is None:
+            max_log_likelihoods = max_log_likelihoods_per_datapoint(log_likelihood_cache)
+        self.max_log_likelihoods = max_log_likelihoods
+        self.hypothesis_indices = [None for x in range(pop_size)]  # None means that the agent is stored densely
+        self.log_weights = [np.array(log_priors) for x in range(pop_size)]
+        self.counts = np.zeros((pop_size,)+max_log_likelihoods.shape, dtype=int)
+        self.log_dropped_mass_bounds = np.full(pop_size, -np.inf)  # upper bound on the LOG of the (unnormalized)
+        # mass of each agent's dropped hypotheses divided by the mass of its support
+        self.discarded_mass = 0.0
+        self.n_rebuilds = 0
+
+    def __len__(self):
+        return len(self.log_weights)
+
+    def support_sizes(self):
+        """
+        :return: list containing the number of hypotheses that each agent keeps track of
+        """
+        return [len(log_weights) for log_weights in self.log_weights]
+
+    def truncate(self, agent_index):
+        """
+        Drops the least probable hypotheses of an agent, as long as the total mass it has dropped (relative to its
+        support) stays below epsilon, renormalizes the rest, and stores the agent sparsely if its support has become
+        small enough.
+
+        :param agent_index: the index of the agent
+        """
+        log_weights = self.log_weights[agent_index]
+        dropped_mass_bound = np.exp(self.log_dropped_mass_bounds[agent_index])
+        budget = (self.epsilon - dropped_mass_bound) / (1. + self.epsilon)  # (the most normalized mass that can be
+        # dropped now so that (dropped_mass_bound + mass) / (1 - mass) stays below epsilon)
+        if budget <= 0.:
+            return
+        order = np.argsort(log_weights)  # from least to most probable
+        cumulative_mass = np.cumsum(np.exp(log_weights[order].astype(np.float64)))
+        n_dropped = int(np.searchsorted(cumulative_mass, budget, side='right'))
+        if n_dropped == 0:
+            return
+        kept = order[n_dropped:]
+        if len(kept) > self.max_fraction * len(self.log_priors):
+            return  # the support is still too large to be worth storing sparsely
+        dropped_mass = cumulative_mass[n_dropped-1]
+        self.discarded_mass += dropped_mass
+        self.log_dropped_mass_bounds[agent_index] = np.log(dropped_mass_bound + dropped_mass) - np.log1p(-dropped_mass)
+        kept = np.sort(kept)
+        if self.hypothesis_indices[agent_index] is None:
+            self.hypothesis_indices[agent_index] = kept
+        else:
+            self.hypothesis_indices[agent_index] = self.hypothesis_indices[agent_index][kept]
+        self.log_weights[agent_index] = normalize_log_probs(log_weights[kept])
+
+    def rebuild(self, agent_index):
+        """
+        Stores an agent densely again, with its exact LOG posterior calculated from the prior and its counts.
+
+        :param agent_index: the index of the agent
+        """
+        self.hypothesis_indices[agent_index] = None
+        self.log_weights[agent_index] = log_posteriors_from_counts(self.counts[agent_index], self.log_priors, self.log_likelihood_cache)
+        self.log_dropped_mass_bounds[agent_index] = -np.inf
+        self.n_rebuilds += 1
+
+    def update(self, agent_indices, meaning_indices, utterance_indices):
+        """
+        :param agent_indices: 1D numpy array containing the index of the observing agent for each observation
+        :param meaning_indices: 1D numpy array containing the index of the observed meaning for each observation
+        :param utterance_indices: 1D numpy array containing the index of the observed utterance (in the list of all
+        possible forms incl. noisy variants) for each observation
+        :return: self (updated in place)
+        """
+        np.add.at(self.counts, (agent_indices, meaning_indices, utterance_indices), 1)
+        observations = np.stack((agent_indices, meaning_indices, utterance_indices), axis=1)
+        distinct_observations, counts = np.unique(observations, axis=0, return_counts=True)
+        for agent_index in np.unique(distinct_observations[:, 0]):
+            log_weights = self.log_weights[agent_index]
+            max_log_likelihood_of_dropped = 0.0  # the highest LOG likelihood that any dropped hypothesis can have
+            # for the new observations
+            for (observing_agent, meaning_index, utterance_index), count in zip(distinct_observations, counts):
+                if observing_agent == agent_index:
+                    log_likelihoods = log_likelihoods_of_hypotheses(self.log_likelihood_cache, meaning_index, utterance_index, self.hypothesis_indices[agent_index])
+                    np.add(log_weights, count * log_likelihoods, out=log_weights, casting='same_kind')
+                    max_log_likelihood_of_dropped += count * self.max_log_likelihoods[meaning_index, utterance_index]
+            top_index = int(np.argmax(log_weights))
+            top_log_weight = float(log_weights[top_index])
+            if top_log_weight == -np.inf and self.hypothesis_indices[agent_index] is not None:  # the new
+                # observations rule out the whole support
+                self.rebuild(agent_index)
+            else:
+                normalize_log_probs(log_weights, out=log_weights)
+                log_evidence = top_log_weight - float(log_weights[top_index])  # (the LOG of the factor by which the
+                # mass of the support changed)
+                if self.hypothesis_indices[agent_index] is not None:
+                    self.log_dropped_mass_bounds[agent_index] += max_log_likelihood_of_dropped - log_evidence
+                    if self.log_dropped_mass_bounds[agent_index] > np.log(self.epsilon):
+                        self.rebuild(agent_index)
+            self.truncate(agent_index)
+        return self
+
+    def sample(self, agent_index):
+        """
+        :param agent_index: the index of the agent
+        :return: the index (in the hypothesis space) of a language sampled from the agent's posterior
+        """
+        index = log_roulette_wheel(self.log_weights[agent_index])
+        if self.hypothesis_indices[agent_index] is None:
+            return index
+        return int(self.hypothesis_indices[agent_index][index])
+
+    def language_stats(self, possible_form_lengths, class_per_language):
+        """
+        :param possible_form_lengths: all possible form lengths (global parameter)
+        :param class_per_language: list specifying the class for each corresponding language in the global variable
+        'hypothesis_space'
+        :return: a list containing the overall average posterior probability assigned to each class of language in the
+        population (see language_stats())
+        """
+        class_indices = np.asarray(class_per_language).astype(int)
+        stats = np.zeros(int(max(class_per_language)+1))
+        for hypothesis_indices, log_weights in zip(self.hypothesis_indices, self.log_weights):
+            if hypothesis_indices is None:
+                stats += np.bincount(class_indices, weights=np.exp(log_weights), minlength=len(stats))
+            else:
+                stats += np.bincount(class_indices[hypothesis_indices], weights=np.exp(log_weights), minlength=len(stats))
+        return np.divide(stats, len(self))
+
+    def new_population(self):
+        """
+        :return: a new SparsePosteriorPopulation of the same size, in which all agents are back at the prior (its
+        discarded_mass and n_rebuilds start at 0 again)
+        """
+        return SparsePosteriorPopulation(self.log_likelihood_cache, self.log_priors, len(self), self.epsilon, self.max_fraction, self.max_log_likelihoods)
+
+    def to_dense(self):
+        """
+        :return: 2D numpy array with the LOG posterior of each agent over all hypotheses on the rows (-inf for the
+        hypotheses that an agent has dropped)
+        """
+        population = np.full((len(self), len(self.log_priors)), -np.inf, dtype=self.log_priors.dtype)
+        for agent_index in range(len(self)):
+            if self.hypothesis_indices[agent_index] is None:
+                population[agent_index] = self.log_weights[agent_index]
+            else:
+                population[agent_index, self.hypothesis_indices[agent_index]] = self.log_weights[agent_index]
+        return population
+
+
+# THE FOLLOWING FUNCTIONS WORK WITH LANGUAGES THAT ARE STORED AS VECTORS OF FORM INDICES (ONE PER MEANING), RATHER THAN
+# AS INDICES IN THE LIST OF ALL POSSIBLE LANGUAGES, SO THAT THE HYPOTHESIS SPACE NEVER HAS TO BE ENUMERATED:
+
+@functools.lru_cache(maxsize=2**16)
+def log_prior_of_language(language, forms, meaning_list, possible_form_lengths):
+    """
+    :param language: tuple of form indices (one per meaning)
+    :param forms: tuple of all possible forms *excluding* their noisy variants
+    :param meaning_list: tuple containing all possible meanings
+    :param possible_form_lengths: tuple of all possible form lengths
+    :return: the (unnormalized) LOG compressibility prior of the language (see prior_single_lang()); the results are
+    memoised for the most recently used languages
+    """
+    lang = tuple(forms[form_index] for form_index in language)
+    return np.log(prior_single_lang(lang, forms, meaning_list, possible_form_lengths))
+
+
+@functools.lru_cache(maxsize=2**16)
+def class_of_language(language, forms, meaning_list):
+    """
+    :param language: tuple of form indices (one per meaning)
+    :param forms: tuple of all possible forms *excluding* their noisy variants
+    :param meaning_list: tuple containing all possible meanings
+    :return: the class of the language (see classify_language()); the results are memoised for the most recently used
+    languages
+    """
+    lang = tuple(forms[form_index] for form_index in language)
+    return int(classify_language(lang, forms, meaning_list))
+
+
+def log_priors_of_languages(languages, forms, meaning_list, possible_form_lengths, compressibility_bias):
+    """
+    :param languages: 2D numpy array of form indices with one language per row
+    :param forms: tuple of all possible forms *excluding* their noisy variants
+    :param meaning_list: tuple containing all possible meanings
+    :param possible_form_lengths: tuple of all possible form lengths
+    :param compressibility_bias: if True, the compressibility prior is used; otherwise a flat prior
+    :return: 1D numpy array containing the (unnormalized) LOG prior of each of these languages
+    """
+    if not compressibility_bias:
+        return np.zeros(len(languages))
+    return np.array([log_prior_of_language(tuple(language), forms, meaning_list, possible_form_lengths) for language in languages])
+
+
+def classes_of_languages(languages, forms, meaning_list):
+    """
+    :param languages: 2D numpy array of form indices with one language per row
+    :param forms: tuple of all possible forms *excluding* their noisy variants
+    :param meaning_list: tuple containing all possible meanings
+    :return: 1D numpy array containing the class of each of these languages
+    """
+    return np.array([class_of_language(tuple(language), forms, meaning_list) for language in languages], dtype=int)
+
+
+def log_likelihoods_of_languages(log_likelihood_table, languages, counts):
+    """
+    :param log_likelihood_table: 3D numpy array with axis 0 = the form that a language maps the meaning to, axis 1 =
+    the ambiguity of that form minus 1, and axis 2 = LOG likelihood of each possible utterance (incl. noisy variants);
+    e.g. the log of production_likelihood_table() in likelihood_cache.py
+    :param languages: 2D numpy array of form indices with one language per row
+    :param counts: 2D numpy array of ints with axis 0 = meanings and axis 1 = all possible forms, containing the number
+    of times each <meaning, form> pair was observed
+    :return: 1D numpy array containing the LOG likelihood of all these observations under each of the languages
+    """
+    meaning_indices, utterance_indices = np.nonzero(counts)  # (so that -inf LOG likelihoods never get multiplied by a
+    # count of 0)
+    ambiguity_indices = ambiguity_per_meaning(languages) - 1
+    log_likelihoods = log_likelihood_table[languages[:, meaning_indices], ambiguity_indices[:, meaning_indices], utterance_indices]
+    return np.sum(log_likelihoods * counts[meaning_indices, utterance_indices], axis=1)
+
+
+def hypothesis_indices_of_languages(languages, n_forms):
+    """
+    :param languages: 2D numpy array of form indices with one language per row
+    :param n_forms: the number of possible forms (excluding noisy variants)
+    :return: 1D numpy array containing the index of each of these languages in the full hypothesis space (as created
+    by create_all_possible_languages())
+    """
+    return np.ravel_multi_index(tuple(languages.T), (n_forms,) * languages.shape[1])
+
+
+class ParticlePosteriorPopulation:
+    """
+    A population in which the posterior of each agent is approximated by n_particles weighted particles, where each
+    particle is a language stored as a vector of form indices (one per meaning). The particles never have to be looked
+    up in a list of all possible languages, so memory use and run time scale with n_particles rather than with the size
+    of the hypothesis space (which is n_forms ** n_meanings). Every observation reweights the particles by its
+    likelihood. Whenever the effective sample size of an agent's particles drops below resample_threshold *
+    n_particles, the particles are resampled according to their weights, and then moved with n_move_sweeps sweeps of
+    Metropolis-Hastings steps (each of which proposes a new form for one meaning) that leave the agent's exact posterior
+    invariant, so that the particles stay diverse. To make this possible, each agent also keeps the counts of the
+    <meaning, utterance> pairs that it has observed.
+    """
+
+    def __init__(self, log_likelihood_table, forms, meaning_list, possible_form_lengths, compressibility_bias, n_particles, pop_size, resample_threshold, n_move_sweeps):
+        """
+        :param log_likelihood_table: 3D numpy array with axis 0 = the form that a language maps the meaning to, axis 1 =
+        the ambiguity of that form minus 1, and axis 2 = LOG likelihood of each possible utterance (incl. noisy
+        variants); e.g. the log of production_likelihood_table() in likelihood_cache.py
+        :param forms: list of all possible forms *excluding* their noisy variants; corresponds to global variable
+        'forms_without_noise'
+        :param meaning_list: list containing all possible meanings; corresponds to global variable 'meanings'
+        :param possible_form_lengths: all possible form lengths (global parameter)
+        :param compressibility_bias: if True, the particles target the compressibility prior (see prior_single_lang());
+        otherwise they target a flat prior
+        :param n_particles: the number of particles per agent
+        :param pop_size: the number of agents
+        :param resample_threshold: the fraction of n_particles below which the effective sample size of an agent's
+        particles has to drop for them to be resampled and moved
+        :param n_move_sweeps: the number of sweeps of Metropolis-Hastings steps (one step per meaning) after resampling
+        """
+        self.log_likelihood_table = log_likelihood_table
+        self.forms = tuple(forms)
+        self.meaning_list = tuple(meaning_list)
+        self.possible_form_lengths = tuple(possible_form_lengths)
+        self.compressibility_bias = compressibility_bias
+        self.n_particles = n_particles
+        self.resample_threshold = resample_threshold
+        self.n_move_sweeps = n_move_sweeps
+        n_meanings = len(meaning_list)
+        self.particles = np.random.randint(len(forms), size=(pop_size, n_particles, n_meanings))
+        self.log_weights = np.zeros((pop_size, n_particles))
+        self.counts = np.zeros((pop_size, n_meanings, log_likelihood_table.shape[2]), dtype=int)
+        for agent_index in range(pop_size):
+            # The particles are drawn uniformly, so under the compressibility prior they are weighted by the prior, and
+            # then rejuvenated with resampling and moves if that leaves too few effective particles:
+            self.log_weights[agent_index] = normalize_log_probs(self.log_priors(self.particles[agent_index]))
+            if self.effective_sample_size(agent_index) < self.resample_threshold * self.n_particles:
+                self.resample_and_move(agent_index)
+
+    def __len__(self):
+        return self.particles.shape[0]
+
+    def log_priors(self, particles):
+        """
+        :param particles: 2D numpy array of form indices with one language per row
+        :return: 1D numpy array containing the (unnormalized) LOG prior of each of these languages
+        """
+        return log_priors_of_languages(particles, self.forms, self.meaning_list, self.possible_form_lengths, self.compressibility_bias)
+
+    def log_likelihoods(self, particles, counts):
+        """
+        :param particles: 2D numpy array of form indices with one language per row
+        :param counts: 2D numpy array of ints with axis 0 = meanings and axis 1 = all possible forms, containing the
+        number of times each <meaning, form> pair was observed
+        :return: 1D numpy array containing the LOG likelihood of all these observations under each of the languages
+        """
+        return log_likelihoods_of_languages(self.log_likelihood_table, particles, counts)
+
+    def effective_sample_size(self, agent_index):
+        """
+        :param agent_index: the index of the agent
+        :return: the effective sample size of the agent's particles
+        """
+        return 1. / np.sum(np.exp(2. * self.log_weights[agent_index]))
+
+    def resample_and_move(self, agent_index):
+        """
+        Resamples an agent's particles according to their weights (after which they all have the same weight), and then
+        moves them with n_move_sweeps sweeps of Metropolis-Hastings steps that target the agent's exact posterior given
+        the observations it has counted. Each step proposes a uniformly drawn new form for one meaning in all particles
+        at once.
+
+        :param agent_index: the index of the agent
+        """
+        resampled = np.random.choice(self.n_particles, size=self.n_particles, p=np.exp(self.log_weights[agent_index]))
+        particles = self.particles[agent_index][resampled]
+        counts = self.counts[agent_index]
+        log_targets = self.log_priors(particles) + self.log_likelihoods(particles, counts)
+        for sweep in range(self.n_move_sweeps):
+            for m in range(len(self.meaning_list)):
+                proposals = np.array(particles)
+                proposals[:, m] = np.random.randint(len(self.forms), size=self.n_particles)
+                proposal_log_targets = self.log_priors(proposals) + self.log_likelihoods(proposals, counts)
+                accepted = np.log(np.random.random(self.n_particles)) < proposal_log_targets - log_targets
+                particles[accepted] = proposals[accepted]
+                log_targets[accepted] = proposal_log_targets[accepted]
+        self.particles[agent_index] = particles
+        self.log_weights[agent_index] = -np.log(self.n_particles)
+
+    def update(self, agent_indices, meaning_indices, utterance_indices):
+        """
+        :param agent_indices: 1D numpy array containing the index of the observing agent for each observation
+        :param meaning_indices: 1D numpy array containing the index of the observed meaning for each observation
+        :param utterance_indices: 1D numpy array containing the index of the observed utterance (in the list of all
+        possible forms incl. noisy variants) for each observation
+        :return: self (updated in place)
+        """
+        # The observations are processed one at a time (rather than reweighting the particles by all of them at once),
+        # so that the particles can be resampled and moved as soon as they degenerate; otherwise a whole dataset could
+        # leave all weight on a single particle that is still far from the posterior mode:
+        for agent_index, meaning_index, utterance_index in zip(agent_indices, meaning_indices, utterance_indices):
+            particles = self.particles[agent_index]
+            ambiguity_indices = np.sum(particles == particles[:, [meaning_index]], axis=1) - 1
+            self.counts[agent_index, meaning_index, utterance_index] += 1
+            self.log_weights[agent_index] = normalize_log_probs(self.log_weights[agent_index] + self.log_likelihood_table[particles[:, meaning_index], ambiguity_indices, utterance_index])
+            if self.effective_sample_size(agent_index) < self.resample_threshold * self.n_particles:
+                self.resample_and_move(agent_index)
+        return self
+
+    def hypothesis_indices(self, agent_index):
+        """
+        :param agent_index: the index of the agent
+        :return: 1D numpy array containing the index of each of the agent's particles in the full hypothesis space (as
+        created by create_all_possible_languages())
+        """
+        return hypothesis_indices_of_languages(self.particles[agent_index], len(self.forms))
+
+    def sample(self, agent_index):
+        """
+        :param agent_index: the index of the agent
+        :return: 1D numpy array of form indices: a particle drawn according to the agent's weights
+        """
+        particle_index = np.random.choice(self.n_particles, p=np.exp(self.log_weights[agent_index]))
+        return np.array(self.particles[agent_index, particle_index])
+
+    def language_stats(self, possible_form_lengths, class_per_language):
+        """
+        :param possible_form_lengths: all possible form lengths (global parameter)
+        :param class_per_language: list specifying the class for each corresponding language in the global variable
+        'hypothesis_space'; or None, in which case the particles are classified directly (so that the hypothesis space
+        never has to be enumerated)
+        :return: a list containing the overall average posterior probability assigned to each class of language in the
+        population (see language_stats()); i.e. the weighted class counts of the particles
+        """
+        if class_per_language is None:
+            n_classes = n_language_classes(self.forms)
+        else:
+            class_indices = np.asarray(class_per_language).astype(int)
+            n_classes = int(max(class_per_language)+1)
+        stats = np.zeros(n_classes)
+        for agent_index in range(len(self)):
+            if class_per_language is None:
+                particle_classes = classes_of_languages(self.particles[agent_index], self.forms, self.meaning_list)
+            else:
+                particle_classes = class_indices[self.hypothesis_indices(agent_index)]
+            stats += np.bincount(particle_classes, weights=np.exp(self.log_weights[agent_index]), minlength=n_classes)
+        return np.divide(stats, len(self))
+
+    def new_population(self):
+        """
+        :return: a new ParticlePosteriorPopulation of the same size, in which all agents are back at the prior
+        """
+        return ParticlePosteriorPopulation(self.log_likelihood_table, self.forms, self.meaning_list, self.possible_form_lengths, self.compressibility_bias, self.n_particles, len(self), self.resample_threshold, self.n_move_sweeps)
+
+    def to_dense(self):
+        """
+        :return: 2D numpy array with the LOG posterior of each agent over the full hypothesis space on the rows (the
+        summed weights of the particles of each language; -inf for the languages that an agent has no particles of).
+        NOTE that this is only feasible if the full hypothesis space is small enough to enumerate.
+        """
+        population = np.full((len(self), len(self.forms) ** len(self.meaning_list)), -np.inf)
+        for agent_index in range(len(self)):
+            np.logaddexp.at(population[agent_index], self.hypothesis_indices(agent_index), self.log_weights[agent_index])
+        return population
+
+
+class GibbsPosteriorPopulation:
+    """
+    A 'lazy' population in which each agent only stores the counts of the <meaning, utterance> pairs that it has
+    observed (which are sufficient statistics for its posterior), plus the current state of a Gibbs sampler: a single
+    language, stored as a vector of form indices. The likelihood of a language only couples its meanings through the
+    ambiguity of shared forms, and the compressibility prior can be calculated for a single language, so the sampler
+    can resample the form of one meaning at a time from its exact conditional posterior given the forms of the other
+    meanings (which only takes n_forms evaluations). Languages are sampled from the agent's posterior by running the
+    sampler, without ever enumerating the hypothesis space, so the memory used per agent doesn't depend on the size of
+    the hypothesis space. After an agent has observed new data, the sampler first runs n_burn_in_sweeps sweeps (one
+    step per meaning) before a language is taken from it; consecutive languages are n_sweeps sweeps apart. NOTE that
+    because each step only changes a single form, the sampler moves only slowly between languages that are both much
+    more probable than the languages in between them (e.g. two degenerate languages under the compressibility prior), so
+    consecutive languages are correlated; the class stats are much less affected by this than the individual languages.
+    """
+
+    def __init__(self, log_likelihood_table, forms, meaning_list, possible_form_lengths, compressibility_bias, pop_size, n_burn_in_sweeps, n_sweeps, n_stats_samples):
+        """
+        :param log_likelihood_table: 3D numpy array with axis 0 = the form that a language maps the meaning to, axis 1 =
+        the ambiguity of that form minus 1, and axis 2 = LOG likelihood of each possible utterance (incl. noisy
+        variants); e.g. the log of production_likelihood_table() in likelihood_cache.py
+        :param forms: list of all possible forms *excluding* their noisy variants; corresponds to global variable
+        'forms_without_noise'
+        :param meaning_list: list containing all possible meanings; corresponds to global variable 'meanings'
+        :param possible_form_lengths: all possible form lengths (global parameter)
+        :param compressibility_bias: if True, the agents have the compressibility prior (see prior_single_lang());
+        otherwise they have a flat prior
+        :param pop_size: the number of agents
+        :param n_burn_in_sweeps: the number of sweeps that the sampler runs after an agent has observed new data, before
+        the next language is taken from it
+        :param n_sweeps: the number of sweeps between two consecutive languages taken from the sampler
+        :param n_stats_samples: the number of languages that are sampled per agent to estimate the language stats
+        """
+        self.log_likelihood_table = log_likelihood_table
+        self.forms = tuple(forms)
+        self.meaning_list = tuple(meaning_list)
+        self.possible_form_lengths = tuple(possible_form_lengths)
+        self.compressibility_bias = compressibility_bias
+        self.n_burn_in_sweeps = n_burn_in_sweeps
+        self.n_sweeps = n_sweeps
+        self.n_stats_samples = n_stats_samples
+        self.counts = np.zeros((pop_size, len(meaning_list), log_likelihood_table.shape[2]), dtype=int)
+        self.states = np.random.randint(len(forms), size=(pop_size, len(meaning_list)))
+        self.burnt_in = np.zeros(pop_size, dtype=bool)
+
+    def __len__(self):
+        return self.states.shape[0]
+
+    def log_posteriors(self, languages, agent_index):
+        """
+        :param languages: 2D numpy array of form indices with one language per row
+        :param agent_index: the index of the agent
+        :return: 1D numpy array containing the (unnormalized) LOG posterior of each of these languages for the agent
+        """
+        return log_priors_of_languages(languages, self.forms, self.meaning_list, self.possible_form_lengths, self.compressibility_bias) + log_likelihoods_of_languages(self.log_likelihood_table, languages, self.counts[agent_index])
+
+    def gibbs_sweep(self, agent_index):
+        """
+        Resamples the form of each meaning in the agent's current language in turn, from its conditional posterior given
+        the forms of the other meanings.
+
+        :param agent_index: the index of the agent
+        """
+        state = self.states[agent_index]
+        for m in range(len(self.meaning_list)):
+            candidates = np.repeat(state[np.newaxis, :], len(self.forms), axis=0)
+            candidates[:, m] = np.arange(len(self.forms))
+            conditional_log_posterior = normalize_log_probs(self.log_posteriors(candidates, agent_index))
+            state[m] = np.random.choice(len(self.forms), p=np.exp(conditional_log_posterior))
+
+    def draw(self, agent_index):
+        """
+        :param agent_index: the index of the agent
+        :return: 1D numpy array of form indices: a language sampled from the agent's posterior (after running the burn-in
+        sweeps if the agent has observed new data, and n_sweeps sweeps otherwise)
+        """
+        if self.burnt_in[agent_index]:
+            n_sweeps = self.n_sweeps
+        else:
+            n_sweeps = self.n_burn_in_sweeps
+            self.burnt_in[agent_index] = True
+        for sweep in range(n_sweeps):
+            self.gibbs_sweep(agent_index)
+        return np.array(self.states[agent_index])
+
+    def update(self, agent_indices, meaning_indices, utterance_indices):
+        """
+        :param agent_indices: 1D numpy array containing the index of the observing agent for each observation
+        :param meaning_indices: 1D numpy array containing the index of the observed meaning for each observation
+        :param utterance_indices: 1D numpy array containing the index of the observed utterance (in the list of all
+        possible forms incl. noisy variants) for each observation
+        :return: self (updated in place)
+        """
+        np.add.at(self.counts, (agent_indices, meaning_indices, utterance_indices), 1)
+        self.burnt_in[np.asarray(agent_indices)] = False
+        return self
+
+    def sample(self, agent_index):
+        """
+        :param agent_index: the index of the agent
+        :return: 1D numpy array of form indices: a language sampled from the agent's posterior (see draw())
+        """
+        return self.draw(agent_index)
+
+    def language_stats(self, possible_form_lengths, class_per_language):
+        """
+        :param possible_form_lengths: all possible form lengths (global parameter)
+        :param class_per_language: list specifying the class for each corresponding language in the global variable
+        'hypothesis_space'; or None, in which case the sampled languages are classified directly (so that the hypothesis
+        space never has to be enumerated)
+        :return: a list containing the overall average posterior probability assigned to each class of language in the
+        population (see language_stats()), estimated from n_stats_samples sampled languages per agent
+        """
+        if class_per_language is None:
+            n_classes = n_language_classes(self.forms)
+        else:
+            class_indices = np.asarray(class_per_language).astype(int)
+            n_classes = int(max(class_per_language)+1)
+        stats = np.zeros(n_classes)
+        for agent_index in range(len(self)):
+            languages = np.array([self.draw(agent_index) for x in range(self.n_stats_samples)])
+            if class_per_language is None:
+                sampled_classes = classes_of_languages(languages, self.forms, self.meaning_list)
+            else:
+                sampled_classes = class_indices[hypothesis_indices_of_languages(languages, len(self.forms))]
+            stats += np.bincount(sampled_classes, minlength=n_classes) / self.n_stats_samples
+        return np.divide(stats, len(self))
+
+    def new_population(self):
+        """
+        :return: a new GibbsPosteriorPopulation of the same size, in which all agents are back at the prior
+        """
+        return GibbsPosteriorPopulation(self.log_likelihood_table, self.forms, self.meaning_list, self.possible_form_lengths, self.compressibility_bias, len(self), self.n_burn_in_sweeps, self.n_sweeps, self.n_stats_samples)
+
+    def to_dense(self):
+        """
+        :return: 2D numpy array with the exact LOG posterior of each agent over the full hypothesis space on the rows
+        (calculated from the agents' counts). NOTE that this is only feasible if the full hypothesis space is small
+        enough to enumerate.
+        """
+        n_meanings = len(self.meaning_list)
+        all_languages = np.indices((len(self.forms),) * n_meanings).reshape(n_meanings, -1).T  # (in the same order as
+        # create_all_possible_languages())
+        return np.array([normalize_log_probs(self.log_posteriors(all_languages, agent_index)) for agent_index in range(len(self))])
+
+
+def log_posteriors_from_counts(counts, log_priors, log_likelihood_cache, out=None):
+    """
+    Reconstructs the exact LOG posterior of an agent from the counts of the <meaning, utterance> pairs that it has
+    observed (e.g. from the final population of a CountPosteriorPopulation that was pickled as counts).
+
+    :param counts: 2D numpy array of ints with axis 0 = meanings and axis 1 = all possible forms, containing the number
+    of times the agent observed each <meaning, form> pair
+    :param log_priors: the LOG prior probability distribution of the agent
+    :param log_likelihood_cache: either a 3D numpy array with axis 0 = meanings, axis 1 = all possible forms, and axis
+    2 = LOG likelihood of corresponding <meaning, form> pair for each hypothesis, or one of the compact cache
+    representations in likelihood_cache.py (a FactorisedLikelihoodCache or a QuantisedLikelihoodCache)
+    :param out: (optional) 1D numpy array of the same length and dtype as log_priors that the result is written into
+    :return: 1D numpy array containing the LOG posterior probability of each hypothesis (out, if given)
+    """
+    if out is None:
+        out = np.array(log_priors)
+    else:
+        out[:] = log_priors
+    for meaning_index, utterance_index in zip(*np.nonzero(counts)):  # (so that -inf LOG likelihoods never get
+        # multiplied by a count of 0)
+        log_likelihoods = log_likelihoods_of_hypotheses(log_likelihood_cache, meaning_index, utterance_index, None)
+        np.add(out, counts[meaning_index, utterance_index] * log_likelihoods, out=out, casting='same_kind')
+    return normalize_log_probs(out, out=out)
+
+
+class CountPosteriorPopulation:
+    """
+    A population in which each agent is stored as nothing more than the counts of the <meaning, utterance> pairs that it
+    has observed (a (n_meanings x n_forms_including_noisy_variants) matrix of ints). Together with the prior and the
+    log_likelihood_cache, which all agents share, these counts fully determine the agent's exact posterior, so the
+    memory used per agent doesn't depend on the size of the hypothesis space. An agent's LOG posterior is only
+    materialised when it has to sample a language or be measured, in one of n_buffers buffers that are reused for all
+    agents (the least recently used one is overwritten when the LOG posterior of an agent that has no buffer is asked
+    for). While an agent has a buffer, new observations are added to it in place, so its LOG posterior only has to be
+    calculated from the counts again once its buffer has been taken by another agent. With the default of 2 buffers, a
+    speaker and hearer that take turns in communication therefore each keep their own buffer.
+    """
+
+    def __init__(self, log_likelihood_cache, log_priors, pop_size, n_buffers=2):
+        """
+        :param log_likelihood_cache: either a 3D numpy array with axis 0 = meanings, axis 1 = all possible forms, and
+        axis 2 = LOG likelihood of corresponding <meaning, form> pair for each hypothesis, or one of the compact cache
+        representations in likelihood_cache.py (a FactorisedLikelihoodCache or a QuantisedLikelihoodCache)
+        :param log_priors: the LOG prior probability distribution that each agent is initialised with
+        :param pop_size: the number of agents
+        :param n_buffers: the number of agents whose LOG posterior can be materialised at the same time
+        """
+        self.log_likelihood_cache = log_likelihood_cache
+        self.log_priors = log_priors
+        self.n_buffers = n_buffers
+        n_meanings, n_forms = log_likelihood_cache.shape[:2]
+        self.counts = np.zeros((pop_size, n_meanings, n_forms), dtype=int)
+        self.buffers = collections.OrderedDict()  # the materialised LOG posterior of each agent that has a buffer, keyed
+        # by agent index (from least to most recently used)
+
+    def __len__(self):
+        return self.counts.shape[0]
+
+    def log_posterior(self, agent_index):
+        """
+        :param agent_index: the index of the agent
+        :return: 1D numpy array containing the agent's LOG posterior over all hypotheses. NOTE that this is one of the
+        shared buffers, which may be overwritten as soon as the LOG posterior of another agent is materialised; copy it to
+        keep it.
+        """
+        agent_index = int(agent_index)
+        if agent_index in self.buffers:
+            self.buffers.move_to_end(agent_index)
+            return self.buffers[agent_index]
+        if len(self.buffers) < self.n_buffers:
+            buffer = np.empty_like(self.log_priors)
+        else:
+            buffer = self.buffers.popitem(last=False)[1]
+        self.buffers[agent_index] = log_posteriors_from_counts(self.counts[agent_index], self.log_priors, self.log_likelihood_cache, out=buffer)
+        return buffer
+
+    def update(self, agent_indices, meaning_indices, utterance_indices):
+        """
+        :param agent_indices: 1D numpy array containing the index of the observing agent for each observation
+        :param meaning_indices: 1D numpy array containing the index of the observed meaning for each observation
+        :param utterance_indices: 1D numpy array containing the index of the observed utterance (in the list of all
+        possible forms incl. noisy variants) for each observation
+        :return: self (updated in place)
+        """
+        np.add.at(self.counts, (agent_indices, meaning_indices, utterance_indices), 1)
+        updated_buffers = {}
+        for agent_index, meaning_index, utterance_index in zip(agent_indices, meaning_indices, utterance_indices):
+            if int(agent_index) in self.buffers:  # (the same update as in log_posteriors_from_counts())
+                buffer = self.buffers[int(agent_index)]
+                np.add(buffer, log_likelihoods_of_hypotheses(self.log_likelihood_cache, meaning_index, utterance_index, None), out=buffer, casting='same_kind')
+                updated_buffers[int(agent_index)] = buffer
+        for buffer in updated_buffers.values():
+            normalize_log_probs(buffer, out=buffer)
+        return self
+
+    def sample(self, agent_index):
+        """
+        :param agent_index: the index of the agent
+        :return: the index (in the hypothesis space) of a language sampled from the agent's posterior
+        """
+        return log_roulette_wheel(self.log_posterior(agent_index))
+
+    def language_stats(self, possible_form_lengths, class_per_language):
+        """
+        :param possible_form_lengths: all possible form lengths (global parameter)
+        :param class_per_language: list specifying the class for each corresponding language in the global variable
+        'hypothesis_space'
+        :return: a list containing the overall average posterior probability assigned to each class of language in the
+        population (see language_stats())
+        """
+        class_indices = np.asarray(class_per_language).astype(int)
+        stats = np.zeros(int(max(class_per_language)+1))
+        for agent_index in range(len(self)):
+            stats += np.bincount(class_indices, weights=np.exp(self.log_posterior(agent_index)), minlength=len(stats))
+        return np.divide(stats, len(self))
+
+    def new_population(self):
+        """
+        :return: a new CountPosteriorPopulation of the same size, in which all agents are back at the prior (i.e. have
+        no counts)
+        """
+        return CountPosteriorPopulation(self.log_likelihood_cache, self.log_priors, len(self), self.n_buffers)
+
+    def to_dense(self):
+        """
+        :return: 2D numpy array with the LOG posterior of each agent over all hypotheses on the rows
+        """
+        return np.array([np.array(self.log_posterior(agent_index)) for agent_index in range(len(self))])  # (each one
+        # copied out of the buffer before the next one overwrites it)
@@ -0,0 +1,698 @@
+import os
+import json
+import fcntl
+import struct
+import hashlib
+import numpy as np
+from evolution_compositionality_under_noise import create_all_possible_forms, create_all_possible_noisy_forms, create_noisy_variants, create_all_possible_languages, create_form_index_per_language, convert_float_value_to_string, convert_array_to_string
+
+
+###################################################################################################################
+# FUNCTIONS THAT BUILD THE LOG LIKELIHOOD CACHE WITH ARRAY OPERATIONS INSTEAD OF ONE PYTHON CALL PER HYPOTHESIS:
+
+# For a given language, the likelihood of a <meaning, form> pair depends only on (i) the form that the language assigns
+# to the meaning (the 'correct form'), (ii) how many meanings share that form (the 'ambiguity' of the correct form) and
+# (iii) the form that was actually produced. The functions below therefore first calculate one likelihood vector for
+# each possible combination of correct form and ambiguity, and then fill out the full cache by simply looking up the
+# right vector for each <meaning, hypothesis> pair.
+
+
+def ambiguity_per_meaning(form_index_per_language):
+    """
+    Calculates for each language and each meaning how many meanings in that language share the form that is used for
+    that meaning.
+
+    :param form_index_per_language: 2D numpy array of shape (n_languages, n_meanings) containing the form index that
+    each language maps each meaning to (see create_form_index_per_language())
+    :return: 2D numpy array of the same shape as form_index_per_language, containing the ambiguity (int between 1 and
+    n_meanings) of the form that is used for each meaning
+    """
+    same_form = np.equal(form_index_per_language[:, :, np.newaxis], form_index_per_language[:, np.newaxis, :])
+    ambiguities = np.sum(same_form, axis=2).astype(form_index_per_language.dtype)
+    return ambiguities
+
+
+def noisy_variant_matrix(forms, all_possible_forms):
+    """
+    Creates a boolean matrix specifying which of all possible forms (including noisy variants) are noisy variants of
+    which complete form.
+
+    :param forms: list of all possible forms *excluding* their noisy variants
+    :param all_possible_forms: list of all possible forms INCLUDING noisy variants; corresponds to global variable
+    'all_forms_including_noisy_variants'
+    :return: 2D boolean numpy array of shape (len(forms), len(all_possible_forms)), where entry [f, u] is True if
+    all_possible_forms[u] is a noisy variant of forms[f]
+    """
+    form_indices = {form: i for i, form in enumerate(all_possible_forms)}
+    is_noisy_variant = np.zeros((len(forms), len(all_possible_forms)), dtype=bool)
+    for f in range(len(forms)):
+        for noisy_variant in create_noisy_variants(forms[f]):
+            is_noisy_variant[f][form_indices[noisy_variant]] = True
+    return is_noisy_variant
+
+
+# Each entry in a production likelihood vector is one of four types of products of the gamma, delta, error and noise
+# terms, depending only on how the utterance relates to the correct form:
+entry_type_correct_form_complete = 0
+entry_type_correct_form_noisy = 1
+entry_type_error_form_noisy = 2
+entry_type_error_form_complete = 3
+
+
+def production_entry_types(forms, noisy_variants):
+    """
+    Determines for each possible correct form and each possible utterance which type of product of gamma, delta, error
+    and noise terms the production likelihood of that utterance consists of.
+
+    NOTE that, just like production_likelihoods_with_noise_and_minimal_effort() (in repair_vs_redundancy_model.py), the
+    probability of each noisy variant is divided by the length of the *last* error form in the forms list, rather than
+    by the length of the produced form. This function therefore also returns that number for each correct form, so
+    that the results stay identical to the original implementation.
+
+    :param forms: list of all possible forms *excluding* their noisy variants
+    :param noisy_variants: list of all possible noisy variants of forms
+    :return: (1) 2D numpy array of shape (len(forms), len(forms + noisy_variants)) containing the entry type (one of
+    the entry_type_ constants above) of each utterance given each correct form; and (2) 1D numpy array containing the
+    number of noisy variants that the probability of a noisy utterance is divided by, for each correct form
+    """
+    all_possible_forms = forms + noisy_variants
+    is_noisy_variant = noisy_variant_matrix(forms, all_possible_forms)
+    correct_form_complete = np.zeros((len(forms), len(all_possible_forms)), dtype=bool)
+    correct_form_complete[:, :len(forms)] = np.identity(len(forms), dtype=bool)
+    correct_form_noisy = is_noisy_variant
+    # An utterance is a noisy variant of an error form if it is a noisy variant of any of the forms other than the
+    # correct form:
+    n_forms_per_noisy_variant = np.sum(is_noisy_variant, axis=0)
+    error_form_noisy = np.logical_and(np.subtract(n_forms_per_noisy_variant, is_noisy_variant) > 0,
+                                      np.logical_not(correct_form_noisy))
+    entry_types = np.full((len(forms), len(all_possible_forms)), entry_type_error_form_complete, dtype=np.uint8)
+    entry_types[error_form_noisy] = entry_type_error_form_noisy
+    entry_types[correct_form_noisy] = entry_type_correct_form_noisy
+    entry_types[correct_form_complete] = entry_type_correct_form_complete
+    # This reproduces 'len(noisy_variants)' in production_likelihoods_with_noise_and_minimal_effort(), which at that
+    # point holds the noisy variants of the last error form:
+    n_noisy_variants = np.array([len([form for form in forms if form != correct_form][-1]) for correct_form in forms])
+    return entry_types, n_noisy_variants
+
+
+def production_likelihood_table(forms, noisy_variants, n_meanings, ambiguity_penalty, effort_penalty, error_prob, prob_of_noise):
+    """
+    Calculates the production probabilities for each of the possible forms (including both forms without noise and all
+    possible noisy variants), for every possible combination of correct form and ambiguity of that correct form. Each
+    row reproduces the output of production_likelihoods_with_noise_and_minimal_effort() (from
+    repair_vs_redundancy_model.py) for a language that maps the topic to that correct form with that ambiguity.
+
+    :param forms: list of all possible forms *excluding* their noisy variants
+    :param noisy_variants: list of all possible noisy variants of forms
+    :param n_meanings: the number of meanings (which is also the maximum possible ambiguity of a form)
+    :param ambiguity_penalty: parameter that determines the strength of the penalty on ambiguity (gamma)
+    :param effort_penalty: parameter that determines the strength of the penalty on speaker effort (i.e. utterance
+    length)
+    :param error_prob: the probability of making an error in production
+    :param prob_of_noise: the probability of environmental noise masking part of the utterance
+    :return: 3D numpy array with axis 0 = correct form (index in forms), axis 1 = ambiguity of the correct form minus 1,
+    and axis 2 = production probability of each form in forms + noisy_variants
+    """
+    entry_types, n_noisy_variants = production_entry_types(forms, noisy_variants)
+    form_lengths = np.array([len(form) for form in forms])
+    ambiguities = np.arange(1, n_meanings+1)
+
+    prop_to_prob_correct_form = ((1./ambiguities[np.newaxis, :]) ** ambiguity_penalty) * ((1./form_lengths[:, np.newaxis]) ** effort_penalty) * (1. - error_prob)
+    prop_to_prob_correct_form_complete = prop_to_prob_correct_form * (1 - prob_of_noise)
+    prop_to_prob_correct_form_noisy = prop_to_prob_correct_form * (prob_of_noise / n_noisy_variants[:, np.newaxis])
+    prop_to_prob_error_form_noisy = error_prob / (len(forms) - 1) * (1 - prob_of_noise) * (prob_of_noise / n_noisy_variants)
+    prop_to_prob_error_form_complete = error_prob / (len(forms) - 1) * (1 - prob_of_noise)
+
+    likelihood_table = np.where(entry_types == entry_type_error_form_noisy, prop_to_prob_error_form_noisy[:, np.newaxis], prop_to_prob_error_form_complete)
+    likelihood_table = np.repeat(likelihood_table[:, np.newaxis, :], n_meanings, axis=1)
+    likelihood_table = np.where((entry_types == entry_type_correct_form_noisy)[:, np.newaxis, :], prop_to_prob_correct_form_noisy[:, :, np.newaxis], likelihood_table)
+    likelihood_table = np.where((entry_types == entry_type_correct_form_complete)[:, np.newaxis, :], prop_to_prob_correct_form_complete[:, :, np.newaxis], likelihood_table)
+    return likelihood_table
+
+
+class FactorisedLikelihoodCache:
+    """
+    Stores the LOG likelihoods of all <meaning, form> pairs for all hypotheses in factorised form: a small table of LOG
+    likelihoods per (correct form, ambiguity, utterance), plus for each hypothesis and meaning the index of the correct
+    form and of its ambiguity. The LOG likelihoods of a single <meaning, form> pair for all hypotheses are then
+    retrieved with a single fancy-indexed gather, without ever storing the full (meanings x forms x hypotheses) matrix.
+    """
+
+    def __init__(self, log_likelihood_table, form_index_per_hypothesis, ambiguity_index_per_hypothesis):
+        """
+        :param log_likelihood_table: 3D numpy array with axis 0 = correct form, axis 1 = ambiguity of the correct form
+        minus 1, and axis 2 = LOG likelihood of each possible form (incl. noisy variants)
+        :param form_index_per_hypothesis: 2D numpy array of shape (n_hypotheses, n_meanings) containing the index of
+        the form that each hypothesis maps each meaning to
+        :param ambiguity_index_per_hypothesis: 2D numpy array of shape (n_hypotheses, n_meanings) containing the
+        ambiguity minus 1 of the form that each hypothesis maps each meaning to
+        """
+        self.log_likelihood_table = log_likelihood_table
+        self.form_index_per_hypothesis = form_index_per_hypothesis
+        self.ambiguity_index_per_hypothesis = ambiguity_index_per_hypothesis
+
+    @property
+    def shape(self):
+        """
+        :return: the shape of the equivalent dense cache: (n_meanings, n_forms_including_noisy_variants, n_hypotheses)
+        """
+        return self.form_index_per_hypothesis.shape[1], self.log_likelihood_table.shape[2], self.form_index_per_hypothesis.shape[0]
+
+    @property
+    def nbytes(self):
+        """
+        :return: the total number of bytes used by the arrays of this cache
+        """
+        return self.log_likelihood_table.nbytes + self.form_index_per_hypothesis.nbytes + self.ambiguity_index_per_hypothesis.nbytes
+
+    def log_likelihoods(self, meaning_index, utterance_index, hypothesis_indices=None):
+        """
+        :param meaning_index: index of the meaning in the list of meanings
+        :param utterance_index: index of the utterance in the list of all possible forms (incl. noisy variants)
+        :param hypothesis_indices: (optional) 1D numpy array of the indices of the hypotheses to retrieve the LOG
+        likelihoods for; by default, they are retrieved for all hypotheses
+        :return: 1D numpy array containing the LOG likelihood of the <meaning, utterance> pair for each (requested)
+        hypothesis
+        """
+        log_likelihood_table_utterance = self.log_likelihood_table[:, :, utterance_index]
+        if hypothesis_indices is None:
+            return log_likelihood_table_utterance[self.form_index_per_hypothesis[:, meaning_index], self.ambiguity_index_per_hypothesis[:, meaning_index]]
+        return log_likelihood_table_utterance[self.form_index_per_hypothesis[hypothesis_indices, meaning_index], self.ambiguity_index_per_hypothesis[hypothesis_indices, meaning_index]]
+
+    def log_likelihood_block(self, meaning_indices, utterance_indices):
+        """
+        :param meaning_indices: 1D numpy array of meaning indices
+        :param utterance_indices: 1D numpy array of utterance indices (of the same length as meaning_indices)
+        :return: 2D numpy array with one row per <meaning, utterance> pair, containing the LOG likelihood of that pair for
+        each hypothesis (gathered in a single fancy-indexing operation)
+        """
+        return self.log_likelihood_table[self.form_index_per_hypothesis[:, meaning_indices].T, self.ambiguity_index_per_hypothesis[:, meaning_indices].T, np.asarray(utterance_indices)[:, np.newaxis]]
+
+    def subset(self, hypothesis_indices):
+        """
+        :param hypothesis_indices: 1D numpy array of the indices of the hypotheses to keep
+        :return: a FactorisedLikelihoodCache for only those hypotheses (in the order given), which shares the LOG
+        likelihood table with this one
+        """
+        return FactorisedLikelihoodCache(self.log_likelihood_table, self.form_index_per_hypothesis[hypothesis_indices], self.ambiguity_index_per_hypothesis[hypothesis_indices])
+
+    def to_dense(self):
+        """
+        :return: the equivalent dense cache; a 3D numpy matrix with axis 0 = meanings, axis 1 = forms (incl. noisy
+        variants), and axis 2 = LOG likelihood values for each hypothesis
+        """
+        n_meanings, n_forms, n_hypotheses = self.shape
+        log_likelihood_cache_matrix = np.zeros((n_meanings, n_forms, n_hypotheses), dtype=self.log_likelihood_table.dtype)
+        for m in range(n_meanings):
+            log_likelihood_cache_matrix[m] = self.log_likelihood_table[self.form_index_per_hypothesis[:, m], self.ambiguity_index_per_hypothesis[:, m]].T
+        return log_likelihood_cache_matrix
+
+
+def factorise_log_likelihoods(meaning_list, forms, noisy_variants, hypotheses, ambiguity_penalty, effort_penalty, error_prob, prob_of_noise):
+    """
+    Creates a FactorisedLikelihoodCache for all possible datapoints (i.e. <meaning, form> pairs) and all hypotheses.
+
+    :param meaning_list: list containing all possible meanings; corresponds to global variable 'meanings'
+    :param forms: list of all possible forms *excluding* their noisy variants
+    :param noisy_variants: list of all possible noisy variants of forms
+    :param hypotheses: list of all possible languages; corresponds to global parameter 'hypothesis_space'
+    :param ambiguity_penalty: parameter that determines the strength of the penalty on ambiguity (gamma)
+    :param effort_penalty: parameter that determines the strength of the penalty on speaker effort (i.e. utterance
+    length)
+    :param error_prob: the probability of making an error in production
+    :param prob_of_noise: the probability of environmental noise masking part of the utterance
+    :return: a FactorisedLikelihoodCache
+    """
+    likelihood_table = production_likelihood_table(forms, noisy_variants, len(meaning_list), ambiguity_penalty, effort_penalty, error_prob, prob_of_noise)
+    with np.errstate(divide='ignore'):  # a likelihood of 0 (e.g. for complete forms when prob_of_noise = 1.0) simply
+        # becomes a LOG likelihood of -inf
+        log_likelihood_table = np.log(likelihood_table)
+    form_index_per_hypothesis = create_form_index_per_language(hypotheses, forms)
+    ambiguity_index_per_hypothesis = ambiguity_per_meaning(form_index_per_hypothesis) - 1
+    return FactorisedLikelihoodCache(log_likelihood_table, form_index_per_hypothesis, ambiguity_index_per_hypothesis)
+
+
+class QuantisedLikelihoodCache:
+    """
+    Stores the LOG likelihoods of all <meaning, form> pairs for all hypotheses as a uint8 code per (meaning, form,
+    hypothesis), plus a tiny codebook of the distinct LOG likelihood values that those codes refer to. Because every
+    entry of a log_likelihood_cache is one of only a handful of products of the gamma, delta, error and noise terms,
+    this is an exact (lossless) representation that takes up 8 times less memory than the dense float64 matrix.
+    """
+
+    def __init__(self, codes, log_likelihood_codebook):
+        """
+        :param codes: 3D numpy array of dtype uint8 with axis 0 = meanings, axis 1 = all possible forms, and axis 2 =
+        hypotheses, containing the index in log_likelihood_codebook of the LOG likelihood of each <meaning, form> pair
+        for each hypothesis
+        :param log_likelihood_codebook: 1D numpy array containing all distinct LOG likelihood values
+        """
+        self.codes = codes
+        self.log_likelihood_codebook = log_likelihood_codebook
+
+    @property
+    def shape(self):
+        """
+        :return: the shape of the equivalent dense cache: (n_meanings, n_forms_including_noisy_variants, n_hypotheses)
+        """
+        return self.codes.shape
+
+    @property
+    def nbytes(self):
+        """
+        :return: the total number of bytes used by the arrays of this cache
+        """
+        return self.codes.nbytes + self.log_likelihood_codebook.nbytes
+
+    def log_likelihoods(self, meaning_index, utterance_index, hypothesis_indices=None):
+        """
+        :param meaning_index: index of the meaning in the list of meanings
+        :param utterance_index: index of the utterance in the list of all possible forms (incl. noisy variants)
+        :param hypothesis_indices: (optional) 1D numpy array of the indices of the hypotheses to retrieve the LOG
+        likelihoods for; by default, they are retrieved for all hypotheses
+        :return: 1D numpy array containing the LOG likelihood of the <meaning, utterance> pair for each (requested)
+        hypothesis
+        """
+        if hypothesis_indices is None:
+            return np.take(self.log_likelihood_codebook, self.codes[meaning_index][utterance_index])
+        return np.take(self.log_likelihood_codebook, self.codes[meaning_index, utterance_index, hypothesis_indices])
+
+    def log_likelihood_block(self, meaning_indices, utterance_indices):
+        """
+        :param meaning_indices: 1D numpy array of meaning indices
+        :param utterance_indices: 1D numpy array of utterance indices (of the same length as meaning_indices)
+        :return: 2D numpy array with one row per <meaning, utterance> pair, containing the LOG likelihood of that pair for
+        each hypothesis (gathered in a single fancy-indexing operation)
+        """
+        return np.take(self.log_likelihood_codebook, self.codes[meaning_indices, utterance_indices])
+
+    def subset(self, hypothesis_indices):
+        """
+        :param hypothesis_indices: 1D numpy array of the indices of the hypotheses to keep
+        :return: a QuantisedLikelihoodCache for only those hypotheses (in the order given), which shares the codebook
+        with this one
+        """
+        return QuantisedLikelihoodCache(np.ascontiguousarray(self.codes[:, :, hypothesis_indices]), self.log_likelihood_codebook)
+
+    def to_dense(self):
+        """
+        :return: the equivalent dense cache; a 3D numpy matrix with axis 0 = meanings, axis 1 = forms (incl. noisy
+        variants), and axis 2 = LOG likelihood values for each hypothesis
+        """
+        return np.take(self.log_likelihood_codebook, self.codes)
+
+
+def quantise_log_likelihoods(log_likelihood_cache):
+    """
+    Turns a log_likelihood_cache into a QuantisedLikelihoodCache.
+
+    :param log_likelihood_cache: either a 3D numpy array with axis 0 = meanings, axis 1 = all possible forms, and axis
+    2 = LOG likelihood of corresponding <meaning, form> pair for each hypothesis, or a FactorisedLikelihoodCache
+    :return: a QuantisedLikelihoodCache
+    """
+    if isinstance(log_likelihood_cache, FactorisedLikelihoodCache):
+        # The distinct values can be found in the small likelihood table, which is then gathered into the full matrix
+        # of codes in exactly the same way as FactorisedLikelihoodCache.to_dense() gathers the LOG likelihoods:
+        log_likelihood_codebook, code_table = np.unique(log_likelihood_cache.log_likelihood_table, return_inverse=True)
+        if len(log_likelihood_codebook) > np.iinfo(np.uint8).max + 1:
+            raise ValueError("UH-OH! The cache contains more distinct values than fit in a uint8 code.")
+        code_table = code_table.reshape(log_likelihood_cache.log_likelihood_table.shape).astype(np.uint8)
+        n_meanings, n_forms, n_hypotheses = log_likelihood_cache.shape
+        codes = np.zeros((n_meanings, n_forms, n_hypotheses), dtype=np.uint8)
+        for m in range(n_meanings):
+            codes[m] = code_table[log_likelihood_cache.form_index_per_hypothesis[:, m], log_likelihood_cache.ambiguity_index_per_hypothesis[:, m]].T
+    else:
+        log_likelihood_codebook, codes = np.unique(log_likelihood_cache, return_inverse=True)
+        if len(log_likelihood_codebook) > np.iinfo(np.uint8).max + 1:
+            raise ValueError("UH-OH! The cache contains more distinct values than fit in a uint8 code.")
+        codes = codes.reshape(log_likelihood_cache.shape).astype(np.uint8)
+    return QuantisedLikelihoodCache(codes, log_likelihood_codebook)
+
+
+class DecomposedLikelihoodCache:
+    """
+    Stores everything that the LOG likelihoods of all <meaning, form> pairs for all hypotheses depend on *apart from*
+    the parameters gamma, delta, error and noise_prob. In LOG space every likelihood is a sum of a few fixed terms:
+    gamma * log(1/ambiguity) and delta * log(1/form length) (only for the correct form and its noisy variants), plus
+    either log(1-error) or log(error/(n_forms-1)), plus log(1-noise_prob) and/or log(noise_prob/n_noisy_variants). So
+    once the entry type of each <correct form, utterance> combination (see production_entry_types()) and the form index
+    and ambiguity per hypothesis are stored, the cache for any parameter setting can be composed in a single
+    vectorised pass, without rebuilding anything per parameter setting.
+    """
+
+    def __init__(self, entry_types, n_noisy_variants, form_lengths, form_index_per_hypothesis, ambiguity_index_per_hypothesis):
+        """
+        :param entry_types: 2D numpy array of shape (n_forms, n_forms_including_noisy_variants) containing the entry
+        type of each utterance given each correct form (see production_entry_types())
+        :param n_noisy_variants: 1D numpy array containing the number of noisy variants that the probability of a noisy
+        utterance is divided by, for each correct form (see production_entry_types())
+        :param form_lengths: 1D numpy array containing the length of each form
+        :param form_index_per_hypothesis: 2D numpy array of shape (n_hypotheses, n_meanings) containing the index of
+        the form that each hypothesis maps each meaning to
+        :param ambiguity_index_per_hypothesis: 2D numpy array of shape (n_hypotheses, n_meanings) containing the
+        ambiguity minus 1 of the form that each hypothesis maps each meaning to
+        """
+        self.entry_types = entry_types
+        self.n_noisy_variants = n_noisy_variants
+        self.form_lengths = form_lengths
+        self.form_index_per_hypothesis = form_index_per_hypothesis
+        self.ambiguity_index_per_hypothesis = ambiguity_index_per_hypothesis
+
+    def compose_log_likelihood_table(self, ambiguity_penalty, effort_penalty, error_prob, prob_of_noise):
+        """
+        Composes the table of LOG likelihoods per (correct form, ambiguity, utterance) for a given parameter setting.
+
+        :param ambiguity_penalty: parameter that determines the strength of the penalty on ambiguity (gamma)
+        :param effort_penalty: parameter that determines the strength of the penalty on speaker effort (delta)
+        :param error_prob: the probability of making an error in production
+        :param prob_of_noise: the probability of environmental noise masking part of the utterance
+        :return: 3D numpy array with axis 0 = correct form, axis 1 = ambiguity of the correct form minus 1, and axis 2 =
+        LOG likelihood of each possible form (incl. noisy variants)
+        """
+        n_forms = self.entry_types.shape[0]
+        n_meanings = self.form_index_per_hypothesis.shape[1]
+        with np.errstate(divide='ignore'):  # probabilities of 0 (e.g. 1-noise_prob when noise_prob = 1.0) simply
+            # become LOG probabilities of -inf
+            log_no_error = np.log(1. - error_prob)
+            log_error_per_form = np.log(error_prob) - np.log(n_forms - 1)
+            log_no_noise = np.log(1. - prob_of_noise)
+            log_noise_per_variant = np.log(prob_of_noise) - np.log(self.n_noisy_variants)
+        log_inverse_ambiguities = -np.log(np.arange(1, n_meanings+1))
+        log_inverse_form_lengths = -np.log(self.form_lengths)
+
+        log_correct_form = (ambiguity_penalty * log_inverse_ambiguities[np.newaxis, :]) + (effort_penalty * log_inverse_form_lengths[:, np.newaxis]) + log_no_error
+        log_correct_form_complete = log_correct_form + log_no_noise
+        log_correct_form_noisy = log_correct_form + log_noise_per_variant[:, np.newaxis]
+        log_error_form_noisy = log_error_per_form + log_no_noise + log_noise_per_variant
+        log_error_form_complete = log_error_per_form + log_no_noise
+
+        log_likelihood_table = np.where(self.entry_types == entry_type_error_form_noisy, log_error_form_noisy[:, np.newaxis], log_error_form_complete)
+        log_likelihood_table = np.repeat(log_likelihood_table[:, np.newaxis, :], n_meanings, axis=1)
+        log_likelihood_table = np.where((self.entry_types == entry_type_correct_form_noisy)[:, np.newaxis, :], log_correct_form_noisy[:, :, np.newaxis], log_likelihood_table)
+        log_likelihood_table = np.where((self.entry_types == entry_type_correct_form_complete)[:, np.newaxis, :], log_correct_form_complete[:, :, np.newaxis], log_likelihood_table)
+        return log_likelihood_table
+
+    def compose(self, ambiguity_penalty, effort_penalty, error_prob, prob_of_noise, dtype=np.float64):
+        """
+        Composes the log_likelihood_cache for a given parameter setting. The resulting FactorisedLikelihoodCache shares
+        the (large) per-hypothesis index arrays with this DecomposedLikelihoodCache, so composing a cache for another
+        parameter setting costs next to nothing. Use .to_dense() on the result to materialise the full matrix.
+
+        :param ambiguity_penalty: parameter that determines the strength of the penalty on ambiguity (gamma)
+        :param effort_penalty: parameter that determines the strength of the penalty on speaker effort (delta)
+        :param error_prob: the probability of making an error in production
+        :param prob_of_noise: the probability of environmental noise masking part of the utterance
+        :param dtype: the dtype of the LOG likelihoods (e.g. np.float64 or np.float32); the table is always composed in
+        float64 and only cast afterwards
+        :return: a FactorisedLikelihoodCache
+        """
+        log_likelihood_table = self.compose_log_likelihood_table(ambiguity_penalty, effort_penalty, error_prob, prob_of_noise).astype(dtype)
+        return FactorisedLikelihoodCache(log_likelihood_table, self.form_index_per_hypothesis, self.ambiguity_index_per_hypothesis)
+
+
+def decompose_log_likelihoods(meaning_list, forms, noisy_variants, hypotheses):
+    """
+    Creates a DecomposedLikelihoodCache for all possible datapoints (i.e. <meaning, form> pairs) and all hypotheses.
+
+    :param meaning_list: list containing all possible meanings; corresponds to global variable 'meanings'
+    :param forms: list of all possible forms *excluding* their noisy variants
+    :param noisy_variants: list of all possible noisy variants of forms
+    :param hypotheses: list of all possible languages; corresponds to global parameter 'hypothesis_space'
+    :return: a DecomposedLikelihoodCache
+    """
+    entry_types, n_noisy_variants = production_entry_types(forms, noisy_variants)
+    form_lengths = np.array([len(form) for form in forms])
+    form_index_per_hypothesis = create_form_index_per_language(hypotheses, forms)
+    ambiguity_index_per_hypothesis = ambiguity_per_meaning(form_index_per_hypothesis) - 1
+    return DecomposedLikelihoodCache(entry_types, n_noisy_variants, form_lengths, form_index_per_hypothesis, ambiguity_index_per_hypothesis)
+
+
+def cache_log_likelihoods_vectorised(meaning_list, forms, noisy_variants, hypotheses, ambiguity_penalty, effort_penalty, error_prob, prob_of_noise):
+    """
+    Calculates the LOG likelihood of every possible datapoint (i.e. <meaning, form> pair) for every hypothesis, and
+    saves them all in one big 3D numpy matrix. Gives the same result as cache_log_likelihoods_per_datapoint() in
+    memoise_likelihoods.py, but calculates each distinct likelihood vector only once (see production_likelihood_table())
+    and then fills out the matrix by gathering.
+
+    :param meaning_list: list containing all possible meanings; corresponds to global variable 'meanings'
+    :param forms: list of all possible forms *excluding* their noisy variants
+    :param noisy_variants: list of all possible noisy variants of forms
+    :param hypotheses: list of all possible languages; corresponds to global parameter 'hypothesis_space'
+    :param ambiguity_penalty: parameter that determines the strength of the penalty on ambiguity (gamma)
+    :param effort_penalty: parameter that determines the strength of the penalty on speaker effort (i.e. utterance
+    length)
+    :param error_prob: the probability of making an error in production
+    :param prob_of_noise: the probability of environmental noise masking part of the utterance
+    :return: 3D numpy matrix with axis 0 = meanings, axis 1 = forms (incl. noisy variants), and axis 2 = LOG likelihood
+    values for each hypothesis
+    """
+    factorised_cache = factorise_log_likelihoods(meaning_list, forms, noisy_variants, hypotheses, ambiguity_penalty, effort_penalty, error_prob, prob_of_noise)
+    return factorised_cache.to_dense()
+
+
+###################################################################################################################
+# FUNCTIONS THAT SAVE AND LOAD LOG LIKELIHOOD CACHES AS FLAT, MEMORY-MAPPABLE BINARY FILES:
+
+# A cache file consists of (i) the magic bytes below, (ii) the offset at which the array data starts (an unsigned 64 bit
+# integer), (iii) a JSON header that contains the fingerprint of the world and parameter settings that the cache was
+# built for, as well as the dtype, shape and offset of each array, and (iv) the raw array data. Because the array data
+# are stored raw, they can be opened with np.memmap() without reading them into memory; when many processes on the
+# same machine open the same cache file, they therefore all share the same pages in the OS page cache.
+
+cache_file_magic = b'LLCACHE1'
+cache_file_alignment = 64
+
+
+def world_fingerprint(meaning_list, n_characters, possible_form_lengths, ambiguity_penalty, effort_penalty, error_prob, prob_of_noise):
+    """
+    Creates a fingerprint of everything that the contents of a log_likelihood_cache depend on.
+
+    :param meaning_list: list containing all possible meanings; corresponds to global variable 'meanings'
+    :param n_characters: the number of different characters that may be used in forms (i.e. the alphabet size)
+    :param possible_form_lengths: all possible form lengths (global parameter)
+    :param ambiguity_penalty: parameter that determines the strength of the penalty on ambiguity (gamma)
+    :param effort_penalty: parameter that determines the strength of the penalty on speaker effort (delta)
+    :param error_prob: the probability of making an error in production
+    :param prob_of_noise: the probability of environmental noise masking part of the utterance
+    :return: a dictionary containing the fingerprint
+    """
+    fingerprint = {'meanings': [str(meaning) for meaning in meaning_list],
+                   'n_characters': int(n_characters),
+                   'form_lengths': [int(length) for length in possible_form_lengths],
+                   'gamma': float(ambiguity_penalty),
+                   'delta': float(effort_penalty),
+                   'error': float(error_prob),
+                   'noise_prob': float(prob_of_noise)}
+    return fingerprint
+
+
+def fingerprint_hash(fingerprint):
+    """
+    :param fingerprint: a fingerprint dictionary (see world_fingerprint())
+    :return: the SHA-256 hash of the fingerprint (hexadecimal string)
+    """
+    return hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def log_likelihood_cache_file_name(fingerprint, cache_format, dtype=np.float64):
+    """
+    :param fingerprint: the fingerprint of the world and parameter settings that the cache is built for (see
+    world_fingerprint())
+    :param cache_format: the format of the cache; can be set to either 'dense', 'factorised' or 'quantised'
+    :param dtype: the dtype of the LOG likelihoods in the cache (e.g. np.float64 or np.float32)
+    :return: the file name of the cache file for this fingerprint, format and dtype. The first part of the name is only there
+    to make it human-readable; the hash at the end makes sure that caches for different worlds never share a file name.
+    Whether a cache file really matches the settings is always checked using the fingerprint in its header.
+    """
+    return "log_likelihood_cache_form_lengths_"+convert_array_to_string(np.array(fingerprint['form_lengths']))+"_noise_prob_"+convert_float_value_to_string(fingerprint['noise_prob'])+"_gamma_"+convert_float_value_to_string(fingerprint['gamma'])+"_delta_"+convert_float_value_to_string(fingerprint['delta'])+"_error_"+convert_float_value_to_string(fingerprint['error'])+"_"+cache_format+"_"+np.dtype(dtype).name+"_"+fingerprint_hash(fingerprint)[:12]+".llc"
+
+
+def round_up_to_alignment(n_bytes):
+    """
+    :param n_bytes: a number of bytes (int)
+    :return: n_bytes rounded up to the nearest multiple of cache_file_alignment
+    """
+    return -(-n_bytes // cache_file_alignment) * cache_file_alignment
+
+
+def save_log_likelihood_cache(file_path, log_likelihood_cache, fingerprint):
+    """
+    Saves a log_likelihood_cache as a flat binary file with a fingerprinted header. The file is first written under a
+    temporary name and then moved into place, so that other processes never see a half-written cache file.
+
+    :param file_path: the path of the cache file
+    :param log_likelihood_cache: either a 3D numpy array with axis 0 = meanings, axis 1 = all possible forms, and axis
+    2 = LOG likelihood of corresponding <meaning, form> pair for each hypothesis, a FactorisedLikelihoodCache or a
+    QuantisedLikelihoodCache
+    :param fingerprint: the fingerprint of the world and parameter settings that the cache was built for (see
+    world_fingerprint())
+    :return: nothing; the cache is written to file_path
+    """
+    if isinstance(log_likelihood_cache, FactorisedLikelihoodCache):
+        cache_kind = 'factorised'
+        arrays = [('log_likelihood_table', log_likelihood_cache.log_likelihood_table),
+                  ('form_index_per_hypothesis', log_likelihood_cache.form_index_per_hypothesis),
+                  ('ambiguity_index_per_hypothesis', log_likelihood_cache.ambiguity_index_per_hypothesis)]
+    elif isinstance(log_likelihood_cache, QuantisedLikelihoodCache):
+        cache_kind = 'quantised'
+        arrays = [('codes', log_likelihood_cache.codes),
+                  ('log_likelihood_codebook', log_likelihood_cache.log_likelihood_codebook)]
+    else:
+        cache_kind = 'dense'
+        arrays = [('log_likelihood_cache', log_likelihood_cache)]
+    arrays = [(name, np.ascontiguousarray(array)) for name, array in arrays]
+    array_headers = []
+    offset = 0
+    for name, array in arrays:
+        array_headers.append({'name': name, 'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset})
+        offset += round_up_to_alignment(array.nbytes)
+    header = {'kind': cache_kind, 'fingerprint': fingerprint, 'fingerprint_hash': fingerprint_hash(fingerprint), 'arrays': array_headers}
+    header_bytes = json.dumps(header, sort_keys=True).encode('utf-8')
+    data_start = round_up_to_alignment(len(cache_file_magic) + 8 + len(header_bytes))
+    temporary_file_path = file_path + '.tmp' + str(os.getpid())
+    with open(temporary_file_path, 'wb') as cache_file:
+        cache_file.write(cache_file_magic)
+        cache_file.write(struct.pack('<Q', data_start))
+        cache_file.write(header_bytes)
+        cache_file.write(bytes(data_start - len(cache_file_magic) - 8 - len(header_bytes)))
+        for name, array in arrays:
+            cache_file.write(array.tobytes())
+            cache_file.write(bytes(round_up_to_alignment(array.nbytes) - array.nbytes))
+    os.replace(temporary_file_path, file_path)
+
+
+def read_log_likelihood_cache_header(file_path):
+    """
+    :param file_path: the path of a cache file written by save_log_likelihood_cache()
+    :return: (1) the header of the cache file (dictionary); and (2) the offset at which the array data start
+    """
+    with open(file_path, 'rb') as cache_file:
+        if cache_file.read(len(cache_file_magic)) != cache_file_magic:
+            raise ValueError("OOPS! "+file_path+" is not a log likelihood cache file.")
+        data_start = struct.unpack('<Q', cache_file.read(8))[0]
+        header_bytes = cache_file.read(data_start - len(cache_file_magic) - 8)
+    header = json.loads(header_bytes.rstrip(b'\x00').decode('utf-8'))
+    return header, data_start
+
+
+def load_log_likelihood_cache(file_path, fingerprint):
+    """
+    Opens a cache file written by save_log_likelihood_cache() as read-only memory-mapped arrays, after checking that it
+    was built for the world and parameter settings given by fingerprint.
+
+    :param file_path: the path of the cache file
+    :param fingerprint: the fingerprint of the world and parameter settings that the cache should have been built for
+    (see world_fingerprint())
+    :return: either a 3D (memory-mapped) numpy array with axis 0 = meanings, axis 1 = all possible forms, and axis 2 =
+    LOG likelihood of corresponding <meaning, form> pair for each hypothesis, a FactorisedLikelihoodCache or a
+    QuantisedLikelihoodCache; depending on what was saved
+    """
+    header, data_start = read_log_likelihood_cache_header(file_path)
+    if header['fingerprint_hash'] != fingerprint_hash(fingerprint):
+        raise ValueError("UH-OH! The log likelihood cache in "+file_path+" was built for "+str(header['fingerprint'])+", not for "+str(fingerprint))
+    arrays = {}
+    for array_header in header['arrays']:
+        arrays[array_header['name']] = np.memmap(file_path, dtype=np.dtype(array_header['dtype']), mode='r', offset=data_start+array_header['offset'], shape=tuple(array_header['shape']))
+    if header['kind'] == 'factorised':
+        return FactorisedLikelihoodCache(arrays['log_likelihood_table'], arrays['form_index_per_hypothesis'], arrays['ambiguity_index_per_hypothesis'])
+    elif header['kind'] == 'quantised':
+        return QuantisedLikelihoodCache(arrays['codes'], arrays['log_likelihood_codebook'])
+    else:
+        return arrays['log_likelihood_cache']
+
+
+###################################################################################################################
+# A REGISTRY THAT RETURNS THE LOG LIKELIHOOD CACHE FOR A GIVEN PARAMETER SETTING, AND BUILDS IT IF IT DOESN'T EXIST YET:
+
+loaded_log_likelihood_caches = {}  # caches that have already been loaded by this process, keyed by file path
+decomposed_log_likelihood_caches = {}  # DecomposedLikelihoodCaches that have already been built by this process, keyed
+# by the hash of the world fingerprint (without parameters), so that a process that builds caches for many parameter
+# settings only has to decompose each world once
+
+
+def build_log_likelihood_cache(fingerprint, cache_format, dtype=np.float64):
+    """
+    Builds the log_likelihood_cache for the world and parameter settings given by fingerprint.
+
+    :param fingerprint: the fingerprint of the world and parameter settings to build the cache for (see
+    world_fingerprint())
+    :param cache_format: the format of the cache; can be set to either 'dense', 'factorised' or 'quantised'
+    :param dtype: the dtype of the LOG likelihoods in the cache (e.g. np.float64 or np.float32)
+    :return: either a 3D numpy array with axis 0 = meanings, axis 1 = all possible forms, and axis 2 = LOG likelihood of
+    corresponding <meaning, form> pair for each hypothesis, a FactorisedLikelihoodCache or a QuantisedLikelihoodCache;
+    depending on cache_format
+    """
+    world = {'meanings': fingerprint['meanings'], 'n_characters': fingerprint['n_characters'], 'form_lengths': fingerprint['form_lengths']}
+    world_hash = fingerprint_hash(world)
+    if world_hash not in decomposed_log_likelihood_caches:
+        forms = create_all_possible_forms(fingerprint['n_characters'], fingerprint['form_lengths'])
+        noisy_variants = create_all_possible_noisy_forms(forms)
+        hypotheses = create_all_possible_languages(fingerprint['meanings'], forms)
+        decomposed_log_likelihood_caches[world_hash] = decompose_log_likelihoods(fingerprint['meanings'], forms, noisy_variants, hypotheses)
+    factorised_cache = decomposed_log_likelihood_caches[world_hash].compose(fingerprint['gamma'], fingerprint['delta'], fingerprint['error'], fingerprint['noise_prob'], dtype=dtype)
+    if cache_format == 'factorised':
+        return factorised_cache
+    elif cache_format == 'quantised':
+        return quantise_log_likelihoods(factorised_cache)
+    elif cache_format == 'dense':
+        return factorised_cache.to_dense()
+    else:
+        raise ValueError("cache_format should be set to either 'dense', 'factorised' or 'quantised'")
+
+
+def subset_log_likelihood_cache(log_likelihood_cache, hypothesis_indices):
+    """
+    Restricts a log_likelihood_cache to a subset of the hypotheses (e.g. the ones that are kept after pruning the
+    hypothesis space; see prune_hypotheses_by_prior() in evolution_compositionality_under_noise.py)
+
+    :param log_likelihood_cache: a dense (possibly memory-mapped) log_likelihood_cache, or a FactorisedLikelihoodCache or
+    QuantisedLikelihoodCache
+    :param hypothesis_indices: 1D numpy array of the indices of the hypotheses to keep
+    :return: a log_likelihood_cache of the same type, in which axis 2 only contains the hypotheses in hypothesis_indices
+    (in the order given)
+    """
+    if isinstance(log_likelihood_cache, np.ndarray):
+        return np.ascontiguousarray(log_likelihood_cache[:, :, hypothesis_indices])
+    return log_likelihood_cache.subset(hypothesis_indices)
+
+
+def get_log_likelihood_cache(cache_directory, meaning_list, n_characters, possible_form_lengths, ambiguity_penalty, effort_penalty, error_prob, prob_of_noise, cache_format='dense', dtype=np.float64):
+    """
+    Returns the log_likelihood_cache for the given world and parameter settings. If the cache file doesn't exist yet,
+    it is built and saved first. Building happens while holding an exclusive lock on a lock file next to the cache
+    file, so that when several processes (e.g. the workers of a parameter sweep) need the same cache at the same time,
+    only the first one builds it and the others simply wait for it and then load it.
+
+    :param cache_directory: the directory in which cache files are stored (e.g. global variable 'pickle_file_path')
+    :param meaning_list: list containing all possible meanings; corresponds to global variable 'meanings'
+    :param n_characters: the number of different characters that may be used in forms (i.e. the alphabet size)
+    :param possible_form_lengths: all possible form lengths (global parameter)
+    :param ambiguity_penalty: parameter that determines the strength of the penalty on ambiguity (gamma)
+    :param effort_penalty: parameter that determines the strength of the penalty on speaker effort (delta)
+    :param error_prob: the probability of making an error in production
+    :param prob_of_noise: the probability of environmental noise masking part of the utterance
+    :param cache_format: the format of the cache; can be set to either 'dense', 'factorised' or 'quantised'
+    :param dtype: the dtype of the LOG likelihoods in the cache (e.g. np.float64 or np.float32)
+    :return: either a 3D (memory-mapped) numpy array with axis 0 = meanings, axis 1 = all possible forms, and axis 2 =
+    LOG likelihood of corresponding <meaning, form> pair for each hypothesis, a FactorisedLikelihoodCache or a
+    QuantisedLikelihoodCache; depending on cache_format
+    """
+    fingerprint = world_fingerprint(meaning_list, n_characters, possible_form_lengths, ambiguity_penalty, effort_penalty, error_prob, prob_of_noise)
+    file_path = os.path.join(cache_directory, log_likelihood_cache_file_name(fingerprint, cache_format, dtype))
+    if file_path in loaded_log_likelihood_caches:
+        return loaded_log_likelihood_caches[file_path]
+    if not os.path.exists(file_path):
+        if cache_directory:  # (an empty cache_directory means the current working directory)
+            os.makedirs(cache_directory, exist_ok=True)
+        with open(file_path+'.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if not os.path.exists(file_path):  # another process may have built the cache while we were waiting
+                    # for the lock
+                    log_likelihood_cache = build_log_likelihood_cache(fingerprint, cache_format, dtype)
+                    save_log_likelihood_cache(file_path, log_likelihood_cache, fingerprint)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    log_likelihood_cache = load_log_likelihood_cache(file_path, fingerprint)
+    loaded_log_likelihood_caches[file_path] = log_likelihood_cache
+    return log_likelihood_cache
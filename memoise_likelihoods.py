@@ -1,53 +1,70 @@
-from evolution_compositionality_under_noise import create_all_possible_forms, create_all_possible_noisy_forms, create_all_possible_languages, convert_float_value_to_string, convert_array_to_string
+from evolution_compositionality_under_noise import create_all_possible_forms, create_all_possible_noisy_forms, create_all_possible_languages
 from repair_vs_redundancy_model import production_likelihoods_with_noise_and_minimal_effort
+from likelihood_cache import get_log_likelihood_cache
+import sys
 import numpy as np
 import time
-import pickle
 
 
 ###################################################################################################################
 # ALL PARAMETER SETTINGS GO HERE:
 
-meanings = ['02', '03', '12', '13']  # all possible meanings
-possible_form_lengths = np.array([2, 4])  # all possible form lengths
-forms_without_noise = create_all_possible_forms(2, possible_form_lengths)  # all possible forms, excluding their 'noisy variants'
-print('')
-print('')
-print("forms_without_noise are:")
-print(forms_without_noise)
-print("len(forms_without_noise) are:")
-print(len(forms_without_noise))
-noisy_forms = create_all_possible_noisy_forms(forms_without_noise)
-print('')
-print("noisy_forms are:")
-print(noisy_forms)
-print("len(noisy_forms) are:")
-print(len(noisy_forms))
-# all possible noisy variants of the forms above
-all_forms_including_noisy_variants = forms_without_noise + noisy_forms  # all possible forms, including both complete
-print('')
-print("len(all_forms_including_noisy_variants) are:")
-print(len(all_forms_including_noisy_variants))
-
-hypothesis_space = create_all_possible_languages(meanings, forms_without_noise)
-print('')
-print('')
-print("len(hypothesis_space) is:")
-print(len(hypothesis_space))
-
-
-gamma = 2.0  # parameter that determines strength of ambiguity penalty (Kirby et al., 2015 used gamma = 0 for
-# "Learnability Only" condition, and gamma = 2 for both "Expressivity Only", and "Learnability and Expressivity"
-# conditions
-
-delta = 0.0  # parameter that determines strength of effort penalty (i.e. how strongly speaker tries to avoid
-# using long utterances)
-
-error = 0.05  # the probability of making a production error (Kirby et al., 2015 use 0.05)
-
-noise_prob = 1.0  # the probability of environmental noise obscuring part of an utterance
-
-###################################################################################################################
+if __name__ == '__main__':
+    meanings = ['02', '03', '12', '13']  # all possible meanings
+    n_characters = 2  # the number of different characters that may be used in forms (i.e. the alphabet size)
+    possible_form_lengths = np.array([2, 4])  # all possible form lengths
+    forms_without_noise = create_all_possible_forms(n_characters, possible_form_lengths)  # all possible forms, excluding their 'noisy variants'
+    print('')
+    print('')
+    print("forms_without_noise are:")
+    print(forms_without_noise)
+    print("len(forms_without_noise) are:")
+    print(len(forms_without_noise))
+    noisy_forms = create_all_possible_noisy_forms(forms_without_noise)
+    print('')
+    print("noisy_forms are:")
+    print(noisy_forms)
+    print("len(noisy_forms) are:")
+    print(len(noisy_forms))
+    # all possible noisy variants of the forms above
+    all_forms_including_noisy_variants = forms_without_noise + noisy_forms  # all possible forms, including both complete
+    print('')
+    print("len(all_forms_including_noisy_variants) are:")
+    print(len(all_forms_including_noisy_variants))
+
+    hypothesis_space = create_all_possible_languages(meanings, forms_without_noise)
+    print('')
+    print('')
+    print("len(hypothesis_space) is:")
+    print(len(hypothesis_space))
+
+
+    error = 0.05  # the probability of making a production error (Kirby et al., 2015 use 0.05)
+
+    pickle_file_path = "pickles/"
+
+
+# THE FOLLOWING PARAMETERS SHOULD ONLY BE SET IF __name__ == '__main__', BECAUSE THEY ARE RETRIEVED FROM THE INPUT
+# ARGUMENTS GIVEN TO THE PYTHON SCRIPT WHEN RUN FROM THE TERMINAL OR FROM A .SH SCRIPT:
+if __name__ == '__main__':
+
+    noise_prob = float(sys.argv[1])  # the probability of environmental noise obscuring part of an utterance
+    print('')
+    print("noise_prob is:")
+    print(noise_prob)
+
+    gamma = float(sys.argv[2])  # parameter that determines strength of ambiguity penalty (Kirby et al., 2015 used
+    # gamma = 0 for "Learnability Only" condition, and gamma = 2 for both "Expressivity Only", and "Learnability and
+    # Expressivity" conditions
+    print('')
+    print("gamma is:")
+    print(gamma)
+
+    delta = float(sys.argv[3])  # parameter that determines strength of effort penalty (i.e. how strongly speaker
+    # tries to avoid using long utterances)
+    print('')
+    print("delta is:")
+    print(delta)
 
 
 ###################################################################################################################
@@ -82,31 +99,26 @@ def cache_log_likelihoods_per_datapoint(meaning_list, forms_including_noisy_vari
 
 
 ###################################################################################################################
-# MEMOISING LIKELIHOODS FOR ALL POSSIBLE <MEANING, FORM> COMBINATIONS AND SAVING RESULTING MATRIX AS PICKLE FILE:
-
-t0 = time.process_time()
-
-log_likelihood_cache = cache_log_likelihoods_per_datapoint(meanings, all_forms_including_noisy_variants, hypothesis_space)
-
-t1 = time.process_time()
+if __name__ == '__main__':
 
-print('')
-print('')
-print('min. it took to fill out likelihood cache:')
-print((t1-t0)/60)
+    ###################################################################################################################
+    # MEMOISING LIKELIHOODS FOR ALL POSSIBLE <MEANING, FORM> COMBINATIONS AND SAVING RESULTING MATRIX AS A FINGERPRINTED,
+    # MEMORY-MAPPABLE CACHE FILE (NOTE that running this script is optional: repair_vs_redundancy_model.py and the
+    # evolution_compositionality_under_noise scripts build any cache that doesn't exist yet themselves; this script
+    # simply allows building them in advance):
 
-print('')
-print('')
-print("likelihood_cache.shape is:")
-print(log_likelihood_cache.shape)
+    t0 = time.process_time()
 
+    log_likelihood_cache = get_log_likelihood_cache(pickle_file_path, meanings, n_characters, possible_form_lengths, gamma, delta, error, noise_prob, cache_format='dense')
 
-t2 = time.process_time()
+    t1 = time.process_time()
 
-pickle.dump(log_likelihood_cache, open("pickles/log_likelihood_cache_form_lengths_"+convert_array_to_string(possible_form_lengths)+"_noise_prob_"+convert_float_value_to_string(noise_prob)+"_gamma_"+convert_float_value_to_string(gamma)+"_delta_"+convert_float_value_to_string(delta)+"_error_"+convert_float_value_to_string(error)+".p", "wb"))
+    print('')
+    print('')
+    print('min. it took to fill out and save likelihood cache:')
+    print((t1-t0)/60)
 
-t3 = time.process_time()
-print('')
-print('')
-print('min. it took to pickle likelihood cache:')
-print((t3-t2)/60)
\ No newline at end of file
+    print('')
+    print('')
+    print("likelihood_cache.shape is:")
+    print(log_likelihood_cache.shape)
@@ -1,11 +1,15 @@
 from evolution_compositionality_under_noise import *
+from likelihood_cache import get_log_likelihood_cache, subset_log_likelihood_cache
+from learner_representations import factorised_posterior_population, SparsePosteriorPopulation, CountPosteriorPopulation
+from compiled_kernels import numba_available, CommunicationKernels
 
 ###################################################################################################################
 # ALL PARAMETER SETTINGS GO HERE:
 
 meanings = ['02', '03', '12', '13']  # all possible meanings
+n_characters = 2  # the number of different characters that may be used in forms (i.e. the alphabet size)
 possible_form_lengths = np.array([2, 4])  # all possible form lengths
-forms_without_noise = create_all_possible_forms(2, possible_form_lengths)  # all possible forms, excluding their
+forms_without_noise = create_all_possible_forms(n_characters, possible_form_lengths)  # all possible forms, excluding their
 # possible 'noisy variants'
 noisy_forms = create_all_possible_noisy_forms(forms_without_noise)
 # all possible noisy variants of the forms above
@@ -31,6 +35,46 @@ burn_in = round(generations / 2)  # the burn-in period that is excluded when cal
 
 pickle_file_path = "pickles/"
 
+learned_posterior_cache_max_bytes = 2**29  # the maximum amount of memory (in bytes) that the cache of learned posteriors
+# (which is shared by all runs of a condition; see LearnedPosteriorCache) may take up
+
+precision = 'float64'  # the floating point precision in which the likelihood cache, priors, posteriors and the final
+# population are stored; can be set to either 'float64' or 'float32' (which halves memory use, memory bandwidth in the
+# posterior updates, and result sizes; see README.md for how closely the results agree with float64)
+
+likelihood_cache_format = 'factorised'  # can be set to either 'dense' (the full meanings x forms x hypotheses matrix)
+# or 'factorised' (a small likelihood table plus a form index and ambiguity per hypothesis and meaning, which takes up
+# orders of magnitude less memory) or 'quantised' (a uint8 code per entry of the dense matrix plus a small table of the
+# distinct LOG likelihood values, which takes up 8 times less memory than 'dense'). Either way, the cache is
+# memory-mapped from a file in pickle_file_path, which is built automatically if it doesn't exist yet (see
+# get_log_likelihood_cache() in likelihood_cache.py)
+
+factorise_posterior_when_exact = True  # if True, conditions with gamma = 0 and a flat prior (compressibility_bias =
+# False) are run with a FactorisedPosteriorPopulation (see learner_representations.py), in which each agent's posterior
+# is stored as one small distribution over forms per meaning; this gives exactly the same posteriors, but is much faster
+
+posterior_representation = 'dense'  # can be set to either 'dense' (each agent is a LOG posterior over all hypotheses),
+# 'sparse' (each agent only keeps the hypotheses that cover all but sparse_posterior_epsilon of its posterior mass;
+# see SparsePosteriorPopulation in learner_representations.py) or 'counts' (each agent only keeps the counts of the
+# <meaning, utterance> pairs it has observed, and the final population is saved as these counts; see
+# CountPosteriorPopulation in learner_representations.py)
+sparse_posterior_epsilon = 1e-6  # the maximum posterior mass that a sparse agent may have dropped; once an upper
+# bound on the mass of its dropped hypotheses exceeds this, the agent is rebuilt densely from its counts
+sparse_posterior_max_fraction = 0.5  # the fraction of the hypothesis space above which a sparse agent is stored densely
+count_posterior_buffers = 2  # the number of agents whose LOG posterior a CountPosteriorPopulation keeps
+# materialised at the same time (each one takes as much memory as an agent in a dense population; with popsize
+# buffers, every agent keeps its own)
+
+prior_pruning_log_threshold = None  # if not None (e.g. -25.) and compressibility_bias = True, all hypotheses whose LOG
+# prior is below this threshold are removed from the hypothesis space before the runs start (see
+# prune_hypotheses_by_prior() in evolution_compositionality_under_noise.py); the prior mass that is removed is printed
+
+kernel_backend = 'python'  # can be set to either 'python' (the default, and the reference implementation) or 'numba'
+# (production, the repair decision and the posterior update in the communication rounds are done by kernels that are
+# compiled with numba, on integer-encoded languages and utterances; see compiled_kernels.py). The 'numba' backend only
+# works with a dense population (i.e. posterior_representation = 'dense' and no factorised posterior); otherwise, or if
+# numba isn't installed, the 'python' backend is used instead.
+
 
 # THE FOLLOWING PARAMETERS SHOULD ONLY BE SET IF __name__ == '__main__', BECAUSE THEY ARE RETRIEVED FROM THE INPUT
 # ARGUMENTS GIVEN TO THE PYTHON SCRIPT WHEN RUN FROM THE TERMINAL OR FROM A .SH SCRIPT:
@@ -185,41 +229,8 @@ def receive_with_repair_open_only(language, utterance):
     return response
 
 
-# AND NOW FOR THE FUNCTIONS THAT DO THE BAYESIAN LEARNING:
-
-def update_posterior_from_cache(log_posterior, log_likelihood_cache, topic, utterance, meaning_list, all_possible_forms):
-    """
-    Takes a LOG posterior probability distribution and a <topic, utterance> pair, and updates the posterior probability
-    distribution accordingly
-
-    :param log_posterior: 1D numpy array containing LOG posterior probability values for each hypothesis
-    :param log_likelihood_cache: 3D numpy array with axis 0 = meanings, axis 1 = all possible forms, and axis 2 = LOG
-    likelihood of corresponding <meaning, form> pair for each hypothesis
-    :param topic: a topic (string from the global variable meanings)
-    :param utterance: an utterance (string from the global variable forms (can be a noisy form if parameter noise is
-    True)
-    :param meaning_list: list containing all possible meanings; corresponds to global variable 'meanings'
-    :param all_possible_forms: list of all possible forms INCLUDING noisy variants; corresponds to global variable
-    'all_forms_including_noisy_variants'
-    :return: the updated (and normalized) log_posterior (1D numpy array)
-    """
-    # First let's find out what the index of the meaning is:
-    for i in range(len(meanings)):
-        if meaning_list[i] == topic:
-            meaning_index = i
-    # Then, let's find out what the index of the utterance is in the list of all possible forms (including the noisy
-    # variants):
-    for i in range(len(all_possible_forms)):
-        if all_possible_forms[i] == utterance:
-            utterance_index = i
-    # Now, let's retrieve the corresponding log_likelihood values for this particular <meaning, form> pair form the
-    # log_likelihood_cache, and update the posterior accordingly (addition in logspace == multiplication in probability
-    # space).
-    new_log_posterior_new_method = np.add(log_posterior, log_likelihood_cache[meaning_index][utterance_index])
-    new_log_posterior_normalized_new_method = np.subtract(new_log_posterior_new_method,
-                                                          scipy.special.logsumexp(new_log_posterior_new_method))
-    return new_log_posterior_normalized_new_method
-
+# NOW THE FUNCTION THAT MAKES A POPULATION COMMUNICATE (FOR THE INTRA-GENERATIONAL INTERACTION ROUNDS; THE FUNCTIONS
+# THAT DO THE BAYESIAN LEARNING FROM THE LOG LIKELIHOOD CACHE ARE IN evolution_compositionality_under_noise.py):
 
 def population_communication_mutual_understanding(population, n_rounds, ambiguity_penalty, effort_penalty, prob_of_noise, hypotheses, log_likelihood_cache):
     """
@@ -237,8 +248,9 @@ def population_communication_mutual_understanding(population, n_rounds, ambiguit
     :param prob_of_noise: the probability of noise happening (only relevant when noise_switch == True); corresponds to
     global variable 'noise_prob'
     :param hypotheses: list of all possible languages; corresponds to global parameter 'hypothesis_space'
-    :param log_likelihood_cache: 3D numpy array with axis 0 = meanings, axis 1 = all possible forms, and axis 2 = LOG
-    likelihood of corresponding <meaning, form> pair for each hypothesis
+    :param log_likelihood_cache: either a 3D numpy array with axis 0 = meanings, axis 1 = all possible forms, and axis
+    2 = LOG likelihood of corresponding <meaning, form> pair for each hypothesis, or one of the compact cache
+    representations in likelihood_cache.py (a FactorisedLikelihoodCache or a QuantisedLikelihoodCache)
     :return: (1) the data that was produced during the communication rounds, as a list of (topic, utterance) tuples; (2) the sampled_languages_array which lists the indices of the languages (in the hypotheses list) that was sampled per agent per round; (3) a list of counts of the number of repair initiations
     """
     if n_parents == 'single':
@@ -249,6 +261,7 @@ def population_communication_mutual_understanding(population, n_rounds, ambiguit
     data = []
     repair_counts = []
     sampled_languages_array = np.zeros((len(population), n_rounds))
+    cdf_cache = PosteriorCDFCache()  # (an agent's cached CDF is invalidated below whenever it is updated as a hearer)
     for i in range(n_rounds):
         if interaction == 'taking_turns':
             if len(population) != 2:
@@ -267,8 +280,8 @@ def population_communication_mutual_understanding(population, n_rounds, ambiguit
         # whenever a speaker is called upon to produce a utterance, they first sample a language from their
         # posterior probability distribution. So each agent keeps updating their language according to the data
         # received from their communication partner.
-        speaker_language, speaker_lang_index = sample(hypotheses, population[speaker_index])
-        hearer_language, hearer_lang_index = sample(hypotheses, population[hearer_index])
+        speaker_language, speaker_lang_index = sample_from_population(population, hypotheses, speaker_index, cdf_cache)
+        hearer_language, hearer_lang_index = sample_from_population(population, hypotheses, hearer_index, cdf_cache)
         if speaker_index == 0:
             sampled_languages_array[0][i] = speaker_lang_index
             sampled_languages_array[1][i] = hearer_lang_index
@@ -285,7 +298,8 @@ def population_communication_mutual_understanding(population, n_rounds, ambiguit
             listener_response = receive_with_repair_open_only(hearer_language, utterance)
             counter += 1
 
-        population[hearer_index] = update_posterior_from_cache(population[hearer_index], log_likelihood_cache, topic, utterance, meanings, all_forms_including_noisy_variants)
+        update_population_from_cache(population, log_likelihood_cache, np.array([hearer_index]), np.array([meanings.index(topic)]), np.array([all_forms_including_noisy_variants.index(utterance)]))
+        cdf_cache.invalidate(hearer_index)  # (the hearer's posterior has just been updated)
 
         if n_parents == 'single':
             if speaker_index == random_parent_index:
@@ -297,22 +311,102 @@ def population_communication_mutual_understanding(population, n_rounds, ambiguit
     return data, sampled_languages_array, repair_counts
 
 
+def population_communication_with_kernels(population, n_rounds, log_likelihood_cache, communication_kernels):
+    """
+    Does exactly the same as population_communication_mutual_understanding(), but with the steps of a round after
+    sampling the speaker's and hearer's languages (producing an utterance, deciding whether the hearer initiates repair,
+    and updating the hearer's posterior) done by (compiled) kernels on integer-encoded languages and utterances (see
+    compiled_kernels.py). The random numbers are drawn in the same order as in
+    population_communication_mutual_understanding(), so with the same seed both follow the same trajectory (up to
+    rounding).
+
+    :param population: a population (2D numpy array), where each agent is simply a LOG posterior probability
+    distribution
+    :param n_rounds: the number of rounds for which the population should communicate; corresponds to global variable
+    'rounds'
+    :param log_likelihood_cache: either a 3D numpy array with axis 0 = meanings, axis 1 = all possible forms, and axis
+    2 = LOG likelihood of corresponding <meaning, form> pair for each hypothesis, or one of the compact cache
+    representations in likelihood_cache.py (a FactorisedLikelihoodCache or a QuantisedLikelihoodCache)
+    :param communication_kernels: a CommunicationKernels object (see compiled_kernels.py) for the same hypotheses and
+    parameter settings as log_likelihood_cache
+    :return: (1) the data that was produced during the communication rounds, as a list of (topic, utterance) tuples; (2) the sampled_languages_array which lists the indices of the languages (in the hypotheses list) that was sampled per agent per round; (3) a list of counts of the number of repair initiations
+    """
+    if n_parents == 'single':
+        if len(population) != 2 or interaction != 'taking_turns':
+            raise ValueError("OOPS! n_parents = 'single' only works if popsize = 2 and interaction = 'taking_turns'.")
+        random_parent_index = np.random.choice(np.arange(len(population)))  # this determines which agent's productions
+        # will form the input for the next generation
+    data = []
+    repair_counts = []
+    sampled_languages_array = np.zeros((len(population), n_rounds))
+    cdf_cache = PosteriorCDFCache()  # (an agent's cached CDF is invalidated below whenever it is updated as a hearer)
+    for i in range(n_rounds):
+        if interaction == 'taking_turns':
+            if len(population) != 2:
+                raise ValueError("OOPS! interaction = 'taking_turns' only works if popsize = 2.")
+            if i % 2 == 0:
+                speaker_index = 0
+                hearer_index = 1
+            else:
+                speaker_index = 1
+                hearer_index = 0
+        else:
+            pair_indices = np.random.choice(np.arange(len(population)), size=2, replace=False)
+            speaker_index = pair_indices[0]
+            hearer_index = pair_indices[1]
+        topic = random.choice(meanings)
+        topic_index = meanings.index(topic)
+        speaker_lang_index = cdf_cache.sample(population, speaker_index)
+        hearer_lang_index = cdf_cache.sample(population, hearer_index)
+        if speaker_index == 0:
+            sampled_languages_array[0][i] = speaker_lang_index
+            sampled_languages_array[1][i] = hearer_lang_index
+        else:
+            sampled_languages_array[0][i] = hearer_lang_index
+            sampled_languages_array[1][i] = speaker_lang_index
+        utterance_index = communication_kernels.produce(speaker_lang_index, topic_index)
+        listener_response = communication_kernels.receive(hearer_lang_index, utterance_index)
+        counter = 0
+        while listener_response == -1:  # (i.e. the listener initiates repair)
+            if counter == 3:  # After 3 attempts, the listener stops trying to do repair
+                break
+            utterance_index = communication_kernels.produce(speaker_lang_index, topic_index)
+            listener_response = communication_kernels.receive(hearer_lang_index, utterance_index)
+            counter += 1
+
+        communication_kernels.update(population[hearer_index], get_log_likelihoods_from_cache(log_likelihood_cache, topic_index, utterance_index))
+        cdf_cache.invalidate(hearer_index)  # (the hearer's posterior has just been updated)
+
+        utterance = all_forms_including_noisy_variants[utterance_index]
+        if n_parents == 'single':
+            if speaker_index == random_parent_index:
+                data.append((topic, utterance))
+        elif n_parents == 'multiple':
+            data.append((topic, utterance))
+        repair_counts.append(counter)
+
+    return data, sampled_languages_array, repair_counts
+
+
 # AND NOW FINALLY FOR THE FUNCTION THAT RUNS THE ACTUAL SIMULATION:
 
-def simulation_repair_vs_redundancy(population, n_gens, n_rounds, bottleneck, pop_size, hypotheses, log_likelihood_cache, class_per_language, log_priors, data, interaction_order, ambiguity_penalty, effort_penalty, prob_of_noise, all_possible_forms):
+def simulation_repair_vs_redundancy(population, n_gens, n_rounds, bottleneck, pop_size, hypotheses, log_likelihood_cache, class_per_language, log_priors, data, interaction_order, ambiguity_penalty, effort_penalty, prob_of_noise, all_possible_forms, gen_0_posterior=None, learned_posterior_cache=None, communication_kernels=None):
     """
     Runs the full simulation and returns the total amount of posterior probability that is assigned to each language
     class over generations (language_stats_over_gens) as well as the data that each generation produced (data)
 
-    :param population: the population at generation 0
+    :param population: the population at generation 0 (either a 2D numpy array as created by new_population(), or one of
+    the population representations in learner_representations.py; gen_0_posterior and learned_posterior_cache are only
+    used with a 2D numpy array)
     :param n_gens: the desired number of generations (int); corresponds to global variable 'generations'
     :param n_rounds: the desired number of communication rounds *within* each generation; corresponds to global variable
     'rounds'
     :param bottleneck: the amount of data (<meaning, form> pairs) that each learner receives
     :param pop_size: the desired size of the population (int); corresponds to global variable 'popsize'
     :param hypotheses: list of all possible languages; corresponds to global variable 'hypothesis_space'
-    :param log_likelihood_cache: 3D numpy array with axis 0 = meanings, axis 1 = all possible forms, and axis 2 = LOG
-    likelihood of corresponding <meaning, form> pair for each hypothesis
+    :param log_likelihood_cache: either a 3D numpy array with axis 0 = meanings, axis 1 = all possible forms, and axis
+    2 = LOG likelihood of corresponding <meaning, form> pair for each hypothesis, or one of the compact cache
+    representations in likelihood_cache.py (a FactorisedLikelihoodCache or a QuantisedLikelihoodCache)
     :param class_per_language: list specifiying the class for each corresponding language in the variable 'hypotheses'
     :param log_priors: the LOG prior probability distribution that each agent should be initialised with
     :param data: the initial data that generation 0 learns from
@@ -326,39 +420,95 @@ def simulation_repair_vs_redundancy(population, n_gens, n_rounds, bottleneck, po
     'noise_prob'
     :param all_possible_forms: list of all possible forms INCLUDING noisy variants; corresponds to global variable
     'all_forms_including_noisy_variants'
-    :return: (1) sampled_languages_over_gens (which contains the indices of the sampled languages per generation per agent per round of interaction); (2) language_stats_over_gens (which contains language stats over generations); (3) data (which contains data over generations over runs); (4) repair_count_over_gens (which tracks the number of repair initiations over generations); and (5) the final population
+    :param gen_0_posterior: (optional) the LOG posterior that results from learning data starting from log_priors. This
+    only has to be computed once per condition (rather than once per run), because with interaction_order ==
+    'taking_turns' every run's generation 0 learns the same data in the same order. If given, the agents of generation 0
+    are simply given this posterior instead of learning from data. Can only be used if interaction_order ==
+    'taking_turns' and population consists of agents that all have log_priors as their posterior.
+    :param learned_posterior_cache: (optional) a LearnedPosteriorCache for this condition. If given, the posterior of
+    each learner that starts from log_priors is looked up in (or else added to) this cache, using the count signature of
+    the data it learns from.
+    :param communication_kernels: (optional) a CommunicationKernels object (see compiled_kernels.py) for the same
+    hypotheses and parameter settings. If given, the communication rounds are run by
+    population_communication_with_kernels() instead of population_communication_mutual_understanding(). Can only be used
+    if population is a 2D numpy array.
+    :return: (1) sampled_languages_over_gens (which contains the indices of the sampled languages per generation per agent per round of interaction); (2) language_stats_over_gens (which contains language stats over generations); (3) data (which contains data over generations over runs); (4) repair_count_over_gens (which tracks the number of repair initiations over generations); and (5) the final population (in the same representation as population; see population_to_dense())
     """
     sampled_languages_over_gens = np.zeros((n_gens, pop_size, n_rounds))
     language_stats_over_gens = np.zeros((n_gens, int(max(class_per_language)+1)))
     data_over_gens = []
     repair_count_over_gens = []
+    if gen_0_posterior is not None and interaction_order != 'taking_turns':
+        raise ValueError("OOPS! gen_0_posterior can only be used if interaction_order = 'taking_turns'.")
+    if communication_kernels is not None and not isinstance(population, np.ndarray):
+        raise ValueError("OOPS! communication_kernels can only be used with a dense population (2D numpy array).")
     for i in range(n_gens):
 
         print('gen: '+str(i))
 
+        # With interaction_order == 'taking_turns', all learners learn from exactly the same data in the same order.
+        # So if they also start from the same posterior (which they do whenever they all start from log_priors),
+        # their learned posteriors are identical, and we only have to compute the posterior of the first learner and
+        # copy it to the others:
+        identical_learners = False
+        if interaction_order == 'taking_turns':
+            if len(population) != 2:
+                raise ValueError(
+                    "OOPS! interaction = 'taking_turns' only works if popsize = 2.")
+            if bottleneck != len(data):
+                raise ValueError(
+                    "UH-OH! data should have the same size as the bottleneck b")
+            identical_learners = isinstance(population, np.ndarray) and all(np.array_equal(population[j], population[0]) for j in range(1, pop_size))
+        # The learners whose posterior can't be copied or looked up are collected first, and then all learn their
+        # data in a single batched update of the population:
+        learner_indices = []
+        learner_datasets = []
+        learner_signatures = []
         for j in range(pop_size):
-            for k in range(bottleneck):
-                if interaction_order == 'taking_turns':
-                    if len(population) != 2:
-                        raise ValueError(
-                            "OOPS! interaction = 'taking_turns' only works if popsize = 2.")
-                    if bottleneck != len(data):
-                        raise ValueError(
-                            "UH-OH! data should have the same size as the bottleneck b")
-                    meaning, signal = data[k]
-                else:
-                    meaning, signal = random.choice(data)
-                population[j] = update_posterior_from_cache(population[j], log_likelihood_cache, meaning, signal, meanings, all_possible_forms)
-        data, sampled_languages_array, repair_count = population_communication_mutual_understanding(population, n_rounds, ambiguity_penalty, effort_penalty, prob_of_noise, hypotheses, log_likelihood_cache)
+            if i == 0 and gen_0_posterior is not None:
+                population[j] = gen_0_posterior
+                continue
+            if identical_learners and j > 0:
+                continue  # the posterior of the first learner is copied to this one below
+            if interaction_order == 'taking_turns':
+                learner_data = data
+            else:
+                learner_data = [random.choice(data) for k in range(bottleneck)]
+            signature = None
+            if learned_posterior_cache is not None and isinstance(population, np.ndarray) and np.array_equal(population[j], log_priors):
+                signature = dataset_count_signature(learner_data)
+                learned_posterior = learned_posterior_cache.get(signature)
+                if learned_posterior is not None:
+                    population[j] = learned_posterior
+                    continue
+            learner_indices.append(j)
+            learner_datasets.append(learner_data)
+            learner_signatures.append(signature)
+        if len(learner_indices) > 0:
+            agent_indices, meaning_indices, utterance_indices = datasets_to_observations(learner_indices, learner_datasets, meanings, all_possible_forms)
+            update_population_from_cache(population, log_likelihood_cache, agent_indices, meaning_indices, utterance_indices)
+            for j, signature in zip(learner_indices, learner_signatures):
+                if signature is not None:
+                    learned_posterior_cache.put(signature, population[j])
+        if identical_learners:
+            population[1:] = population[0]
+        if communication_kernels is not None:
+            data, sampled_languages_array, repair_count = population_communication_with_kernels(population, n_rounds, log_likelihood_cache, communication_kernels)
+        else:
+            data, sampled_languages_array, repair_count = population_communication_mutual_understanding(population, n_rounds, ambiguity_penalty, effort_penalty, prob_of_noise, hypotheses, log_likelihood_cache)
 
         sampled_languages_over_gens[i] = sampled_languages_array
-        language_stats_over_gens[i] = language_stats(population, possible_form_lengths, class_per_language)
+        language_stats_over_gens[i] = population_language_stats(population, possible_form_lengths, class_per_language)
+        if isinstance(population, SparsePosteriorPopulation):
+            print('discarded posterior mass: '+str(population.discarded_mass)+', dense rebuilds: '+str(population.n_rebuilds)+', support sizes: '+str(population.support_sizes()))
+            population.discarded_mass = 0.0
+            population.n_rebuilds = 0
         data_over_gens.append(data)
         repair_count_over_gens.append(repair_count)
         if i == n_gens-1:
             final_pop = population
         if turnover:
-            population = new_population(pop_size, log_priors)
+            population = renew_population(population, pop_size, log_priors)
     return sampled_languages_over_gens, language_stats_over_gens, data_over_gens, repair_count_over_gens, final_pop
 
 
@@ -366,9 +516,19 @@ def simulation_repair_vs_redundancy(population, n_gens, n_rounds, bottleneck, po
 if __name__ == '__main__':
 
     ###################################################################################################################
-    # FIRST LET'S RETRIEVE THE RELEVANT LOG LIKELIHOOD CACHE:
+    # FIRST LET'S RETRIEVE THE RELEVANT LOG LIKELIHOOD CACHE (WHICH IS BUILT AND SAVED FIRST IF IT DOESN'T EXIST YET):
+
+    # With gamma = 0 and a flat prior, each agent's posterior factorises into one distribution over forms per meaning
+    # (see FactorisedPosteriorPopulation in learner_representations.py), which needs the likelihood table of a
+    # 'factorised' cache:
+    factorised_posterior = factorise_posterior_when_exact and gamma == 0. and not compressibility_bias
+    if factorised_posterior:
+        likelihood_cache_format = 'factorised'
+    print('')
+    print("factorised_posterior is:")
+    print(factorised_posterior)
 
-    log_likelihood_cache = pickle.load(open("pickles/log_likelihood_cache_form_lengths_"+convert_array_to_string(possible_form_lengths)+"_noise_prob_"+convert_float_value_to_string(noise_prob)+"_gamma_"+convert_float_value_to_string(gamma)+"_delta_"+convert_float_value_to_string(delta)+"_error_"+convert_float_value_to_string(error)+".p", "rb"))
+    log_likelihood_cache = get_log_likelihood_cache(pickle_file_path, meanings, n_characters, possible_form_lengths, gamma, delta, error, noise_prob, cache_format=likelihood_cache_format, dtype=precision)
     print('')
     print("log_likelihood_cache.shape is:")
     print(log_likelihood_cache.shape)
@@ -401,6 +561,7 @@ if __name__ == '__main__':
         priors = np.ones(len(hypothesis_space))
         priors = np.divide(priors, np.sum(priors))
         priors = np.log(priors)
+    priors = priors.astype(precision)
 
     t3 = time.process_time()
     print('')
@@ -412,26 +573,82 @@ if __name__ == '__main__':
     print("initial_dataset is:")
     print(initial_dataset)
 
+    # Optionally remove the hypotheses with a negligible prior; the hypothesis space, the classes, the priors and the
+    # likelihood cache are all restricted to the same kept hypotheses, and the results are mapped back to the full
+    # hypothesis space below, so that the pickled results have the same format either way:
+    n_hypotheses = len(hypothesis_space)
+    kept_hypothesis_indices = np.arange(n_hypotheses)
+    n_classes = int(max(class_per_lang)+1)
+    if compressibility_bias and prior_pruning_log_threshold is not None:
+        kept_hypothesis_indices, priors, removed_prior_mass, removed_prior_mass_bound = prune_hypotheses_by_prior(priors, prior_pruning_log_threshold)
+        hypothesis_space = [hypothesis_space[h] for h in kept_hypothesis_indices]
+        class_per_lang = class_per_lang[kept_hypothesis_indices]
+        log_likelihood_cache = subset_log_likelihood_cache(log_likelihood_cache, kept_hypothesis_indices)
+        print('')
+        print("number of hypotheses kept after pruning is:")
+        print(len(kept_hypothesis_indices))
+        print("prior mass removed by pruning is:")
+        print(removed_prior_mass)
+        print("upper bound on the prior mass removed by pruning is:")
+        print(removed_prior_mass_bound)
+
+    # With interaction == 'taking_turns', generation 0 learns exactly the same data (initial_dataset, in the same order)
+    # from the same priors in every run, so the posterior it ends up with only has to be computed once per condition
+    # (with interaction == 'random', every learner learns from a different random sample of initial_dataset instead):
+    gen_0_posterior = None
+    if interaction == 'taking_turns' and not factorised_posterior and posterior_representation == 'dense':
+        gen_0_posterior = learn_dataset_from_cache(priors, log_likelihood_cache, initial_dataset, meanings, all_forms_including_noisy_variants)
+
+    learned_posterior_cache = LearnedPosteriorCache(learned_posterior_cache_max_bytes)
+
+    # The compiled kernels are only used if numba is installed and the population is dense; otherwise the pure-Python
+    # implementation is used:
+    communication_kernels = None
+    if kernel_backend == 'numba':
+        if not numba_available:
+            print('')
+            print("numba isn't installed, so kernel_backend = 'python' is used instead")
+        elif factorised_posterior or posterior_representation != 'dense':
+            print('')
+            print("kernel_backend = 'numba' only works with a dense population, so kernel_backend = 'python' is used instead")
+        else:
+            communication_kernels = CommunicationKernels(hypothesis_space, meanings, forms_without_noise, noisy_forms, gamma, delta, error, noise_prob)
+
     sampled_languages_over_gens_per_run = np.zeros((runs, generations, popsize, rounds))
-    language_stats_over_gens_per_run = np.zeros((runs, generations, int(max(class_per_lang)+1)))
+    language_stats_over_gens_per_run = np.zeros((runs, generations, n_classes))
     data_over_gens_per_run = []
     repair_count_over_gens_per_run = []
-    final_pop_per_run = np.zeros((runs, popsize, len(hypothesis_space)))
+    if posterior_representation == 'counts':
+        # (the exact LOG posteriors can be reconstructed from these counts with log_posteriors_from_counts() in
+        # learner_representations.py)
+        final_pop_per_run = np.zeros((runs, popsize, len(meanings), len(all_forms_including_noisy_variants)), dtype=int)
+    else:
+        final_pop_per_run = np.full((runs, popsize, n_hypotheses), -np.inf, dtype=precision)
     for r in range(runs):
 
         print('')
         print("r is:")
         print(r)
 
-        population = new_population(popsize, priors)
+        if factorised_posterior:
+            population = factorised_posterior_population(log_likelihood_cache, popsize)
+        elif posterior_representation == 'sparse':
+            population = SparsePosteriorPopulation(log_likelihood_cache, priors, popsize, sparse_posterior_epsilon, sparse_posterior_max_fraction)
+        elif posterior_representation == 'counts':
+            population = CountPosteriorPopulation(log_likelihood_cache, priors, popsize, n_buffers=count_posterior_buffers)
+        else:
+            population = new_population(popsize, priors)
 
-        sampled_languages_over_gens, language_stats_over_gens, data_over_gens, repair_count_over_gens, final_pop = simulation_repair_vs_redundancy(population, generations, rounds, b, popsize, hypothesis_space, log_likelihood_cache, class_per_lang, priors, initial_dataset, interaction, gamma, delta, noise_prob, all_forms_including_noisy_variants)
+        sampled_languages_over_gens, language_stats_over_gens, data_over_gens, repair_count_over_gens, final_pop = simulation_repair_vs_redundancy(population, generations, rounds, b, popsize, hypothesis_space, log_likelihood_cache, class_per_lang, priors, initial_dataset, interaction, gamma, delta, noise_prob, all_forms_including_noisy_variants, gen_0_posterior=gen_0_posterior, learned_posterior_cache=learned_posterior_cache, communication_kernels=communication_kernels)
 
-        sampled_languages_over_gens_per_run[r] = sampled_languages_over_gens
-        language_stats_over_gens_per_run[r] = language_stats_over_gens
+        sampled_languages_over_gens_per_run[r] = kept_hypothesis_indices[sampled_languages_over_gens.astype(int)]
+        language_stats_over_gens_per_run[r, :, :language_stats_over_gens.shape[1]] = language_stats_over_gens
         data_over_gens_per_run.append(data_over_gens)
         repair_count_over_gens_per_run.append(repair_count_over_gens)
-        final_pop_per_run[r] = final_pop
+        if posterior_representation == 'counts':
+            final_pop_per_run[r] = final_pop.counts
+        else:
+            final_pop_per_run[r][:, kept_hypothesis_indices] = population_to_dense(final_pop)
 
     timestr = time.strftime("%Y%m%d-%H%M%S")
 
@@ -440,7 +657,10 @@ if __name__ == '__main__':
     pickle.dump(language_stats_over_gens_per_run, open(pickle_file_path + pickle_file_name + "_lang_stats" + ".p", "wb"))
     pickle.dump(data_over_gens_per_run, open(pickle_file_path+pickle_file_name+"_data"+".p", "wb"))
     pickle.dump(repair_count_over_gens_per_run, open(pickle_file_path + pickle_file_name + "_repairs" + ".p", "wb"))
-    pickle.dump(final_pop_per_run, open(pickle_file_path + pickle_file_name + "_final_pop" + ".p", "wb"))
+    if posterior_representation == 'counts':
+        pickle.dump(final_pop_per_run, open(pickle_file_path + pickle_file_name + "_final_pop_counts" + ".p", "wb"))
+    else:
+        pickle.dump(final_pop_per_run, open(pickle_file_path + pickle_file_name + "_final_pop" + ".p", "wb"))
 
     t4 = time.process_time()
 
@@ -448,6 +668,10 @@ if __name__ == '__main__':
     print("number of minutes it took to run simulation:")
     print(round((t4-t3)/60., ndigits=2))
 
+    print('')
+    print("learned posterior cache hits, misses and hit rate:")
+    print(learned_posterior_cache.hits, learned_posterior_cache.misses, round(learned_posterior_cache.hit_rate(), ndigits=3))
+
     print('')
     print('results were saved in folder:')
     print(pickle_file_path)
@@ -1,4 +1,5 @@
 from evolution_compositionality_under_noise import *
+from likelihood_cache import get_log_likelihood_cache
 
 
 ###################################################################################################################
@@ -7,8 +8,9 @@ from evolution_compositionality_under_noise import *
 if __name__ == '__main__':
     meanings = ['02', '03', '12', '13']  # all possible meanings
     possible_form_lengths = np.array([2])  # all possible form lengths
-    forms_without_noise = create_all_possible_forms(2, possible_form_lengths)  # all possible forms, excluding their
-    # possible 'noisy variants'
+    n_characters = 2  # the number of different characters that forms can be made up of (i.e. the alphabet size)
+    forms_without_noise = create_all_possible_forms(n_characters, possible_form_lengths)  # all possible forms, excluding
+    # their possible 'noisy variants'
     noisy_forms = create_all_possible_noisy_forms(forms_without_noise)
     # all possible noisy variants of the forms above
     all_forms_including_noisy_variants = forms_without_noise + noisy_forms  # all possible forms, including both
@@ -34,10 +36,12 @@ if __name__ == '__main__':
     n_parents = 'single'  # determines whether each generation of learners receives data from a single agent from the
     # previous generation, or from multiple (can be set to either 'single' or 'multiple').
 
-    # proportion_measure = 'posterior'  # the way in which the proportion of language classes present in the population is
+    proportion_measure = 'posterior'  # the way in which the proportion of language classes present in the population is
     # measured. Can be set to either 'posterior' (where we directly measure the total amount of posterior probability
     # assigned to each language class), or 'sampled' (where at each generation we make all agents in the population pick a
     # language and we count the resulting proportions.
+    n_proportion_samples = 1  # the number of languages that each agent picks per generation if proportion_measure =
+    # 'sampled' (all of them are counted, so higher values make the measured proportions less noisy)
 
     communicative_success = False  # determines whether there is a pressure for communicative success or not
     communicative_success_pressure_strength = (2./3.)  # determines how much more likely a <meaning, form> pair from a
@@ -137,6 +141,12 @@ else:
     priors = np.divide(priors, np.sum(priors))
     priors = np.log(priors)
 
+# The posterior updates look their LOG likelihoods up in the same log_likelihood_cache that
+# evolution_compositionality_under_noise.py uses (which is built and saved first if it doesn't exist yet):
+log_likelihood_cache = None
+if production == 'my_code':
+    log_likelihood_cache = get_log_likelihood_cache(pickle_file_path, meanings, n_characters, possible_form_lengths, gamma, 0., error, noise_prob)
+
 sampled_languages_over_gens_per_run_new = np.zeros((runs, generations+extra_gens, popsize, rounds))
 language_stats_over_gens_per_run_new = np.zeros((runs, generations+extra_gens, int(max(class_per_lang)+1)))
 data_over_gens_per_run_new = []
@@ -151,7 +161,10 @@ for r in range(runs):
 
     initial_dataset = data_over_gens_per_run[r][-1]
 
-    sampled_languages_over_gens, language_stats_over_gens, data_over_gens, final_pop = simulation(final_pop, extra_gens, n_parents, rounds, b, popsize, meanings, forms_without_noise, noisy_forms, possible_form_lengths, hypothesis_space, class_per_lang, priors, initial_dataset, interaction, production, gamma, error, noise_prob, all_forms_including_noisy_variants, mutual_understanding, minimal_effort, communicative_success)
+    # (Unlike in evolution_compositionality_under_noise.py, no gen_0_posterior is passed to simulation() here: each run
+    # continues from its own final population and its own last dataset, so there is no learned posterior that is shared
+    # between runs.)
+    sampled_languages_over_gens, language_stats_over_gens, data_over_gens, final_pop = simulation(final_pop, extra_gens, n_parents, rounds, b, popsize, meanings, forms_without_noise, noisy_forms, possible_form_lengths, hypothesis_space, class_per_lang, priors, initial_dataset, interaction, production, gamma, error, noise_prob, all_forms_including_noisy_variants, mutual_understanding, minimal_effort, communicative_success, log_likelihood_cache=log_likelihood_cache, proportion_measure=proportion_measure, n_proportion_samples=n_proportion_samples)
 
     sampled_languages_over_gens_per_run_new[r] = np.concatenate((sampled_languages_over_gens_per_run[r], sampled_languages_over_gens))
     language_stats_over_gens_per_run_new[r] = np.concatenate((language_stats_over_gens_per_run[r], language_stats_over_gens))